@@ -40,6 +40,10 @@ elif [ "$1" == "render" ]; then
     mv classes_bassieracing.pdf docs/class-diagram.pdf
     rm packages_bassieracing.pdf
 
+# Convert a map between the JSON and binary map format
+elif [ "$1" == "convert" ]; then
+    python src/convertmap.py "$2" "$3"
+
 # When no release just run the python file
 else
     # Change this line to "python3 src/main.py" on Ubuntu 18.04 or lower!
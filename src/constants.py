@@ -7,10 +7,59 @@ class Config:
     VERSION = '1.1.1'
     GIT_REPO_URL = 'https://github.com/bplaat/bassieracing'
 
+    # The new version check runs in the background at most once per interval and gives up after the timeout
+    VERSION_CHECK_INTERVAL = 24 * 60 * 60
+    VERSION_CHECK_TIMEOUT = 5
+
+    # Multiplayer constants, the host sends the vehicle states and the clients their inputs with the tick rate
+    MULTIPLAYER_PORT = 21010
+    MULTIPLAYER_DISCOVERY_PORT = 21011
+    MULTIPLAYER_MAX_CLIENTS = 1
+    MULTIPLAYER_TICK_RATE = 30
+    MULTIPLAYER_ANNOUNCE_TIME = 1
+    MULTIPLAYER_TIMEOUT = 5
+
+    # The host delta encodes the states against the last state that a client received when it is at most this many ticks old
+    MULTIPLAYER_MAX_DELTA_TICKS = 16
+
+    # The host queues at most the max inputs of a client and uses at most the catch up inputs in one update step, a client earns
+    # one input every update step and saves up at most the max inputs so it can't move faster than the host, input messages that
+    # are further ahead of the received inputs than a client can make before it times out are ignored
+    MULTIPLAYER_MAX_CATCH_UP_INPUTS = 8
+
+    # Multiplayer client constants, the other vehicles are drawn between the states of the host
+    # with the interpolation delay and the input messages repeat at most the max inputs
+    MULTIPLAYER_STATES_SIZE = 32
+    MULTIPLAYER_INTERPOLATION_DELAY = 0.1
+    MULTIPLAYER_RENDER_TIME_CORRECTION = 0.01
+    MULTIPLAYER_MAX_INPUTS = 64
+
+    # Map transfer constants, a client that doesn't have the map of the host gets it in compressed chunks of the chunk size,
+    # asks again for the lost chunks after the retry time and caches the map by its content hash, the binary map data is at most
+    # the max size, enough for maps of 512 by 512 tiles
+    MAP_TRANSFER_CHUNK_SIZE = 1024
+    MAP_TRANSFER_MAX_SIZE = 1024 * 1024
+    MAP_TRANSFER_RETRY_TIME = 0.5
+    MAP_CACHE_PATH = '~/bassieracing-cache/maps'
+
+    # Lobby server constants, a room list message lists at most the rooms list size rooms and is padded to the request size
+    # because the rooms reply is never bigger than its request, every address can send the request rate pings, room lists and first
+    # room joins per second, the cookie of a new address changes every cookie time
+    SERVER_PORT = 21012
+    SERVER_MAX_ROOMS = 1024
+    SERVER_ROOM_SIZE = 8
+    SERVER_ROOMS_LIST_SIZE = 16
+    SERVER_ROOMS_REQUEST_SIZE = 1024
+    SERVER_REQUEST_RATE = 10
+    SERVER_REQUEST_BURST = 20
+    SERVER_COOKIE_TIME = 30
+
     # Window constants
     WIDTH = 1280
     HEIGHT = 720
     FPS = 60
+    UPDATES_PER_SECOND = 120
+    MAX_FRAME_TIME = 0.25
 
     # Game constants
     TILE_SPRITE_SIZE = 128
@@ -21,6 +70,22 @@ class Config:
     COUNTDOWN_CLOCK_TICK_TIME = 0.5
     FINISH_LAP_TIME_TIMEOUT = 1.5
 
+    # Map chunk cache constants
+    MAP_CHUNK_SIZE = 8
+    MAP_CHUNK_CACHE_SIZE = 64 * 1024 * 1024
+
+    # The number of scaled tile sheets that the cameras share
+    SCALED_IMAGE_CACHE_SIZE = 8
+
+    # Vehicle rotation cache constants, every vehicle sprite is pre-rotated in angle steps and the rotations use at most the cache size in bytes
+    VEHICLE_ANGLE_STEPS = 360
+    VEHICLE_ROTATION_CACHE_SIZE = 64 * 1024 * 1024
+
+    # Map thumbnail cache constants, set the path to None to only cache in memory, the disk size is the max number of saved thumbnails
+    THUMBNAIL_CACHE_SIZE = 32
+    THUMBNAIL_CACHE_DISK_SIZE = 256
+    THUMBNAIL_CACHE_PATH = '~/bassieracing-cache'
+
     # Editor constants
     EDITOR_CAMERA_BORDER = 12
     EDITOR_TILE_SIZE = 32
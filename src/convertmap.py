@@ -0,0 +1,26 @@
+# BassieRacing - Map converter
+# Converts a BassieRacing map between the JSON and the binary map format
+# The output format is chosen by the file extension of the output file: .json or .brmap
+# Usage: python src/convertmap.py input.json output.brmap
+
+# Hide pygame support message
+import os
+os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = 'hide'
+
+# Import modules
+from objects import *
+import sys
+
+# Check the arguments
+if len(sys.argv) != 3:
+    print('Usage: python src/convertmap.py input.json output' + Map.BINARY_EXTENSION)
+    sys.exit(1)
+
+# Show map errors in the console
+dialogs.use_console()
+
+# Load the input map and save it in the format of the output file
+map = Map.load_from_file(sys.argv[1])
+if map == None:
+    sys.exit(1)
+map.save_to_file(sys.argv[2])
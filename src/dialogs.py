@@ -0,0 +1,67 @@
+# BassieRacing - Dialogs
+# The file dialogs and messages of the game, tkinter is only imported and started the first time a dialog is used
+# Without tkinter or a display, or when the console is chosen, the messages are printed and the file dialogs return no file
+
+# Import modules
+import sys
+
+# The dialogs class
+class Dialogs:
+    # Create dialogs
+    def __init__(self):
+        self.tkinter = None
+        self.window = None
+        self.console = False
+
+    # Show the messages in the console instead of in tkinter dialogs, used by the headless tools
+    def use_console(self):
+        self.console = True
+
+    # Import tkinter and create the hidden tkinter window for the dialogs, returns false when that is not possible
+    def init_tkinter(self):
+        if self.console:
+            return False
+
+        if self.window == None:
+            try:
+                import tkinter
+                import tkinter.filedialog
+                import tkinter.messagebox
+                self.tkinter = tkinter
+                self.window = tkinter.Tk()
+                self.window.withdraw()
+            except Exception as exception:
+                print('Can\'t use tkinter dialogs, using the console instead: ' + str(exception), file=sys.stderr)
+                self.console = True
+                return False
+        return True
+
+    # Show a message
+    def show_message(self, title, message):
+        if self.init_tkinter():
+            self.tkinter.messagebox.showinfo(title, message)
+        else:
+            print(title + '\n' + message, file=sys.stderr)
+
+    # Ask a file to open, returns None when no file is selected
+    def ask_open_file(self, title, filetypes):
+        if self.init_tkinter():
+            filePath = self.tkinter.filedialog.askopenfilename(title=title, filetypes=filetypes)
+            if filePath:
+                return filePath
+        else:
+            print(title + '\nFile dialogs need tkinter and a display', file=sys.stderr)
+        return None
+
+    # Ask a file to save to, returns None when no file is selected
+    def ask_save_file(self, title, filetypes, defaultExtension):
+        if self.init_tkinter():
+            filePath = self.tkinter.filedialog.asksaveasfilename(title=title, filetypes=filetypes, defaultextension=defaultExtension)
+            if filePath:
+                return filePath
+        else:
+            print(title + '\nFile dialogs need tkinter and a display', file=sys.stderr)
+        return None
+
+# The dialogs that the whole game shares
+dialogs = Dialogs()
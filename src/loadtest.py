@@ -0,0 +1,249 @@
+# BassieRacing - Load test
+# A load test of the lobby server, hundreds of simulated players on localhost fill rooms, select their vehicles and maps
+# and race: the owner of every room relays a state message to all its players and the players relay an input message
+# to the owner with the tick rate, it prints the percentiles of the latencies and the lost relay messages
+# Without an address the lobby server is started in another process
+# Usage: python src/loadtest.py [players] [room size] [seconds] [address] [port]
+
+# Import modules
+import asyncio
+from constants import *
+import math
+from network import *
+import os
+import random
+import struct
+import subprocess
+import sys
+import time
+
+# The simulated messages of the game start with the send time and the sequence number of the sender
+RELAY_HEADER = struct.Struct('<dI')
+
+# The simulated player class, one UDP socket that talks to the lobby server
+class LoadTestPlayer(asyncio.DatagramProtocol):
+    # Create simulated player
+    def __init__(self, id):
+        self.id = id
+        self.transport = None
+        self.room = None
+        self.reply = None
+        self.replyCheck = None
+        self.cookie = bytes(Message.COOKIE_SIZE)
+
+        self.sequence = 0
+        self.relaysSent = 0
+        self.relayLatencies = []
+        self.pingLatencies = []
+        self.errors = 0
+
+    # Start the player when the socket is ready
+    def connection_made(self, transport):
+        self.transport = transport
+
+    # Handle a message of the lobby server
+    def datagram_received(self, data, address):
+        now = time.perf_counter()
+        message = Message.decode(data)
+        if message == None:
+            return
+        messageType, body = message
+
+        if messageType == Message.RELAY:
+            playerIndex, data = Message.decode_relay(body)
+            sendTime, sequence = RELAY_HEADER.unpack_from(data, Message.HEADER.size)
+            self.relayLatencies.append(now - sendTime)
+
+        if messageType == Message.PONG:
+            self.pingLatencies.append(now - struct.unpack('<d', body)[0])
+
+        if messageType == Message.ROOM:
+            self.room = Message.decode_room(body)
+
+        if messageType == Message.ERROR:
+            self.errors += 1
+
+        if messageType == Message.COOKIE:
+            self.cookie = Message.decode_cookie(body)
+
+        # Wake up the request that waits for this reply, the changes of the other players of the room are also sent to this player
+        if self.reply != None and not self.reply.done():
+            if messageType == Message.ERROR or messageType == Message.COOKIE or (messageType == Message.ROOM and self.replyCheck(self.room)):
+                self.reply.set_result(messageType)
+
+    # Send a request and wait for an error, a cookie or a room for which the check is true, the request is repeated when
+    # the reply is lost, returns the reply type and the latency or None when there is no reply
+    async def request(self, data, check, retries = 3):
+        self.replyCheck = check
+        for i in range(retries):
+            self.reply = asyncio.get_running_loop().create_future()
+            startTime = time.perf_counter()
+            self.transport.sendto(data)
+            try:
+                return await asyncio.wait_for(self.reply, 1), time.perf_counter() - startTime
+            except asyncio.TimeoutError:
+                pass
+        return None, None
+
+    # Join a room, the lobby server first sends a cookie that the join is sent again with, returns the latency or None when it failed
+    async def join(self, roomId, name, roomName = ''):
+        startTime = time.perf_counter()
+        for i in range(2):
+            replyType, latency = await self.request(Message.encode_room_join(roomId, 0, 0, name, roomName, self.cookie), lambda room: True)
+            if replyType == Message.ROOM:
+                return time.perf_counter() - startTime
+            if replyType != Message.COOKIE:
+                return
+
+    # Send a room update and wait for the room for which the check is true, returns the latency or None when it failed
+    async def update(self, data, check):
+        replyType, latency = await self.request(data, check)
+        if replyType == Message.ROOM:
+            return latency
+
+    # Relay a message of the game that looks like a real one of that size
+    def relay(self, playerIndex, messageType, size):
+        self.sequence += 1
+        data = Message.encode(messageType, RELAY_HEADER.pack(time.perf_counter(), self.sequence))
+        self.transport.sendto(Message.encode_relay(playerIndex, data + bytes(max(size - len(data), 0))))
+        self.relaysSent += 1
+
+    # Race until the end time, the owner sends states to all players and the players send inputs to the owner,
+    # every player starts at a random moment of the tick so the players don't send at the same time
+    async def race(self, endTime, stateSize, inputSize):
+        tickTime = 1 / Config.MULTIPLAYER_TICK_RATE
+        nextTickTime = time.perf_counter() + random.random() * tickTime
+        nextPingTime = nextTickTime
+        while nextTickTime < endTime:
+            await asyncio.sleep(max(nextTickTime - time.perf_counter(), 0))
+            if self.room['player-index'] == self.room['owner']:
+                self.relay(Message.ALL_PLAYERS, Message.STATE, stateSize)
+            else:
+                self.relay(self.room['owner'], Message.INPUT, inputSize)
+            if nextTickTime >= nextPingTime:
+                self.transport.sendto(Message.encode(Message.PING, struct.pack('<d', time.perf_counter())))
+                nextPingTime += 1
+            nextTickTime += tickTime
+
+# Print the percentiles of latencies in milliseconds
+def printLatencies(name, latencies):
+    if len(latencies) == 0:
+        print('%s: no values' % name)
+        return
+    latencies = sorted(latencies)
+    percentile = lambda p: latencies[min(math.floor(len(latencies) * p), len(latencies) - 1)] * 1000
+    print('%s: p50 %.2f ms, p95 %.2f ms, p99 %.2f ms, max %.2f ms (%d values)' % (name, percentile(0.5), percentile(0.95),
+        percentile(0.99), latencies[-1] * 1000, len(latencies)))
+
+# Wait until the lobby server answers pings, returns false when it doesn't answer
+async def waitForServer(address, port):
+    loop = asyncio.get_running_loop()
+    player = LoadTestPlayer(0)
+    transport, protocol = await loop.create_datagram_endpoint(lambda: player, remote_addr=( address, port ))
+    try:
+        for i in range(50):
+            transport.sendto(Message.encode(Message.PING, struct.pack('<d', time.perf_counter())))
+            await asyncio.sleep(0.1)
+            if len(player.pingLatencies) > 0:
+                return True
+        return False
+    finally:
+        transport.close()
+
+# Run the load test with rooms of the room size, the first player of a room creates it and the others join it
+async def loadTest(playerCount, roomSize, seconds, address, port):
+    if not await waitForServer(address, port):
+        print('The lobby server at %s:%d doesn\'t answer' % (address, port))
+        return
+
+    loop = asyncio.get_running_loop()
+    players = []
+    for i in range(playerCount):
+        transport, player = await loop.create_datagram_endpoint(lambda: LoadTestPlayer(i), remote_addr=( address, port ))
+        players.append(player)
+    rooms = [ players[i:i + roomSize] for i in range(0, playerCount, roomSize) ]
+
+    # Create the rooms and join them, every player selects a vehicle and every owner a map
+    joinLatencies = []
+    async def joinRoom(roomPlayers, i):
+        owner = roomPlayers[0]
+        latency = await owner.join(0, 'Player %d' % owner.id, 'Room %d' % i)
+        if latency == None:
+            return
+        joinLatencies.append(latency)
+        latencies = await asyncio.gather(*( player.join(owner.room['id'], 'Player %d' % player.id) for player in roomPlayers[1:] ))
+        joinLatencies.extend(latency for latency in latencies if latency != None)
+    await asyncio.gather(*( joinRoom(roomPlayers, i) for i, roomPlayers in enumerate(rooms) ))
+
+    updateLatencies = []
+    async def selectVehicleAndMap(player):
+        vehicleData = ( player.id % 6, player.id % 5 )
+        latency = await player.update(Message.encode_room_vehicle(*vehicleData), lambda room: any(otherPlayer['index'] == room['player-index'] and
+            ( otherPlayer['vehicle-type-id'], otherPlayer['color'] ) == vehicleData for otherPlayer in room['players']))
+        if latency != None:
+            updateLatencies.append(latency)
+        if player.room['player-index'] == player.room['owner']:
+            latency = await player.update(Message.encode_room_map(1, bytes(20), 'Baby Park'), lambda room: room['map-id'] == 1)
+            if latency != None:
+                updateLatencies.append(latency)
+    joinedPlayers = [ player for player in players if player.room != None ]
+    await asyncio.gather(*( selectVehicleAndMap(player) for player in joinedPlayers ))
+    await asyncio.sleep(0.5)
+
+    # Race with the sizes of real messages: a delta state of about 6 bytes per vehicle and an input message with 4 inputs
+    for player in joinedPlayers:
+        player.relayLatencies = []
+    stateSize = Message.HEADER.size + Message.STATE_BODY.size + 1 + 6 * roomSize
+    inputSize = Message.HEADER.size + Message.INPUT_BODY.size + 4
+    startTime = time.perf_counter()
+    await asyncio.gather(*( player.race(startTime + seconds, stateSize, inputSize) for player in joinedPlayers ))
+    await asyncio.sleep(0.5)
+
+    # Every state reaches all other players of the room and every input reaches the owner
+    relaysSent = sum(player.relaysSent for player in joinedPlayers)
+    relaysExpected = 0
+    for roomPlayers in rooms:
+        roomPlayers = [ player for player in roomPlayers if player.room != None ]
+        for player in roomPlayers:
+            if player.room['player-index'] == player.room['owner']:
+                relaysExpected += player.relaysSent * (len(roomPlayers) - 1)
+            else:
+                relaysExpected += player.relaysSent
+    relaysReceived = sum(len(player.relayLatencies) for player in joinedPlayers)
+
+    for player in players:
+        if player.room != None:
+            player.transport.sendto(Message.encode(Message.ROOM_LEAVE))
+    await asyncio.sleep(0.1)
+    for player in players:
+        player.transport.close()
+
+    print('Load test with %d players in %d rooms of %d players for %d seconds at %d ticks per second' % (playerCount, len(rooms), roomSize,
+        seconds, Config.MULTIPLAYER_TICK_RATE))
+    print('Joined players: %d of %d, errors: %d' % (len(joinedPlayers), playerCount, sum(player.errors for player in players)))
+    printLatencies('Room join', joinLatencies)
+    printLatencies('Vehicle and map selection', updateLatencies)
+    printLatencies('Ping round trip', [ latency for player in joinedPlayers for latency in player.pingLatencies ])
+    printLatencies('Relay', [ latency for player in joinedPlayers for latency in player.relayLatencies ])
+    print('Relay messages: %d sent, %d received of %d expected (%.2f%% lost), %.0f received per second' % (relaysSent, relaysReceived,
+        relaysExpected, (1 - relaysReceived / max(relaysExpected, 1)) * 100, relaysReceived / seconds))
+
+# Run the load test against a lobby server that is started in another process or that runs at an address
+if __name__ == '__main__':
+    playerCount = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+    roomSize = min(int(sys.argv[2]) if len(sys.argv) > 2 else Config.SERVER_ROOM_SIZE, Config.SERVER_ROOM_SIZE)
+    seconds = float(sys.argv[3]) if len(sys.argv) > 3 else 10
+    port = int(sys.argv[5]) if len(sys.argv) > 5 else Config.SERVER_PORT
+
+    server = None
+    if len(sys.argv) > 4:
+        address = sys.argv[4]
+    else:
+        address = '127.0.0.1'
+        server = subprocess.Popen([ sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'server.py'), str(port) ])
+    try:
+        asyncio.run(loadTest(playerCount, roomSize, seconds, address, port))
+    finally:
+        if server != None:
+            server.terminate()
+            server.wait()
@@ -4,31 +4,66 @@
 # Windows install all dependencies: pip install pygame
 # Ubuntu install all dependencies: sudo apt install python3-pygame python3-tk
 # Made with pygame (but only used to plot images and text to the screen and to handle the window events)
-# It also uses tkinter for the file open and save dialogs and error messages
+# It also uses tkinter for the file open and save dialogs and error messages, it is only started when a dialog is used
 
 # Hide pygame support message
 import os
 os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = 'hide'
 
+# Remember when the game started for the startup profile
+import time
+startTime = time.perf_counter()
+
 # Import modules
 from pages import *
 import pygame
-import time
-import tkinter
 import signal
+import sys
+import threading
 import urllib.request
 from utils import *
 
 # The game class
 class Game:
+    # The images and sounds that are loaded the first time they are used, the intro page only needs the intro sound
+    LAZY_IMAGES = {
+        'tilesImage': 'assets/images/tiles.png',
+        'vehiclesImage': 'assets/images/vehicles.png',
+        'explosionImage': 'assets/images/explosion.png'
+    }
+    LAZY_SOUNDS = {
+        'checkpointSound': 'assets/sounds/checkpoint.wav',
+        'clickSound': 'assets/sounds/click.wav',
+        'crashSound': 'assets/sounds/crash.wav',
+        'introSound': 'assets/sounds/intro.wav',
+        'finishSound': 'assets/sounds/finish.wav',
+        'lapSound': 'assets/sounds/lap.wav',
+        'tickSound': 'assets/sounds/tick.wav',
+        'tockSound': 'assets/sounds/tock.wav'
+    }
+
     def __init__(self):
+        # Time the startup phases when started with the profile startup argument
+        self.profileStartup = '--profile-startup' in sys.argv
+        self.startupPhases = []
+        self.phaseStart = startTime
+        self.end_startup_phase('Import modules')
+
         # Init pygame
         pygame.mixer.pre_init(44100, 16, 1, 512)
         pygame.init()
+        self.end_startup_phase('Init pygame')
 
         # Set running
         self.running = True
 
+        # Set game time and the render position between the last two updates
+        self.time = time.time()
+        self.alpha = 1
+
+        # Draw as fast as possible when started with the uncapped argument for benchmarking
+        self.uncapped = '--uncapped' in sys.argv
+
         # Init the window
         pygame.display.set_caption('BassieRacing')
         self.iconImage = pygame.image.load('assets/images/icon.png')
@@ -39,6 +74,7 @@ class Game:
         os.environ['SDL_VIDEO_CENTERED'] = '1'
         self.screen = pygame.display.set_mode(( self.width, self.height ), pygame.DOUBLEBUF | pygame.RESIZABLE)
         del os.environ['SDL_VIDEO_CENTERED']
+        self.end_startup_phase('Init the window')
 
         # Load settings
         if os.path.isfile(os.path.expanduser('~/bassieracing-settings.json')):
@@ -128,53 +164,79 @@ class Game:
                 if 'custom-maps' not in self.settings:
                     self.settings['custom-maps'] = []
 
+                if 'version-check' not in self.settings:
+                    self.settings['version-check'] = {}
+                if 'last-checked' not in self.settings['version-check']:
+                    self.settings['version-check']['last-checked'] = 0
+                if 'latest-version' not in self.settings['version-check']:
+                    self.settings['version-check']['latest-version'] = None
+
         else:
             self.use_default_settings()
+        self.end_startup_phase('Load settings')
 
         # Load fonts
         font_path = 'assets/fonts/PressStart2P-Regular.ttf'
         self.titleFont = pygame.font.Font(font_path, 48)
         self.textFont = pygame.font.Font(font_path, 24)
         self.smallFont = pygame.font.Font(font_path, 16)
+        self.end_startup_phase('Load fonts')
 
-        # Load images
-        self.tilesImage = pygame.image.load('assets/images/tiles.png').convert_alpha()
-        self.vehiclesImage = pygame.image.load('assets/images/vehicles.png').convert_alpha()
-        self.explosionImage = pygame.image.load('assets/images/explosion.png').convert_alpha()
-
-        # Load music
+        # The images, sounds and music are loaded the first time they are used
         self.musicStart = self.settings['music']['position']
-        pygame.mixer.music.load('assets/music/deadmau5 - Infra Turbo Pigcart Racer.mp3')
-        pygame.mixer.music.set_volume(0.5)
-        pygame.mixer.music.set_endevent(pygame.USEREVENT + 1)
-
-        # Load sounds
-        self.checkpointSound = pygame.mixer.Sound('assets/sounds/checkpoint.wav')
-        self.clickSound = pygame.mixer.Sound('assets/sounds/click.wav')
-        self.crashSound = pygame.mixer.Sound('assets/sounds/crash.wav')
-        self.introSound = pygame.mixer.Sound('assets/sounds/intro.wav')
-        self.finishSound = pygame.mixer.Sound('assets/sounds/finish.wav')
-        self.lapSound = pygame.mixer.Sound('assets/sounds/lap.wav')
-        self.tickSound = pygame.mixer.Sound('assets/sounds/tick.wav')
-        self.tockSound = pygame.mixer.Sound('assets/sounds/tock.wav')
-
-        # Create hidden Tkinter window for file dialogs and error messages
-        self.tkinter_window = tkinter.Tk()
-        self.tkinter_window.withdraw()
-
-        # Detect new version
-        self.detect_new_version()
+        self.musicLoaded = False
+
+        # Use the last detected version and detect a new version in the background when the last check is old
+        self.set_latest_version(self.settings['version-check']['latest-version'])
+        if time.time() - self.settings['version-check']['last-checked'] > Config.VERSION_CHECK_INTERVAL:
+            threading.Thread(target=self.detect_new_version, daemon=True).start()
+        self.end_startup_phase('Start version check')
 
         # Create intro or menu page
         if self.settings['intro']['enabled']:
             self.page = IntroPage(self)
         else:
             self.page = MenuPage(self)
+        self.end_startup_phase('Create first page')
 
         # Init signal handlers
         signal.signal(signal.SIGINT, self.handle_signals)
         signal.signal(signal.SIGTERM, self.handle_signals)
 
+    # Load a lazy image or sound when it is used for the first time
+    def __getattr__(self, name):
+        if name in Game.LAZY_IMAGES:
+            asset = pygame.image.load(Game.LAZY_IMAGES[name]).convert_alpha()
+        elif name in Game.LAZY_SOUNDS:
+            asset = pygame.mixer.Sound(Game.LAZY_SOUNDS[name])
+        else:
+            raise AttributeError(name)
+        setattr(self, name, asset)
+        return asset
+
+    # Play the music from the saved position, the music is loaded when it is played for the first time
+    def play_music(self):
+        if not self.musicLoaded:
+            pygame.mixer.music.load('assets/music/deadmau5 - Infra Turbo Pigcart Racer.mp3')
+            pygame.mixer.music.set_volume(0.5)
+            pygame.mixer.music.set_endevent(pygame.USEREVENT + 1)
+            self.musicLoaded = True
+        pygame.mixer.music.play(0, self.settings['music']['position'])
+
+    # End a startup phase and start the next one
+    def end_startup_phase(self, name):
+        if self.profileStartup:
+            now = time.perf_counter()
+            self.startupPhases.append(( name, now - self.phaseStart ))
+            self.phaseStart = now
+
+    # Print the time of every startup phase and the time to the first frame
+    def print_startup_profile(self):
+        print('Startup profile:')
+        for name, duration in self.startupPhases:
+            print('  %-24s %8.1f ms' % (name, duration * 1000))
+        print('  %-24s %8.1f ms' % ('Time to first frame', (self.phaseStart - startTime) * 1000))
+
     # Use default settings
     def use_default_settings(self):
         self.settings = {
@@ -222,7 +284,11 @@ class Game:
                 }
             },
             'high-scores': [],
-            'custom-maps': []
+            'custom-maps': [],
+            'version-check': {
+                'last-checked': 0,
+                'latest-version': None
+            }
         }
 
     # Save settings to file
@@ -236,11 +302,11 @@ class Game:
         self.save_settings()
         self.running = False
 
-    # Detect new version
+    # Detect new version, runs in a thread and sends the version to the game loop with an event
     def detect_new_version(self):
         try:
             # Do HTTP request to online constants.py file to check version label
-            response = urllib.request.urlopen(Config.GIT_REPO_URL + '/blob/master/src/constants.py?raw=true')
+            response = urllib.request.urlopen(Config.GIT_REPO_URL + '/blob/master/src/constants.py?raw=true', timeout=Config.VERSION_CHECK_TIMEOUT)
             data = response.read().decode('utf8')
 
             # Parse version label
@@ -248,14 +314,23 @@ class Game:
             version = data[data.find(start) + len(start):]
             version = version[:version.find('\'')]
 
-            # Do final version logic
-            if checkVersion(version):
-                self.newVersionAvailable = version
-            else:
-                self.newVersionAvailable = None
+            # Send the version label to the game loop only when it can be compared
+            versionParts = version.split('.')
+            if len(versionParts) == 3 and all(part.isdigit() for part in versionParts):
+                pygame.event.post(pygame.event.Event(pygame.USEREVENT + 3, { 'version': version }))
 
         # When it fails because of no internet it isn't so bad
         except:
+            pass
+
+    # Set the latest version and show it when it is newer, the check time is only set when a version check is done
+    def set_latest_version(self, version, checkTime = None):
+        self.settings['version-check']['latest-version'] = version
+        if checkTime != None:
+            self.settings['version-check']['last-checked'] = checkTime
+        if version != None and checkVersion(version):
+            self.newVersionAvailable = version
+        else:
             self.newVersionAvailable = None
 
     # Handle user events
@@ -266,6 +341,10 @@ class Game:
             pygame.mixer.music.rewind()
             pygame.mixer.music.play()
 
+        # When the new version check is done save the version
+        if event.type == pygame.USEREVENT + 3:
+            self.set_latest_version(event.version, time.time())
+
         # Handle window resize events
         if event.type == pygame.VIDEORESIZE:
             self.width = event.w
@@ -284,28 +363,54 @@ class Game:
     def focus(self):
         self.screen = pygame.display.set_mode((self.width, self.height), pygame.DOUBLEBUF| pygame.RESIZABLE)
 
-    # The game loop
+    # The game loop, updates with a fixed time step and draws between the last two updates
     def start(self):
-        lastTime = time.time()
+        timeStep = 1 / Config.UPDATES_PER_SECOND
+        accumulator = 0
+        frames = 0
+        startTime = lastTime = time.perf_counter()
         while self.running:
-            # Calculate delta time
-            self.time = time.time()
-            delta = self.time - lastTime
-            lastTime = self.time
+            # Add the frame time, capped so a long pause doesn't cause a burst of updates
+            frameStart = time.perf_counter()
+            accumulator += min(frameStart - lastTime, Config.MAX_FRAME_TIME)
+            lastTime = frameStart
 
             # Handle window events
             for event in pygame.event.get():
                 self.handle_event(event)
 
-            # Update the current page
-            self.page.update(delta)
+            # Update the current page in fixed time steps
+            while accumulator >= timeStep and self.running:
+                self.time += timeStep
+                self.page.update(timeStep)
+                accumulator -= timeStep
 
             # Draw the current page and flip pygame back buffer
+            self.alpha = accumulator / timeStep
             self.page.draw(self.screen)
             pygame.display.flip()
-
-            # Sleep for a short while
-            time.sleep(1 / Config.FPS)
+            frames += 1
+
+            # When profiling the startup stop after the first frame
+            if self.profileStartup:
+                self.end_startup_phase('Draw first frame')
+                self.print_startup_profile()
+                self.running = False
+
+            # Sleep for the rest of the frame when the frame rate is capped
+            if not self.uncapped:
+                sleepTime = 1 / Config.FPS - (time.perf_counter() - frameStart)
+                if sleepTime > 0:
+                    time.sleep(sleepTime)
+
+        # Print the average frame rate and the memory of the image caches when uncapped
+        if self.uncapped:
+            print('Average FPS: %.1f' % (frames / (time.perf_counter() - startTime)))
+            stats = scaledImageCache.get_stats()
+            print('Scaled image cache: %d images, %d hits, %d misses, %.1f MB' % (stats['size'], stats['hits'], stats['misses'], stats['bytes'] / (1024 * 1024)))
+            stats = rotatedImageCache.get_stats()
+            print('Rotated image cache: %d images in %d rotation sets, %.1f MB of %.1f MB' % (stats['images'], stats['size'],
+                stats['bytes'] / (1024 * 1024), Config.VEHICLE_ROTATION_CACHE_SIZE / (1024 * 1024)))
 
 # Create a game instance and start the game
 game = Game()
@@ -0,0 +1,161 @@
+# BassieRacing - Map benchmark
+# Measures how long the map takes to draw for generated maps of every map size and of bigger custom sizes
+# The draw mode compares drawing all tiles of the map with drawing only the visible tiles and with drawing the pre-rendered chunks,
+# a split screen viewport moves over the middle of the map and the visible tiles must give the same pixels as all tiles
+# The generate mode compares generating the terrain tile by tile with generating it with numpy, both must give the same terrain
+# The blend mode checks that the numpy blends of every bundled map and of random maps give the same tiles as blending every tile
+# on its own and compares their times
+# Usage: python src/mapbench.py draw [frames]
+#        python src/mapbench.py generate [runs]
+#        python src/mapbench.py blend [runs]
+
+# Hide pygame support message and draw without a display
+import os
+os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = 'hide'
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+# Import modules
+from constants import *
+from noise import *
+from objects import *
+import glob
+import pygame
+import random
+import sys
+import time
+
+ASSETS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'assets')
+
+# The map sizes of the benchmark, the sizes of the map editor and bigger custom sizes
+MAP_SIZES = Config.MAP_SIZES + [ 128, 256 ]
+
+# Create a map of a size with generated terrain and an empty track
+def createMap(size, seed, useNumpy = True):
+    generator = random.Random(seed)
+    map = Map(seed, 'Benchmark', size, size)
+    map.noise = {
+        'perlin': PerlinNoise(),
+        'x': generator.randint(-1000000, 1000000),
+        'y': generator.randint(-1000000, 1000000)
+    }
+    map.generate_terrain(useNumpy)
+    map.track = Grid(size, size)
+    map.blend_track(False)
+    return map
+
+# Draw frames of a map with a draw function and return the time of a frame in milliseconds and the pixels of the last frame
+def drawFrames(map, camera, surface, frames, draw):
+    startTime = time.perf_counter()
+    for i in range(frames):
+        camera.x = map.width * camera.tileSize / 2 + i * 3
+        camera.y = map.height * camera.tileSize / 2
+        if i == frames - 1:
+            surface.fill(Color.BLACK)
+        draw()
+    return ( (time.perf_counter() - startTime) / frames * 1000, pygame.image.tobytes(surface, 'RGB') )
+
+# Compare drawing all tiles, the visible tiles and the chunks of a split screen viewport with full size tiles
+def drawBenchmark(frames):
+    pygame.display.init()
+    pygame.display.set_mode(( 1, 1 ))
+    tilesImage = pygame.image.load(os.path.join(ASSETS_PATH, 'images', 'tiles.png')).convert_alpha()
+    vehiclesImage = pygame.image.load(os.path.join(ASSETS_PATH, 'images', 'vehicles.png')).convert_alpha()
+    surface = pygame.Surface(( 640, 720 ))
+
+    print('A 640x720 viewport with %dpx tiles, %d frames, ms per frame' % (Config.TILE_SPRITE_SIZE, frames))
+    for size in MAP_SIZES:
+        map = createMap(size, size)
+        camera = Camera(0, 0, tilesImage, Config.TILE_SPRITE_SIZE, vehiclesImage)
+        offset = lambda: ( camera.x - surface.get_width() / 2, camera.y - surface.get_height() / 2 )
+        allTime, allFrame = drawFrames(map, camera, surface, frames, lambda: map.draw_tiles(surface, camera, 0, 0, map.width, map.height, *offset()))
+        directTime, directFrame = drawFrames(map, camera, surface, frames, lambda: map.draw(surface, camera, False))
+        chunksTime, chunksFrame = drawFrames(map, camera, surface, frames, lambda: map.draw(surface, camera))
+        print('%4dx%-4d all tiles %6.2f, visible tiles %5.2f, chunks %5.2f, same pixels %s' % (size, size, allTime, directTime, chunksTime,
+            'yes' if allFrame == directFrame else 'no'))
+
+# Compare generating the terrain tile by tile with generating it with numpy, the best time of the runs counts
+def generateBenchmark(runs):
+    if numpy == None:
+        print('Generating with numpy needs numpy')
+        return
+
+    print('Best of %d runs, ms per map' % runs)
+    for size in MAP_SIZES + [ 512 ]:
+        times = []
+        terrains = []
+        for useNumpy in ( False, True ):
+            bestTime = None
+            for i in range(runs):
+                startTime = time.perf_counter()
+                map = createMap(size, size, useNumpy)
+                duration = (time.perf_counter() - startTime) * 1000
+                bestTime = duration if bestTime == None else min(bestTime, duration)
+            times.append(bestTime)
+            terrains.append(( bytes(map.terrain.data), bytes(map.blendedTerrain.data) ))
+        print('%4dx%-4d tile by tile %8.1f, numpy %6.1f (%.1fx), same terrain %s' % (size, size, times[0], times[1], times[0] / times[1],
+            'yes' if terrains[0] == terrains[1] else 'no'))
+
+# Create a map with random terrain tiles and random track tiles of some types
+def createRandomMap(width, height, seed, trackTypes = [ 0, 0, 0, 1, 1, 2, 3 ]):
+    generator = random.Random(seed)
+    map = Map(seed, 'Random', width, height)
+    map.terrain = Grid.from_list([ [ generator.randrange(3) for x in range(width) ] for y in range(height) ])
+    map.track = Grid.from_list([ [ generator.choice(trackTypes) for x in range(width) ] for y in range(height) ])
+    map.blend_terrain()
+    map.blend_track(False)
+    return map
+
+# Check that the numpy blends of a map give the same tiles as blending every tile on its own
+def checkBlend(map):
+    for y in range(map.height):
+        for x in range(map.width):
+            if map.blendedTerrain[y][x] != map.blend_terrain_tile(x, y) or map.blendedTrack[y][x] != map.blend_track_tile(x, y):
+                return False
+    return True
+
+# Get the best time of some runs of a function in milliseconds
+def getBestTime(runs, function):
+    bestTime = None
+    for i in range(runs):
+        startTime = time.perf_counter()
+        function()
+        duration = (time.perf_counter() - startTime) * 1000
+        bestTime = duration if bestTime == None else min(bestTime, duration)
+    return bestTime
+
+# Check the numpy blends of the bundled maps and random maps and compare them with blending every tile on its own
+def blendBenchmark(runs):
+    if numpy == None:
+        print('Blending with numpy needs numpy')
+        return
+
+    mapPaths = sorted(glob.glob(os.path.join(ASSETS_PATH, 'maps', '*.json')) + glob.glob(os.path.join(ASSETS_PATH, 'maps', 'custom', '*.json')))
+    for mapPath in mapPaths:
+        map = Map.load_from_file(mapPath)
+        print('%-16s %dx%d same tiles %s' % (os.path.basename(mapPath), map.width, map.height, 'yes' if checkBlend(map) else 'no'))
+    randomMaps = [ createRandomMap(random.randint(1, 16), random.randint(1, 16), seed) for seed in range(300) ]
+    print('300 random maps same tiles %s' % ('yes' if all(checkBlend(map) for map in randomMaps) else 'no'))
+
+    # The times are measured without checkpoint tiles because finding many checkpoints takes longer than blending
+    print('Best of %d runs, ms per blend' % runs)
+    for size in MAP_SIZES:
+        map = createRandomMap(size, size, size, [ 0, 0, 0, 1, 1, 2 ])
+        terrainTileTime = getBestTime(runs, lambda: map.blend_terrain(False))
+        terrainTime = getBestTime(runs, map.blend_terrain)
+        trackTileTime = getBestTime(runs, lambda: map.blend_track(False, False))
+        trackTime = getBestTime(runs, lambda: map.blend_track(False))
+        print('%4dx%-4d terrain: tile by tile %7.2f, numpy %6.2f (%.1fx)  track: tile by tile %7.2f, numpy %6.2f (%.1fx)' % (size, size,
+            terrainTileTime, terrainTime, terrainTileTime / terrainTime, trackTileTime, trackTime, trackTileTime / trackTime))
+
+# Run the benchmark
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or sys.argv[1] not in ( 'draw', 'generate', 'blend' ):
+        print('Usage: python src/mapbench.py draw [frames]\n       python src/mapbench.py generate [runs]\n       python src/mapbench.py blend [runs]')
+        sys.exit(1)
+
+    if sys.argv[1] == 'draw':
+        drawBenchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 100)
+    if sys.argv[1] == 'generate':
+        generateBenchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 3)
+    if sys.argv[1] == 'blend':
+        blendBenchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 10)
@@ -0,0 +1,399 @@
+# BassieRacing - Network race
+# A headless multiplayer race over the network where the path driver drives the vehicles, to test the networking
+# on one computer with two processes and to measure the bandwidth that a client uses, or in one process over
+# a loopback link with a simulated clock that delays, shuffles and loses messages to measure the prediction errors,
+# or to measure the size and the encode and decode time of the state messages of races with more vehicles
+# Usage: python src/netrace.py host map.json [port] [vehicle id]
+#        python src/netrace.py join [address] [port] [vehicle id]
+#        python src/netrace.py loopback map.json [latency ms] [jitter ms] [loss %] [laps]
+#        python src/netrace.py snapshots map.json [seconds]
+
+# Hide pygame support message
+import os
+os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = 'hide'
+
+# Import modules
+from constants import *
+import heapq
+import math
+from network import *
+from objects import *
+import random
+from simulation import *
+from stats import *
+import sys
+import time
+from utils import *
+
+# The link class, one end of an in memory connection with a simulated clock that delays messages with the latency
+# and a random jitter, so they can arrive in another order, and loses messages with the loss chance
+class Link:
+    # Create link end
+    def __init__(self, address, latency, jitter, loss, random):
+        self.address = address
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.random = random
+        self.peer = None
+        self.time = 0
+
+        # The ( arrival time, order, data ) messages that are on their way to this end
+        self.queue = []
+        self.order = 0
+
+        self.bytesSent = 0
+        self.bytesReceived = 0
+        self.packetsSent = 0
+        self.packetsReceived = 0
+
+    # Create the two connected ends of a link
+    @staticmethod
+    def create_pair(address, otherAddress, latency, jitter, loss, random):
+        link = Link(address, latency, jitter, loss, random)
+        otherLink = Link(otherAddress, latency, jitter, loss, random)
+        link.peer = otherLink
+        otherLink.peer = link
+        return link, otherLink
+
+    # Send a message to the other end
+    def send(self, data, address):
+        self.bytesSent += len(data)
+        self.packetsSent += 1
+        if self.random.random() < self.loss:
+            return
+        arrivalTime = self.time + max(self.latency + self.random.uniform(-self.jitter, self.jitter), 0)
+        heapq.heappush(self.peer.queue, ( arrivalTime, self.peer.order, data ))
+        self.peer.order += 1
+
+    # Receive the messages that have arrived
+    def receive(self):
+        messages = []
+        while len(self.queue) > 0 and self.queue[0][0] <= self.time:
+            data = heapq.heappop(self.queue)[2]
+            self.bytesReceived += len(data)
+            self.packetsReceived += 1
+            message = Message.decode(data)
+            if message != None:
+                messages.append(( message[0], message[1], self.peer.address ))
+        return messages
+
+    # Close link end
+    def close(self):
+        pass
+
+# Print the bandwidth of a connection
+def printBandwidth(name, bytesSent, bytesReceived, packetsSent, packetsReceived, duration):
+    print('%s: sent %d bytes in %d packets (%.0f B/s), received %d bytes in %d packets (%.0f B/s), with %d bytes IP/UDP overhead per packet' % (
+        name, bytesSent, packetsSent, bytesSent / duration, bytesReceived, packetsReceived, bytesReceived / duration, Connection.PACKET_OVERHEAD))
+
+# Print the mean, 95th percentile and max of a list of values
+def printDistribution(name, values, unit):
+    if len(values) == 0:
+        print('%s: no values' % name)
+        return
+    values = sorted(values)
+    print('%s: mean %.2f %s, p95 %.2f %s, max %.2f %s (%d values)' % (name, sum(values) / len(values), unit,
+        values[min(math.floor(len(values) * 0.95), len(values) - 1)], unit, values[-1], unit, len(values)))
+
+# Start the race of the host with the path driver for the host vehicle and the inputs of the client for the other vehicle
+def startHostRace(map, host, vehicleTypeId):
+    client = list(host.clients.values())[0]
+    host.start([ ( vehicleTypeId, VehicleColor.BLUE ), ( client['vehicle-type-id'], client['color'] ) ])
+    return Simulation(map, [
+        { 'type': vehicles[vehicleTypeId], 'color': VehicleColor.BLUE },
+        { 'type': vehicles[client['vehicle-type-id']], 'color': client['color'] }
+    ], [ PathDriver(map), None ])
+
+# Step the race of the host one update step, the path driver drives the vehicle of the host
+def stepHostRace(simulation, host, time):
+    simulation.time += simulation.timeStep
+    simulation.steps += 1
+    hostVehicle = simulation.vehicles[0]
+    hostVehicle.moving, hostVehicle.turning = simulation.drivers[0](simulation, hostVehicle)
+    host.update_race(time, simulation.vehicles, simulation.timeStep)
+
+# Start the race of the client, the drivers are not used because the vehicles follow the host
+def startClientRace(map, client):
+    return Simulation(map, [ { 'type': vehicles[vehicleTypeId], 'color': color } for vehicleTypeId, color in client.vehicleData ],
+        [ None for data in client.vehicleData ])
+
+# Step the race of the client one update step, like the game page the own vehicle is predicted and corrected,
+# returns true when there was a new state
+def stepClientRace(simulation, client, driver, time):
+    simulation.time += simulation.timeStep
+    simulation.steps += 1
+    vehicle = simulation.vehicles[client.vehicleId]
+
+    vehicle.moving, vehicle.turning = driver(simulation, vehicle)
+    client.predict(vehicle)
+    client.update(time)
+    newState = client.apply_state(simulation.vehicles)
+    client.interpolate_vehicles(simulation.vehicles, simulation.timeStep)
+    return newState
+
+# Print the laps of the vehicles of a race
+def printRace(simulation):
+    for vehicle in simulation.vehicles:
+        print('Vehicle %d: %s in %d/%d laps, lap times: %s' % (vehicle.id, 'finished' if vehicle.finished else 'not finished', vehicle.lap, simulation.map.laps,
+            ', '.join(formatTime(lapTime) for lapTime in vehicle.lapTimes if lapTime != None)))
+
+# Find the map of the host in the default maps and the map cache
+def findMap(mapId, mapHash):
+    catalogue = MapCatalogue([ os.path.abspath('assets/maps/' + filename) for filename in os.listdir('assets/maps/') ])
+    return mapCache.find_map(catalogue, mapId, mapHash)
+
+# Host a race and wait for a client to join
+def hostRace(mapPath, port, vehicleTypeId):
+    map = Map.load_from_file(mapPath)
+    if map == None:
+        return
+
+    # The path drivers don't avoid each other so the vehicles don't crash, the client gets the map as it is in the file
+    host = NetworkHost('netrace', map.id, map.name, map.save_to_binary(), port)
+    map.crashes['enabled'] = False
+    print('Hosting %s on port %d, waiting for a client' % (map.name, port))
+
+    # Start the race when the client has the map
+    startTime = time.perf_counter()
+    while len(host.clients) == 0 or not list(host.clients.values())[0]['ready']:
+        host.update(time.perf_counter() - startTime)
+        time.sleep(0.01)
+    client = list(host.clients.values())[0]
+    print('%s joined from %s:%d' % (client['name'], *client['address']))
+    simulation = startHostRace(map, host, vehicleTypeId)
+
+    # Step the simulation in real time until all vehicles finish or the client leaves
+    raceTime = time.perf_counter()
+    bytesSent = host.connection.bytesSent
+    packetsSent = host.connection.packetsSent
+    while not simulation.is_finished() and len(host.clients) > 0:
+        while simulation.time < time.perf_counter() - raceTime:
+            stepHostRace(simulation, host, time.perf_counter() - startTime)
+        time.sleep(0.001)
+    duration = time.perf_counter() - raceTime
+
+    printRace(simulation)
+    printBandwidth('Host race', host.connection.bytesSent - bytesSent, host.connection.bytesReceived,
+        host.connection.packetsSent - packetsSent, host.connection.packetsReceived, duration)
+    for client in host.clients.values():
+        print('Client %s: %.0f B/s with IP/UDP overhead' % (client['name'], client['bytes-sent'] / duration))
+
+    # Give the client some time to receive the last states before leaving
+    closeTime = time.perf_counter() + 1
+    while time.perf_counter() < closeTime:
+        host.update(time.perf_counter() - startTime, simulation.vehicles)
+        time.sleep(0.01)
+    host.close()
+
+# Join a race and drive with the path driver
+def joinRace(address, port, vehicleTypeId):
+    client = NetworkClient(address, 'netrace', vehicleTypeId, VehicleColor.RED, port)
+    print('Joining %s:%d' % (address, port))
+
+    # Find the map of the host when it welcomes the client or else get it from the host, and wait until the race starts
+    startTime = time.perf_counter()
+    map = None
+    while client.vehicleData == None and not client.closed:
+        client.update(time.perf_counter() - startTime)
+        if map == None and client.mapHash != None and client.mapTransfer == None:
+            map = findMap(client.mapId, client.mapHash)
+            if map != None:
+                print('Found the map of the host')
+                client.set_ready()
+            else:
+                transferTime = time.perf_counter()
+                client.request_map()
+        if map == None and client.mapTransfer != None:
+            if client.mapTransfer.failed:
+                print('The map of the host is corrupt')
+                client.close()
+                return
+            if client.mapTransfer.data != None:
+                map = mapCache.put_map(client.mapHash, client.mapTransfer.data)
+                print('Received the map of the host: %d bytes in %d chunks, %d bytes uncompressed in %.1f ms' % (client.mapTransfer.bytesReceived,
+                    len(client.mapTransfer.chunks), len(client.mapTransfer.data), (time.perf_counter() - transferTime) * 1000))
+                client.set_ready()
+        time.sleep(0.001)
+    if client.closed or map == None:
+        print('Can\'t join the host')
+        return
+    map.crashes['enabled'] = False
+    print('Joined as vehicle %d on %s' % (client.vehicleId, map.name))
+
+    # Step the simulation in real time until the host has finished the own vehicle
+    simulation = startClientRace(map, client)
+    driver = PathDriver(map)
+    raceTime = time.perf_counter()
+    bytesReceived = client.connection.bytesReceived
+    packetsReceived = client.connection.packetsReceived
+    corrections = []
+    while not client.closed and (client.state == None or not client.state['vehicles'][client.vehicleId]['finished']):
+        while simulation.time < time.perf_counter() - raceTime:
+            if stepClientRace(simulation, client, driver, time.perf_counter() - startTime):
+                corrections.append(client.correction)
+        time.sleep(0.001)
+    duration = time.perf_counter() - raceTime
+
+    printRace(simulation)
+    printDistribution('Corrections of the own vehicle', corrections, 'px')
+    printBandwidth('Client race', client.connection.bytesSent, client.connection.bytesReceived - bytesReceived,
+        client.connection.packetsSent, client.connection.packetsReceived - packetsReceived, duration)
+    client.close()
+
+# Race a host and a client in one process over a loopback link, the clock is simulated so it runs as fast as possible,
+# it measures how far the own vehicle of the client is corrected and how far the other vehicle is drawn from the host position
+def loopbackRace(mapPath, latency, jitter, loss, laps):
+    map = Map.load_from_file(mapPath)
+    if map == None:
+        return
+    map.crashes['enabled'] = False
+    map.laps = laps
+
+    hostAddress = ( '127.0.0.1', Config.MULTIPLAYER_PORT )
+    hostLink, clientLink = Link.create_pair(hostAddress, ( '127.0.0.1', Config.MULTIPLAYER_PORT + 1 ), latency, jitter, loss, random.Random(1))
+    host = NetworkHost('host', map.id, map.name, map.save_to_binary(), hostAddress[1], hostAddress[0], hostLink)
+    client = NetworkClient(hostAddress[0], 'client', 0, VehicleColor.RED, hostAddress[1], clientLink)
+
+    # Join and start the race
+    timeStep = 1 / Config.UPDATES_PER_SECOND
+    now = 0
+    while client.vehicleData == None and now < Config.MULTIPLAYER_TIMEOUT:
+        now += timeStep
+        hostLink.time = now
+        clientLink.time = now
+        host.update(now)
+        client.update(now)
+        if len(host.clients) > 0 and not host.started:
+            hostSimulation = startHostRace(map, host, 0)
+    if client.vehicleData == None:
+        print('The client can\'t join the host')
+        return
+
+    # The client gets its own copy of the map like over a real network
+    clientMap = Map.load_from_file(mapPath)
+    clientMap.crashes['enabled'] = False
+    clientMap.laps = laps
+    clientSimulation = startClientRace(clientMap, client)
+    driver = PathDriver(clientMap)
+
+    # Race until the host has finished both vehicles
+    raceTime = now
+    hostPositions = []
+    corrections = []
+    leads = []
+    interpolationErrors = []
+    delays = []
+    while not hostSimulation.is_finished() and now - raceTime < laps * 600:
+        now += timeStep
+        hostLink.time = now
+        clientLink.time = now
+        stepHostRace(hostSimulation, host, now)
+        hostVehicle = hostSimulation.vehicles[0]
+        hostPositions.append(( hostVehicle.x, hostVehicle.y ))
+
+        if stepClientRace(clientSimulation, client, driver, now) and client.state['vehicles'][client.vehicleId]['started']:
+            corrections.append(client.correction)
+
+        # How far the prediction is ahead of the newest state of the host
+        vehicle = clientSimulation.vehicles[client.vehicleId]
+        if client.state != None and vehicle.started and not vehicle.finished:
+            vehicleState = client.state['vehicles'][client.vehicleId]
+            leads.append(math.sqrt((vehicle.x - vehicleState['x']) ** 2 + (vehicle.y - vehicleState['y']) ** 2))
+
+        # How far the other vehicle is drawn from where the host had it at the render time
+        otherVehicle = clientSimulation.vehicles[0]
+        if client.renderTime != None and client.renderTime > raceTime and otherVehicle.started and not otherVehicle.finished:
+            x, y = hostPositions[min(max(round((client.renderTime - raceTime) / timeStep) - 1, 0), len(hostPositions) - 1)]
+            interpolationErrors.append(math.sqrt((otherVehicle.x - x) ** 2 + (otherVehicle.y - y) ** 2))
+            delays.append((now - client.renderTime) * 1000)
+    duration = now - raceTime
+
+    print('Loopback race with %.0f ms latency, %.0f ms jitter and %.0f%% loss' % (latency * 1000, jitter * 1000, loss * 100))
+    printRace(hostSimulation)
+    printDistribution('Corrections of the own vehicle', corrections, 'px')
+    printDistribution('Prediction ahead of the newest host state', leads, 'px')
+    printDistribution('Other vehicle from the host position at the render time', interpolationErrors, 'px')
+    printDistribution('Render delay of the other vehicle', delays, 'ms')
+    printBandwidth('Client race', clientLink.bytesSent, clientLink.bytesReceived, clientLink.packetsSent, clientLink.packetsReceived, duration)
+
+# Measure the state messages of races with 2, 8 and 32 vehicles that the path driver drives, the vehicles start one after
+# the other so they spread over the track, every tick is encoded as a full snapshot and as deltas against the snapshot
+# of one tick and of three ticks ago, like a client that receives the states with a round trip time of 100 ms
+def snapshotsBenchmark(mapPath, seconds):
+    map = Map.load_from_file(mapPath)
+    if map == None:
+        return
+    map.crashes['enabled'] = False
+    map.laps = 1000
+
+    stepsPerTick = round(Config.UPDATES_PER_SECOND / Config.MULTIPLAYER_TICK_RATE)
+    print('Snapshots of %d seconds on %s, %d ticks per second, bytes per message without IP/UDP overhead' % (seconds, map.name, Config.MULTIPLAYER_TICK_RATE))
+    for vehicleCount in ( 2, 8, 32 ):
+        simulation = Simulation(map, [ { 'type': vehicles[i % len(vehicles)], 'color': i % 5 } for i in range(vehicleCount) ],
+            [ PathDriver(map) for i in range(vehicleCount) ])
+        for vehicle in simulation.vehicles:
+            vehicle.started = False
+
+        # Run the race and take a snapshot every tick
+        snapshots = []
+        while simulation.time < seconds:
+            for vehicle in simulation.vehicles:
+                if not vehicle.started and simulation.time >= vehicle.id * 0.5:
+                    vehicle.started = True
+                    vehicle.startTime = simulation.time
+            simulation.step()
+            if simulation.steps % stepsPerTick == 0:
+                snapshots.append(Snapshot.quantise(simulation.vehicles))
+
+        # Encode and decode every tick against each base
+        print('%d vehicles:' % vehicleCount)
+        print('    Float structs (protocol 2): %d B/tick' % (Message.HEADER.size + 17 + vehicleCount * 23))
+        for name, distance in ( ( 'Full snapshot', None ), ( 'Delta of 1 tick', 1 ), ( 'Delta of 3 ticks', 3 ) ):
+            messages = []
+            encodeTime = time.perf_counter()
+            for tick in range(len(snapshots)):
+                if distance != None and tick >= distance:
+                    messages.append(Message.encode_state(tick, tick, 0, snapshots[tick], tick - distance, snapshots[tick - distance]))
+                else:
+                    messages.append(Message.encode_state(tick, tick, 0, snapshots[tick]))
+            encodeTime = time.perf_counter() - encodeTime
+
+            decodeTime = time.perf_counter()
+            for message in messages:
+                messageType, body = Message.decode(message)
+                state = Message.decode_state(body, lambda tick: snapshots[tick])
+                if state['snapshot'] != snapshots[state['tick']]:
+                    print('    %s: decoded snapshot of tick %d is not equal' % (name, state['tick']))
+                    return
+            decodeTime = time.perf_counter() - decodeTime
+
+            print('    %s: %.1f B/tick (max %d), encode %.1f us, decode %.1f us' % (name, sum(len(message) for message in messages) / len(messages),
+                max(len(message) for message in messages), encodeTime / len(messages) * 1e6, decodeTime / len(messages) * 1e6))
+
+        # The quantise time of the host for every tick
+        quantiseTime = time.perf_counter()
+        for i in range(len(snapshots)):
+            Snapshot.quantise(simulation.vehicles)
+        print('    Quantise: %.1f us' % ((time.perf_counter() - quantiseTime) / len(snapshots) * 1e6))
+
+# Host, join or loopback a network race or measure the snapshots
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or sys.argv[1] not in ( 'host', 'join', 'loopback', 'snapshots' ) or (sys.argv[1] != 'join' and len(sys.argv) < 3):
+        print('Usage: python src/netrace.py host map.json [port] [vehicle id]\n       python src/netrace.py join [address] [port] [vehicle id]\n' +
+            '       python src/netrace.py loopback map.json [latency ms] [jitter ms] [loss %] [laps]\n       python src/netrace.py snapshots map.json [seconds]')
+        sys.exit(1)
+
+    # Show map errors in the console
+    dialogs.use_console()
+
+    if sys.argv[1] == 'host':
+        hostRace(sys.argv[2], int(sys.argv[3]) if len(sys.argv) > 3 else Config.MULTIPLAYER_PORT, int(sys.argv[4]) if len(sys.argv) > 4 else 0)
+    if sys.argv[1] == 'join':
+        joinRace(sys.argv[2] if len(sys.argv) > 2 else '127.0.0.1', int(sys.argv[3]) if len(sys.argv) > 3 else Config.MULTIPLAYER_PORT,
+            int(sys.argv[4]) if len(sys.argv) > 4 else 0)
+    if sys.argv[1] == 'loopback':
+        loopbackRace(sys.argv[2], float(sys.argv[3]) / 1000 if len(sys.argv) > 3 else 0.05, float(sys.argv[4]) / 1000 if len(sys.argv) > 4 else 0.01,
+            float(sys.argv[5]) / 100 if len(sys.argv) > 5 else 0.05, int(sys.argv[6]) if len(sys.argv) > 6 else 1)
+    if sys.argv[1] == 'snapshots':
+        snapshotsBenchmark(sys.argv[2], float(sys.argv[3]) if len(sys.argv) > 3 else 60)
@@ -0,0 +1,1095 @@
+# BassieRacing - Network
+# The multiplayer networking, a host that announces its game with UDP broadcasts, a listener that collects the hosts
+# and a compact binary protocol that syncs the vehicles of a race with a fixed tick rate, it doesn't need pygame
+# The client predicts its own vehicle with its inputs and corrects it with the states of the host,
+# the other vehicles are drawn between the states of the host a short delay in the past
+# The states are quantised, delta encoded against the last state that the client received and bit packed
+# The lobby server hosts many rooms and relays the messages of a game between the players of a room
+# The host sends the content hash of its map and a client that doesn't have that map gets it in compressed chunks
+
+# Import modules
+from constants import *
+import hashlib
+import math
+import socket
+import struct
+import zlib
+
+# The message class, every message starts with the magic, the protocol version and the message type
+class Message:
+    MAGIC = b'BR'
+    PROTOCOL_VERSION = 7
+    HEADER = struct.Struct('<2sBB')
+
+    ANNOUNCE = 0
+    JOIN = 1
+    WELCOME = 2
+    START = 3
+    INPUT = 4
+    STATE = 5
+    LEAVE = 6
+
+    # The messages between the players and the lobby server
+    PING = 7
+    PONG = 8
+    ROOM_LIST = 9
+    ROOMS = 10
+    ROOM_JOIN = 11
+    ROOM = 12
+    ROOM_LEAVE = 13
+    ROOM_MAP = 14
+    ROOM_VEHICLE = 15
+    RELAY = 16
+    ERROR = 17
+    MAP_REQUEST = 18
+    MAP_CHUNK = 19
+    COOKIE = 20
+
+    # The message bodies, the names of the announce and join messages follow as length prefixed strings,
+    # the inputs of the input message, the vehicles of the start message and the snapshot of the state message follow the body,
+    # the welcome message has the content hash of the map and a join message tells if the client has that map
+    ANNOUNCE_BODY = struct.Struct('<HBq')
+    JOIN_BODY = struct.Struct('<BBB')
+    WELCOME_BODY = struct.Struct('<Bq20sB')
+    START_BODY = struct.Struct('<B')
+    VEHICLE_DATA = struct.Struct('<BB')
+    INPUT_BODY = struct.Struct('<IIB')
+    STATE_BODY = struct.Struct('<IBdI')
+
+    # The map transfer message bodies, a map request asks for the chunk indexes that follow or for all chunks when there are none
+    MAP_REQUEST_BODY = struct.Struct('<20sH')
+    MAP_CHUNK_INDEX = struct.Struct('<H')
+    MAP_CHUNK_BODY = struct.Struct('<20sHH')
+
+    # The lobby message bodies, the names of the rooms, players and maps follow as length prefixed strings, a room list
+    # asks for the rooms from an offset and is padded, a room join with room id zero creates a new room, a new address
+    # first gets a cookie and joins with it, a relay message is for or from a player index of the room or for all players
+    ROOM_LIST_BODY = struct.Struct('<H')
+    ROOMS_BODY = struct.Struct('<B')
+    ROOM_INFO = struct.Struct('<HBBq')
+    COOKIE_SIZE = 8
+    ROOM_JOIN_BODY = struct.Struct('<8sHBB')
+    ROOM_BODY = struct.Struct('<HBBq20sB')
+    ROOM_PLAYER = struct.Struct('<BBB')
+    ROOM_MAP_BODY = struct.Struct('<q20s')
+    RELAY_BODY = struct.Struct('<B')
+    ALL_PLAYERS = 255
+
+    # Encode a message
+    @staticmethod
+    def encode(messageType, body = b''):
+        return Message.HEADER.pack(Message.MAGIC, Message.PROTOCOL_VERSION, messageType) + body
+
+    # Decode a message to its type and body, returns None when it is not a message of this protocol version
+    @staticmethod
+    def decode(data):
+        if len(data) < Message.HEADER.size:
+            return
+        magic, version, messageType = Message.HEADER.unpack_from(data)
+        if magic != Message.MAGIC or version != Message.PROTOCOL_VERSION:
+            return
+        return messageType, data[Message.HEADER.size:]
+
+    # Pack a string with its length
+    @staticmethod
+    def pack_string(text):
+        data = text.encode('utf8')[:255]
+        return bytes(( len(data), )) + data
+
+    # Unpack a string at an offset, returns the string and the offset after it
+    @staticmethod
+    def unpack_string(data, offset):
+        length = data[offset]
+        return data[offset + 1:offset + 1 + length].decode('utf8', 'replace'), offset + 1 + length
+
+    # Encode an announce message of a host
+    @staticmethod
+    def encode_announce(port, players, mapId, name, mapName):
+        return Message.encode(Message.ANNOUNCE, Message.ANNOUNCE_BODY.pack(port, players, mapId) + Message.pack_string(name) + Message.pack_string(mapName))
+
+    # Decode an announce message
+    @staticmethod
+    def decode_announce(body):
+        port, players, mapId = Message.ANNOUNCE_BODY.unpack_from(body)
+        name, offset = Message.unpack_string(body, Message.ANNOUNCE_BODY.size)
+        mapName, offset = Message.unpack_string(body, offset)
+        return { 'port': port, 'players': players, 'map-id': mapId, 'name': name, 'map-name': mapName }
+
+    # Encode a join message with the vehicle of the client, the client is ready when it has the map of the host
+    @staticmethod
+    def encode_join(vehicleTypeId, color, name, ready = False):
+        return Message.encode(Message.JOIN, Message.JOIN_BODY.pack(vehicleTypeId, color, 1 if ready else 0) + Message.pack_string(name))
+
+    # Decode a join message
+    @staticmethod
+    def decode_join(body):
+        vehicleTypeId, color, ready = Message.JOIN_BODY.unpack_from(body)
+        name, offset = Message.unpack_string(body, Message.JOIN_BODY.size)
+        return { 'vehicle-type-id': vehicleTypeId, 'color': color, 'name': name, 'ready': ready != 0 }
+
+    # Encode a welcome message with the vehicle id of the client and the id and content hash of the map
+    @staticmethod
+    def encode_welcome(vehicleId, mapId, mapHash, tickRate):
+        return Message.encode(Message.WELCOME, Message.WELCOME_BODY.pack(vehicleId, mapId, mapHash, tickRate))
+
+    # Decode a welcome message
+    @staticmethod
+    def decode_welcome(body):
+        return Message.WELCOME_BODY.unpack_from(body)
+
+    # Encode a map request message for some chunks of the map with the content hash, no chunk indexes ask for all chunks
+    @staticmethod
+    def encode_map_request(mapHash, indexes = []):
+        return Message.encode(Message.MAP_REQUEST, Message.MAP_REQUEST_BODY.pack(mapHash, len(indexes)) +
+            b''.join(Message.MAP_CHUNK_INDEX.pack(index) for index in indexes))
+
+    # Decode a map request message
+    @staticmethod
+    def decode_map_request(body):
+        mapHash, count = Message.MAP_REQUEST_BODY.unpack_from(body)
+        return mapHash, [ Message.MAP_CHUNK_INDEX.unpack_from(body, Message.MAP_REQUEST_BODY.size + i * Message.MAP_CHUNK_INDEX.size)[0] for i in range(count) ]
+
+    # Encode a map chunk message with one of the compressed chunks of a map
+    @staticmethod
+    def encode_map_chunk(mapHash, index, count, data):
+        return Message.encode(Message.MAP_CHUNK, Message.MAP_CHUNK_BODY.pack(mapHash, index, count) + data)
+
+    # Decode a map chunk message
+    @staticmethod
+    def decode_map_chunk(body):
+        mapHash, index, count = Message.MAP_CHUNK_BODY.unpack_from(body)
+        return mapHash, index, count, body[Message.MAP_CHUNK_BODY.size:]
+
+    # Encode a start message with the vehicle type id and color of every vehicle
+    @staticmethod
+    def encode_start(vehicleData):
+        return Message.encode(Message.START, Message.START_BODY.pack(len(vehicleData)) +
+            b''.join(Message.VEHICLE_DATA.pack(vehicleTypeId, color) for vehicleTypeId, color in vehicleData))
+
+    # Decode a start message
+    @staticmethod
+    def decode_start(body):
+        count, = Message.START_BODY.unpack_from(body)
+        return [ Message.VEHICLE_DATA.unpack_from(body, Message.START_BODY.size + i * Message.VEHICLE_DATA.size) for i in range(count) ]
+
+    # Encode an input message with the inputs of the steps up to the sequence number, every input is one byte,
+    # the acknowledged tick is the newest received state tick plus one or zero when there is no state yet
+    @staticmethod
+    def encode_input(sequence, acknowledgedTick, inputs):
+        return Message.encode(Message.INPUT, Message.INPUT_BODY.pack(sequence, acknowledgedTick, len(inputs)) + bytes(moving | (turning << 2) for moving, turning in inputs))
+
+    # Decode an input message
+    @staticmethod
+    def decode_input(body):
+        sequence, acknowledgedTick, count = Message.INPUT_BODY.unpack_from(body)
+        data = body[Message.INPUT_BODY.size:Message.INPUT_BODY.size + count]
+        if len(data) != count:
+            raise IndexError()
+        return sequence, acknowledgedTick, [ ( input & 3, input >> 2 ) for input in data ]
+
+    # Encode a state message with a snapshot of all vehicles, delta encoded against the base snapshot of an earlier tick when there is one,
+    # the input sequence is the last input of the client that the host used
+    @staticmethod
+    def encode_state(tick, time, inputSequence, snapshot, baseTick = None, baseSnapshot = None):
+        return Message.encode(Message.STATE, Message.STATE_BODY.pack(tick, tick - baseTick if baseSnapshot != None else 0, time, inputSequence) +
+            Snapshot.encode(snapshot, baseSnapshot))
+
+    # Decode a state message, the snapshots function gives the snapshot of an earlier tick or None when it is not received,
+    # returns None when the base snapshot is not received
+    @staticmethod
+    def decode_state(body, snapshots):
+        tick, baseDistance, time, inputSequence = Message.STATE_BODY.unpack_from(body)
+        baseSnapshot = None
+        if baseDistance != 0:
+            baseSnapshot = snapshots(tick - baseDistance)
+            if baseSnapshot == None:
+                return
+        snapshot = Snapshot.decode(body[Message.STATE_BODY.size:], baseSnapshot)
+        return {
+            'tick': tick,
+            'time': time,
+            'input-sequence': inputSequence,
+            'snapshot': snapshot,
+            'vehicles': [ Snapshot.to_vehicle_state(id, fields) for id, fields in enumerate(snapshot) ]
+        }
+
+    # Encode a room list message that asks for the rooms from an offset, padded to a size because the lobby server
+    # only sends a rooms message that is not bigger than the request
+    @staticmethod
+    def encode_room_list(offset, size = Config.SERVER_ROOMS_REQUEST_SIZE):
+        body = Message.ROOM_LIST_BODY.pack(offset)
+        return Message.encode(Message.ROOM_LIST, body + bytes(max(size - Message.HEADER.size - len(body), 0)))
+
+    # Decode a room list message
+    @staticmethod
+    def decode_room_list(body):
+        return Message.ROOM_LIST_BODY.unpack_from(body)[0]
+
+    # Encode a rooms message with the rooms of the lobby server
+    @staticmethod
+    def encode_rooms(rooms):
+        return Message.encode(Message.ROOMS, Message.ROOMS_BODY.pack(len(rooms)) + b''.join(
+            Message.ROOM_INFO.pack(room['id'], len(room['players']), Config.SERVER_ROOM_SIZE, room['map-id']) +
+                Message.pack_string(room['name']) + Message.pack_string(room['map-name'])
+            for room in rooms))
+
+    # Decode a rooms message
+    @staticmethod
+    def decode_rooms(body):
+        count, = Message.ROOMS_BODY.unpack_from(body)
+        offset = Message.ROOMS_BODY.size
+        rooms = []
+        for i in range(count):
+            id, players, maxPlayers, mapId = Message.ROOM_INFO.unpack_from(body, offset)
+            name, offset = Message.unpack_string(body, offset + Message.ROOM_INFO.size)
+            mapName, offset = Message.unpack_string(body, offset)
+            rooms.append({ 'id': id, 'players': players, 'max-players': maxPlayers, 'map-id': mapId, 'name': name, 'map-name': mapName })
+        return rooms
+
+    # Encode a room join message with the vehicle and the name of the player, the room name is used when a new room is created,
+    # the lobby server only lets a new address join with the cookie that it has sent to that address
+    @staticmethod
+    def encode_room_join(roomId, vehicleTypeId, color, name, roomName = '', cookie = bytes(COOKIE_SIZE)):
+        return Message.encode(Message.ROOM_JOIN, Message.ROOM_JOIN_BODY.pack(cookie, roomId, vehicleTypeId, color) +
+            Message.pack_string(name) + Message.pack_string(roomName))
+
+    # Decode a room join message
+    @staticmethod
+    def decode_room_join(body):
+        cookie, roomId, vehicleTypeId, color = Message.ROOM_JOIN_BODY.unpack_from(body)
+        name, offset = Message.unpack_string(body, Message.ROOM_JOIN_BODY.size)
+        roomName, offset = Message.unpack_string(body, offset)
+        return { 'cookie': cookie, 'room-id': roomId, 'vehicle-type-id': vehicleTypeId, 'color': color, 'name': name, 'room-name': roomName }
+
+    # Encode a cookie message, it is smaller than every room join message
+    @staticmethod
+    def encode_cookie(cookie):
+        return Message.encode(Message.COOKIE, cookie)
+
+    # Decode a cookie message
+    @staticmethod
+    def decode_cookie(body):
+        return bytes(body[:Message.COOKIE_SIZE])
+
+    # Encode a room message with the map and the players of a room for one of its players
+    @staticmethod
+    def encode_room(room, playerIndex):
+        return Message.encode(Message.ROOM, Message.ROOM_BODY.pack(room['id'], playerIndex, room['owner'], room['map-id'], room['map-hash'], len(room['players'])) +
+            Message.pack_string(room['map-name']) + b''.join(
+                Message.ROOM_PLAYER.pack(player['index'], player['vehicle-type-id'], player['color']) + Message.pack_string(player['name'])
+                for player in room['players'].values()))
+
+    # Decode a room message
+    @staticmethod
+    def decode_room(body):
+        id, playerIndex, owner, mapId, mapHash, count = Message.ROOM_BODY.unpack_from(body)
+        mapName, offset = Message.unpack_string(body, Message.ROOM_BODY.size)
+        players = []
+        for i in range(count):
+            index, vehicleTypeId, color = Message.ROOM_PLAYER.unpack_from(body, offset)
+            name, offset = Message.unpack_string(body, offset + Message.ROOM_PLAYER.size)
+            players.append({ 'index': index, 'vehicle-type-id': vehicleTypeId, 'color': color, 'name': name })
+        return { 'id': id, 'player-index': playerIndex, 'owner': owner, 'map-id': mapId, 'map-hash': mapHash, 'map-name': mapName, 'players': players }
+
+    # Encode a room map message with the id and content hash of the map, only the owner of a room selects the map
+    @staticmethod
+    def encode_room_map(mapId, mapHash, mapName):
+        return Message.encode(Message.ROOM_MAP, Message.ROOM_MAP_BODY.pack(mapId, mapHash) + Message.pack_string(mapName))
+
+    # Decode a room map message
+    @staticmethod
+    def decode_room_map(body):
+        mapId, mapHash = Message.ROOM_MAP_BODY.unpack_from(body)
+        mapName, offset = Message.unpack_string(body, Message.ROOM_MAP_BODY.size)
+        return mapId, mapHash, mapName
+
+    # Encode a room vehicle message with the selected vehicle of a player
+    @staticmethod
+    def encode_room_vehicle(vehicleTypeId, color):
+        return Message.encode(Message.ROOM_VEHICLE, Message.VEHICLE_DATA.pack(vehicleTypeId, color))
+
+    # Decode a room vehicle message
+    @staticmethod
+    def decode_room_vehicle(body):
+        return Message.VEHICLE_DATA.unpack_from(body)
+
+    # Encode a relay message with a message of the game for a player index or from a player index
+    @staticmethod
+    def encode_relay(playerIndex, data):
+        return Message.encode(Message.RELAY, Message.RELAY_BODY.pack(playerIndex) + data)
+
+    # Decode a relay message to the player index and the message of the game
+    @staticmethod
+    def decode_relay(body):
+        playerIndex, = Message.RELAY_BODY.unpack_from(body)
+        return playerIndex, body[Message.RELAY_BODY.size:]
+
+    # Encode an error message with the reason
+    @staticmethod
+    def encode_error(reason):
+        return Message.encode(Message.ERROR, Message.pack_string(reason))
+
+    # Decode an error message
+    @staticmethod
+    def decode_error(body):
+        return Message.unpack_string(body, 0)[0]
+
+# The map transfer class, the host splits the binary map data of its map in compressed chunks and a client that doesn't
+# have the map collects them, the map data is checked with its content hash
+class MapTransfer:
+    # Get the content hash of binary map data
+    @staticmethod
+    def get_hash(data):
+        return hashlib.sha1(data).digest()
+
+    # Split binary map data in compressed chunks
+    @staticmethod
+    def split(data):
+        compressedData = zlib.compress(data, 9)
+        return [ compressedData[i:i + Config.MAP_TRANSFER_CHUNK_SIZE] for i in range(0, len(compressedData), Config.MAP_TRANSFER_CHUNK_SIZE) ]
+
+    # Create map transfer of the map with the content hash
+    def __init__(self, mapHash):
+        self.mapHash = mapHash
+        self.chunks = None
+        self.data = None
+        self.failed = False
+        self.bytesReceived = 0
+
+    # Get the max number of chunks of map data of the max size, the compressed data can be a little bigger than the data
+    @staticmethod
+    def get_max_chunks():
+        return (Config.MAP_TRANSFER_MAX_SIZE + Config.MAP_TRANSFER_MAX_SIZE // 1000 + 64) // Config.MAP_TRANSFER_CHUNK_SIZE + 1
+
+    # Add a received chunk, the map data is set when all chunks are received and the map is not corrupt,
+    # the transfer fails when there are more chunks or more map data than a map of the max size has
+    def add_chunk(self, index, count, data):
+        if self.data != None or self.failed:
+            return
+        if self.chunks == None:
+            if count > MapTransfer.get_max_chunks():
+                self.failed = True
+                return
+            self.chunks = [ None for i in range(count) ]
+        if count != len(self.chunks) or index >= count or self.chunks[index] != None:
+            return
+        self.chunks[index] = data
+        self.bytesReceived += len(data)
+
+        if None not in self.chunks:
+            decompressor = zlib.decompressobj()
+            try:
+                data = decompressor.decompress(b''.join(self.chunks), Config.MAP_TRANSFER_MAX_SIZE)
+            except zlib.error:
+                self.failed = True
+                return
+            if decompressor.eof and MapTransfer.get_hash(data) == self.mapHash:
+                self.data = data
+            else:
+                self.failed = True
+
+    # Get the indexes of the chunks that are not received yet, an empty list when it is not known how many chunks there are
+    def get_missing_chunks(self):
+        if self.chunks == None:
+            return []
+        return [ i for i, chunk in enumerate(self.chunks) if chunk == None ]
+
+# The bit writer class, packs values with a number of bits after each other
+class BitWriter:
+    # Create bit writer
+    def __init__(self):
+        self.value = 0
+        self.size = 0
+
+    # Write a value with a number of bits, the value must fit in the bits
+    def write(self, value, bits):
+        assert value >= 0 and value < 1 << bits
+        self.value |= value << self.size
+        self.size += bits
+
+    # Get the written bits as bytes
+    def to_bytes(self):
+        return self.value.to_bytes((self.size + 7) // 8, 'little')
+
+# The bit reader class, reads the values of a bit writer
+class BitReader:
+    # Create bit reader
+    def __init__(self, data):
+        self.value = int.from_bytes(data, 'little')
+        self.size = len(data) * 8
+        self.position = 0
+
+    # Read a value with a number of bits
+    def read(self, bits):
+        if self.position + bits > self.size:
+            raise IndexError()
+        value = (self.value >> self.position) & ((1 << bits) - 1)
+        self.position += bits
+        return value
+
+# The snapshot class, a snapshot is a list with a tuple of quantised integer fields for every vehicle
+class Snapshot:
+    # The fields of a quantised vehicle
+    X = 0
+    Y = 1
+    ANGLE = 2
+    VELOCITY = 3
+    ACCELERATION = 4
+    LAP = 5
+    CHECKPOINTS = 6
+    FLAGS = 7
+    EMPTY_VEHICLE = ( 0, 0, 0, 0, 0, 0, 0, 0 )
+
+    # The steps per pixel and per circle of the quantised fields
+    POSITION_STEPS = 16
+    ANGLE_STEPS = 1 << 16
+    VELOCITY_STEPS = 16
+    ACCELERATION_STEPS = 16
+
+    # The vehicle flags
+    STARTED = 1
+    CRASHED = 2
+    FINISHED = 4
+
+    # A changed field is written as a bit, a two bit size and the delta with that size, the last size
+    # is for big deltas and writes the bit length of the delta first, the highest length escapes to a long
+    # length for the deltas of wide fields like the checkpoints of a map with many checkpoints
+    VEHICLE_COUNT_BITS = 8
+    DELTA_SIZE_BITS = ( 4, 10, 16 )
+    DELTA_LENGTH_BITS = 6
+    DELTA_LONG_LENGTH_BITS = 16
+
+    # Quantise the vehicles to a snapshot
+    @staticmethod
+    def quantise(vehicles):
+        return [
+            (
+                round(vehicle.x * Snapshot.POSITION_STEPS),
+                round(vehicle.y * Snapshot.POSITION_STEPS),
+                round(vehicle.angle / (math.pi * 2) * Snapshot.ANGLE_STEPS) % Snapshot.ANGLE_STEPS,
+                round(vehicle.velocity * Snapshot.VELOCITY_STEPS),
+                round(vehicle.acceleration * Snapshot.ACCELERATION_STEPS),
+                vehicle.lap,
+                sum(1 << i for i, checked in enumerate(vehicle.checkedCheckpoints) if checked),
+                (Snapshot.STARTED if vehicle.started else 0) |
+                (Snapshot.CRASHED if vehicle.crashed else 0) |
+                (Snapshot.FINISHED if vehicle.finished else 0)
+            )
+            for vehicle in vehicles
+        ]
+
+    # Convert the quantised fields of a vehicle back to a vehicle state
+    @staticmethod
+    def to_vehicle_state(id, fields):
+        return {
+            'id': id,
+            'x': fields[Snapshot.X] / Snapshot.POSITION_STEPS,
+            'y': fields[Snapshot.Y] / Snapshot.POSITION_STEPS,
+            'angle': fields[Snapshot.ANGLE] / Snapshot.ANGLE_STEPS * (math.pi * 2),
+            'velocity': fields[Snapshot.VELOCITY] / Snapshot.VELOCITY_STEPS,
+            'acceleration': fields[Snapshot.ACCELERATION] / Snapshot.ACCELERATION_STEPS,
+            'lap': fields[Snapshot.LAP],
+            'checkpoints': fields[Snapshot.CHECKPOINTS],
+            'started': fields[Snapshot.FLAGS] & Snapshot.STARTED != 0,
+            'crashed': fields[Snapshot.FLAGS] & Snapshot.CRASHED != 0,
+            'finished': fields[Snapshot.FLAGS] & Snapshot.FINISHED != 0
+        }
+
+    # Write the delta of a field, zero is one bit and the others are zigzag encoded so small negative deltas stay small
+    @staticmethod
+    def write_delta(writer, delta):
+        if delta == 0:
+            writer.write(0, 1)
+            return
+
+        value = (delta * 2 if delta > 0 else -delta * 2 - 1) - 1
+        for i, bits in enumerate(Snapshot.DELTA_SIZE_BITS):
+            if value < 1 << bits:
+                writer.write(1 | (i << 1), 3)
+                writer.write(value, bits)
+                return
+
+        length = value.bit_length()
+        writer.write(1 | (len(Snapshot.DELTA_SIZE_BITS) << 1), 3)
+        if length < (1 << Snapshot.DELTA_LENGTH_BITS) - 1:
+            writer.write(length, Snapshot.DELTA_LENGTH_BITS)
+        else:
+            writer.write((1 << Snapshot.DELTA_LENGTH_BITS) - 1, Snapshot.DELTA_LENGTH_BITS)
+            writer.write(length, Snapshot.DELTA_LONG_LENGTH_BITS)
+        writer.write(value, length)
+
+    # Read the delta of a field
+    @staticmethod
+    def read_delta(reader):
+        if reader.read(1) == 0:
+            return 0
+
+        size = reader.read(2)
+        if size < len(Snapshot.DELTA_SIZE_BITS):
+            value = reader.read(Snapshot.DELTA_SIZE_BITS[size]) + 1
+        else:
+            length = reader.read(Snapshot.DELTA_LENGTH_BITS)
+            if length == (1 << Snapshot.DELTA_LENGTH_BITS) - 1:
+                length = reader.read(Snapshot.DELTA_LONG_LENGTH_BITS)
+            value = reader.read(length) + 1
+        return value // 2 if value % 2 == 0 else -(value + 1) // 2
+
+    # Encode a snapshot as the deltas against a base snapshot, without a base snapshot against empty vehicles,
+    # an unchanged vehicle is one bit and the angle delta goes the short way around the circle
+    @staticmethod
+    def encode(snapshot, baseSnapshot = None):
+        writer = BitWriter()
+        writer.write(len(snapshot), Snapshot.VEHICLE_COUNT_BITS)
+        for i, fields in enumerate(snapshot):
+            baseFields = baseSnapshot[i] if baseSnapshot != None and i < len(baseSnapshot) else Snapshot.EMPTY_VEHICLE
+            if fields == baseFields:
+                writer.write(0, 1)
+                continue
+
+            writer.write(1, 1)
+            for field, ( value, baseValue ) in enumerate(zip(fields, baseFields)):
+                delta = value - baseValue
+                if field == Snapshot.ANGLE:
+                    delta = (delta + Snapshot.ANGLE_STEPS // 2) % Snapshot.ANGLE_STEPS - Snapshot.ANGLE_STEPS // 2
+                Snapshot.write_delta(writer, delta)
+        return writer.to_bytes()
+
+    # Decode a snapshot with the same base snapshot
+    @staticmethod
+    def decode(data, baseSnapshot = None):
+        reader = BitReader(data)
+        snapshot = []
+        for i in range(reader.read(Snapshot.VEHICLE_COUNT_BITS)):
+            baseFields = baseSnapshot[i] if baseSnapshot != None and i < len(baseSnapshot) else Snapshot.EMPTY_VEHICLE
+            if reader.read(1) == 0:
+                snapshot.append(baseFields)
+                continue
+
+            fields = [ baseValue + Snapshot.read_delta(reader) for baseValue in baseFields ]
+            fields[Snapshot.ANGLE] %= Snapshot.ANGLE_STEPS
+            snapshot.append(tuple(fields))
+        return snapshot
+
+# The connection class, a non blocking UDP socket that counts the sent and received bytes
+class Connection:
+    # The bytes that IPv4 and UDP add to every packet
+    PACKET_OVERHEAD = 28
+
+    # Create connection
+    def __init__(self, port = 0, reuse = False):
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        if reuse:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if hasattr(socket, 'SO_REUSEPORT'):
+                self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        self.socket.setblocking(False)
+        self.socket.bind(( '', port ))
+
+        self.bytesSent = 0
+        self.bytesReceived = 0
+        self.packetsSent = 0
+        self.packetsReceived = 0
+
+    # Send a message, sending may fail when there is no network
+    def send(self, data, address):
+        try:
+            self.socket.sendto(data, address)
+        except OSError:
+            return
+        self.bytesSent += len(data)
+        self.packetsSent += 1
+
+    # Receive all waiting messages as ( message type, body, address ) tuples
+    def receive(self):
+        messages = []
+        while True:
+            try:
+                data, address = self.socket.recvfrom(65535)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError:
+                continue
+            self.bytesReceived += len(data)
+            self.packetsReceived += 1
+
+            message = Message.decode(data)
+            if message != None:
+                messages.append(( message[0], message[1], address ))
+        return messages
+
+    # Close connection
+    def close(self):
+        self.socket.close()
+
+# The network host class, announces the game, accepts a client and sends it the vehicle states with a fixed tick rate
+class NetworkHost:
+    # Create network host
+    def __init__(self, name, mapId, mapName, mapData, port = Config.MULTIPLAYER_PORT, announceAddress = '<broadcast>', connection = None):
+        self.name = name
+        self.mapId = mapId
+        self.mapName = mapName
+        self.mapHash = MapTransfer.get_hash(mapData)
+        self.mapChunks = MapTransfer.split(mapData)
+        self.port = port
+        self.announceAddress = announceAddress
+        self.connection = connection if connection != None else Connection(port)
+
+        self.clients = {}
+        self.started = False
+        self.vehicleData = None
+
+        # The sent snapshots of the last ticks, the base snapshots of the delta encoding
+        self.snapshots = {}
+
+        self.tick = 0
+        self.nextAnnounceTime = 0
+        self.nextTickTime = 0
+
+    # Handle the messages of the clients
+    def receive(self, time):
+        for messageType, body, address in self.connection.receive():
+            try:
+                client = self.clients.get(address)
+                if client != None:
+                    client['last-seen'] = time
+
+                # Accept a new client when the race isn't started and there is a free vehicle
+                if messageType == Message.JOIN:
+                    if client == None and not self.started and len(self.clients) < Config.MULTIPLAYER_MAX_CLIENTS:
+                        client = Message.decode_join(body)
+                        client['address'] = address
+                        client['vehicle-id'] = len(self.clients) + 1
+                        client['last-seen'] = time
+                        client['started'] = False
+                        client['inputs'] = []
+                        client['input-budget'] = 0
+                        client['received-sequence'] = 0
+                        client['input-sequence'] = 0
+                        client['acknowledged-tick'] = None
+                        client['bytes-sent'] = 0
+                        self.clients[address] = client
+
+                    # The client joins until the race starts so it says when it has the map
+                    if client != None:
+                        client['ready'] = Message.decode_join(body)['ready']
+                        self.send(client, Message.encode_welcome(client['vehicle-id'], self.mapId, self.mapHash, Config.MULTIPLAYER_TICK_RATE))
+                    else:
+                        self.connection.send(Message.encode(Message.LEAVE), address)
+
+                # Send the requested chunks of the map all at once
+                if messageType == Message.MAP_REQUEST and client != None:
+                    mapHash, indexes = Message.decode_map_request(body)
+                    if mapHash == self.mapHash:
+                        for index in (indexes if len(indexes) > 0 else range(len(self.mapChunks))):
+                            if index < len(self.mapChunks):
+                                self.send(client, Message.encode_map_chunk(self.mapHash, index, len(self.mapChunks), self.mapChunks[index]))
+
+                # Queue the inputs of a client that are not received yet, every input message repeats
+                # the inputs that the host has not used yet so lost messages are filled in by the next ones,
+                # messages with more inputs than a client repeats or too far ahead are ignored and a full queue takes no more inputs
+                if messageType == Message.INPUT and client != None:
+                    sequence, acknowledgedTick, inputs = Message.decode_input(body)
+                    client['started'] = True
+                    if acknowledgedTick != 0 and (client['acknowledged-tick'] == None or acknowledgedTick - 1 > client['acknowledged-tick']):
+                        client['acknowledged-tick'] = acknowledgedTick - 1
+                    if (
+                        len(inputs) <= Config.MULTIPLAYER_MAX_INPUTS and
+                        sequence <= client['received-sequence'] + Config.UPDATES_PER_SECOND * Config.MULTIPLAYER_TIMEOUT
+                    ):
+                        for i, input in enumerate(inputs):
+                            inputSequence = sequence - len(inputs) + 1 + i
+                            if inputSequence > client['received-sequence'] and len(client['inputs']) < Config.MULTIPLAYER_MAX_INPUTS:
+                                client['received-sequence'] = inputSequence
+                                client['inputs'].append(( inputSequence, *input ))
+
+                if messageType == Message.LEAVE and client != None:
+                    del self.clients[address]
+
+            # Ignore broken messages
+            except (struct.error, IndexError):
+                pass
+
+        # Remove the clients that are gone
+        for address, client in list(self.clients.items()):
+            if time - client['last-seen'] > Config.MULTIPLAYER_TIMEOUT:
+                del self.clients[address]
+
+    # Send a message to a client
+    def send(self, client, data):
+        self.connection.send(data, client['address'])
+        client['bytes-sent'] += len(data) + Connection.PACKET_OVERHEAD
+
+    # Start the race with a list of ( vehicle type id, color ) tuples for the host and the clients
+    def start(self, vehicleData):
+        self.started = True
+        self.vehicleData = vehicleData
+        for client in self.clients.values():
+            self.send(client, Message.encode_start(self.vehicleData))
+
+    # Get a client by its vehicle id
+    def get_client(self, vehicleId):
+        for client in self.clients.values():
+            if client['vehicle-id'] == vehicleId:
+                return client
+
+    # Take the received ( moving, turning ) inputs of the vehicle of a client for one update step of the host, every input is
+    # one update step, the client earns one input every step and saves up at most the max inputs for the steps that its
+    # inputs were late, so it catches up but never moves more than the catch up inputs at once
+    def take_inputs(self, vehicleId):
+        client = self.get_client(vehicleId)
+        if client == None:
+            return []
+        client['input-budget'] = min(client['input-budget'] + 1, Config.MULTIPLAYER_MAX_INPUTS)
+        inputs = client['inputs'][:min(client['input-budget'], Config.MULTIPLAYER_MAX_CATCH_UP_INPUTS)]
+        if len(inputs) == 0:
+            return []
+        del client['inputs'][:len(inputs)]
+        client['input-budget'] -= len(inputs)
+        client['input-sequence'] = inputs[-1][0]
+        return [ input[1:] for input in inputs ]
+
+    # Update the vehicles of a race and then the host, the vehicle of the host moves one update step and the vehicle of every client
+    # moves one update step for every input that the host takes, it is drawn from the position before all these steps
+    def update_race(self, time, vehicles, delta):
+        vehicles[VehicleId.LEFT].update(delta)
+        for client in self.clients.values():
+            vehicle = vehicles[client['vehicle-id']]
+            previousX = vehicle.x
+            previousY = vehicle.y
+            previousAngle = vehicle.angle
+            wasCrashed = vehicle.crashed
+            for moving, turning in self.take_inputs(client['vehicle-id']):
+                vehicle.moving = moving
+                vehicle.turning = turning
+                vehicle.update(delta)
+
+            # A vehicle that respawned after a crash is not drawn between the crash and the checkpoint position
+            if not wasCrashed or vehicle.crashed:
+                vehicle.previousX = previousX
+                vehicle.previousY = previousY
+                vehicle.previousAngle = previousAngle
+
+        self.update(time, vehicles)
+
+    # Update the host, announces the game until it is started and then sends the vehicle states every tick
+    def update(self, time, vehicles = None):
+        self.receive(time)
+
+        if time >= self.nextAnnounceTime:
+            self.nextAnnounceTime = time + Config.MULTIPLAYER_ANNOUNCE_TIME
+            if not self.started:
+                self.connection.send(Message.encode_announce(self.port, len(self.clients) + 1, self.mapId, self.name, self.mapName),
+                    ( self.announceAddress, Config.MULTIPLAYER_DISCOVERY_PORT ))
+
+            # Send the start message again until the client sends its inputs
+            else:
+                for client in self.clients.values():
+                    if not client['started']:
+                        self.send(client, Message.encode_start(self.vehicleData))
+
+        if self.started and vehicles != None and time >= self.nextTickTime:
+            self.nextTickTime = max(self.nextTickTime + 1 / Config.MULTIPLAYER_TICK_RATE, time)
+            self.send_state(time, vehicles)
+
+    # Send the state of the vehicles to all clients, delta encoded against the last state that the client received
+    # when that state is not too old so the client still has it
+    def send_state(self, time, vehicles):
+        snapshot = Snapshot.quantise(vehicles)
+        self.snapshots[self.tick] = snapshot
+        self.snapshots.pop(self.tick - Config.MULTIPLAYER_MAX_DELTA_TICKS - 1, None)
+
+        for client in self.clients.values():
+            baseTick = client['acknowledged-tick']
+            if baseTick != None and baseTick in self.snapshots:
+                self.send(client, Message.encode_state(self.tick, time, client['input-sequence'], snapshot, baseTick, self.snapshots[baseTick]))
+            else:
+                self.send(client, Message.encode_state(self.tick, time, client['input-sequence'], snapshot))
+        self.tick += 1
+
+    # Close the host and tell the clients
+    def close(self):
+        for client in self.clients.values():
+            self.send(client, Message.encode(Message.LEAVE))
+        self.connection.close()
+
+# The network client class, joins a host, sends the inputs of its vehicle every tick and receives the vehicle states
+class NetworkClient:
+    # Create network client
+    def __init__(self, address, name, vehicleTypeId, color, port = Config.MULTIPLAYER_PORT, connection = None):
+        self.hostAddress = NetworkClient.resolve_address(address, port)
+        self.name = name
+        self.vehicleTypeId = vehicleTypeId
+        self.color = color
+        self.connection = connection if connection != None else Connection()
+
+        self.vehicleId = None
+        self.mapId = None
+        self.mapHash = None
+        self.vehicleData = None
+        self.closed = False
+
+        # The transfer of the map when the client doesn't have it, the client is ready when it has the map
+        self.mapTransfer = None
+        self.ready = False
+
+        # The received states, ordered from old to new
+        self.states = []
+        self.state = None
+        self.appliedTick = None
+        self.renderTime = None
+
+        # The ( sequence number, moving, turning ) inputs of the update steps that the host has not used yet
+        self.inputs = []
+        self.sequence = 0
+        self.correction = 0
+
+        self.lastSeen = None
+        self.nextJoinTime = 0
+        self.nextMapRequestTime = 0
+        self.nextTickTime = 0
+
+    # Resolve the address of the host once, so the messages of the host can be compared with the address they come from,
+    # an address that can't be resolved is kept and the client times out because the host can't be reached
+    @staticmethod
+    def resolve_address(address, port):
+        try:
+            return socket.getaddrinfo(address, port, socket.AF_INET, socket.SOCK_DGRAM)[0][4]
+        except (socket.gaierror, UnicodeError):
+            return ( address, port )
+
+    # Handle the messages of the host, the messages of all other addresses are ignored
+    def receive(self, time):
+        for messageType, body, address in self.connection.receive():
+            if address != self.hostAddress:
+                continue
+            self.lastSeen = time
+
+            try:
+                if messageType == Message.WELCOME:
+                    self.vehicleId, self.mapId, self.mapHash, tickRate = Message.decode_welcome(body)
+
+                if messageType == Message.MAP_CHUNK and self.mapTransfer != None:
+                    mapHash, index, count, data = Message.decode_map_chunk(body)
+                    if mapHash == self.mapTransfer.mapHash:
+                        self.mapTransfer.add_chunk(index, count, data)
+
+                if messageType == Message.START:
+                    self.vehicleData = Message.decode_start(body)
+
+                # Keep the states in order and forget the old ones, the states that can't be decoded are lost
+                if messageType == Message.STATE:
+                    state = Message.decode_state(body, self.get_snapshot)
+                    if state == None:
+                        continue
+                    i = len(self.states)
+                    while i > 0 and self.states[i - 1]['tick'] > state['tick']:
+                        i -= 1
+                    if i == 0 or self.states[i - 1]['tick'] != state['tick']:
+                        self.states.insert(i, state)
+                    if len(self.states) > Config.MULTIPLAYER_STATES_SIZE:
+                        self.states.pop(0)
+                    self.state = self.states[-1]
+
+                if messageType == Message.LEAVE:
+                    self.closed = True
+
+            # Ignore broken messages
+            except (struct.error, IndexError):
+                pass
+
+    # Get the snapshot of a received state
+    def get_snapshot(self, tick):
+        for state in self.states:
+            if state['tick'] == tick:
+                return state['snapshot']
+
+    # Get the map of the host from the host, the client has to be welcomed
+    def request_map(self):
+        self.mapTransfer = MapTransfer(self.mapHash)
+        self.nextMapRequestTime = 0
+
+    # Tell the host that the client has the map right away
+    def set_ready(self):
+        self.ready = True
+        self.nextJoinTime = 0
+
+    # Update the client, joins until the host starts the race so both know the other is still there and then sends the inputs every tick
+    def update(self, time):
+        if self.lastSeen == None:
+            self.lastSeen = time
+        self.receive(time)
+
+        # Join again until the race starts, also after the welcome, so the host and the client don't time out in the lobby
+        if self.vehicleData == None and time >= self.nextJoinTime:
+            self.nextJoinTime = time + Config.MULTIPLAYER_ANNOUNCE_TIME
+            self.connection.send(Message.encode_join(self.vehicleTypeId, self.color, self.name, self.ready), self.hostAddress)
+
+        # Request all chunks of the map and then the chunks that are lost
+        if self.mapTransfer != None and self.mapTransfer.data == None and not self.mapTransfer.failed and time >= self.nextMapRequestTime:
+            self.nextMapRequestTime = time + Config.MAP_TRANSFER_RETRY_TIME
+            self.connection.send(Message.encode_map_request(self.mapHash, self.mapTransfer.get_missing_chunks()), self.hostAddress)
+
+        # Send all the inputs that the host has not used yet
+        if self.vehicleData != None and time >= self.nextTickTime:
+            self.nextTickTime = max(self.nextTickTime + 1 / Config.MULTIPLAYER_TICK_RATE, time)
+            inputs = self.inputs[-Config.MULTIPLAYER_MAX_INPUTS:]
+            self.connection.send(Message.encode_input(self.sequence, self.state['tick'] + 1 if self.state != None else 0,
+                [ input[1:] for input in inputs ]), self.hostAddress)
+
+        if time - self.lastSeen > Config.MULTIPLAYER_TIMEOUT:
+            self.closed = True
+
+    # Move a vehicle one update step with its own physics, the host does the crashes, laps and finish
+    @staticmethod
+    def predict_step(vehicle):
+        if vehicle.started and not vehicle.finished and not vehicle.crashed:
+            vehicle.update_physics(1 / Config.UPDATES_PER_SECOND)
+
+    # Save the inputs of the own vehicle for the host and move it right away
+    def predict(self, vehicle):
+        self.sequence += 1
+        self.inputs.append(( self.sequence, vehicle.moving, vehicle.turning ))
+        NetworkClient.predict_step(vehicle)
+
+    # Apply the newest state of the host, returns true when there was a new state, the host decides when a vehicle starts,
+    # crashes, checks a checkpoint, completes a lap and finishes, the own vehicle is moved to its state and the inputs that the host
+    # has not used yet are done again, the distance that this moves the own vehicle is saved as the correction
+    def apply_state(self, vehicles):
+        if self.state == None or self.state['tick'] == self.appliedTick:
+            return False
+        self.appliedTick = self.state['tick']
+
+        for vehicleState in self.state['vehicles']:
+            if vehicleState['id'] >= len(vehicles):
+                continue
+            vehicle = vehicles[vehicleState['id']]
+
+            if vehicleState['started'] and not vehicle.started:
+                vehicle.started = True
+                vehicle.startTime = vehicle.game.time
+
+            if vehicleState['crashed'] != vehicle.crashed:
+                vehicle.crashed = vehicleState['crashed']
+                if vehicle.crashed:
+                    vehicle.crashTime = vehicle.game.time
+                    vehicle.events.append(vehicle.CRASH_EVENT)
+                else:
+                    vehicle.crashTime = None
+
+            while vehicle.lap < vehicleState['lap'] and not vehicle.finished:
+                vehicle.complete_lap()
+
+            for i in range(len(vehicle.checkedCheckpoints)):
+                if vehicleState['checkpoints'] & (1 << i) != 0 and not vehicle.checkedCheckpoints[i]:
+                    vehicle.checkedCheckpoints[i] = True
+                    vehicle.checkedCount += 1
+                    vehicle.events.append(vehicle.CHECKPOINT_EVENT)
+
+            # Reconcile the own vehicle
+            if vehicleState['id'] == self.vehicleId:
+                predictedX = vehicle.x
+                predictedY = vehicle.y
+                moving = vehicle.moving
+                turning = vehicle.turning
+
+                vehicle.x = vehicleState['x']
+                vehicle.y = vehicleState['y']
+                vehicle.angle = vehicleState['angle']
+                vehicle.velocity = vehicleState['velocity']
+                vehicle.acceleration = vehicleState['acceleration']
+
+                while len(self.inputs) > 0 and self.inputs[0][0] <= self.state['input-sequence']:
+                    self.inputs.pop(0)
+                for input in self.inputs:
+                    vehicle.moving = input[1]
+                    vehicle.turning = input[2]
+                    NetworkClient.predict_step(vehicle)
+
+                vehicle.moving = moving
+                vehicle.turning = turning
+                self.correction = math.sqrt((vehicle.x - predictedX) ** 2 + (vehicle.y - predictedY) ** 2)
+        return True
+
+    # Move the other vehicles between the two states around the render time, the render time follows
+    # the time of the newest state with the interpolation delay so there is almost always a newer state
+    def interpolate_vehicles(self, vehicles, delta):
+        if len(self.states) == 0:
+            return
+
+        targetTime = self.states[-1]['time'] - Config.MULTIPLAYER_INTERPOLATION_DELAY
+        if self.renderTime == None or abs(targetTime - self.renderTime) > Config.MULTIPLAYER_INTERPOLATION_DELAY:
+            self.renderTime = targetTime
+        else:
+            self.renderTime += delta + (targetTime - self.renderTime) * Config.MULTIPLAYER_RENDER_TIME_CORRECTION
+
+        # Find the states before and after the render time
+        i = len(self.states) - 1
+        while i > 0 and self.states[i - 1]['time'] > self.renderTime:
+            i -= 1
+        nextState = self.states[i]
+        previousState = self.states[i - 1] if i > 0 else nextState
+        if nextState['time'] > previousState['time']:
+            alpha = min(max((self.renderTime - previousState['time']) / (nextState['time'] - previousState['time']), 0), 1)
+        else:
+            alpha = 1
+
+        for previousVehicleState, nextVehicleState in zip(previousState['vehicles'], nextState['vehicles']):
+            if nextVehicleState['id'] == self.vehicleId or nextVehicleState['id'] >= len(vehicles):
+                continue
+            vehicle = vehicles[nextVehicleState['id']]
+
+            # Don't move between the positions of a crash and a checkpoint
+            if (nextVehicleState['x'] - previousVehicleState['x']) ** 2 + (nextVehicleState['y'] - previousVehicleState['y']) ** 2 > Config.TILE_SPRITE_SIZE ** 2:
+                previousVehicleState = nextVehicleState
+
+            vehicle.x = previousVehicleState['x'] + (nextVehicleState['x'] - previousVehicleState['x']) * alpha
+            vehicle.y = previousVehicleState['y'] + (nextVehicleState['y'] - previousVehicleState['y']) * alpha
+            vehicle.angle = previousVehicleState['angle'] + ((nextVehicleState['angle'] - previousVehicleState['angle'] + math.pi) % (math.pi * 2) - math.pi) * alpha
+            vehicle.velocity = previousVehicleState['velocity'] + (nextVehicleState['velocity'] - previousVehicleState['velocity']) * alpha
+
+    # Close the client and tell the host
+    def close(self):
+        self.connection.send(Message.encode(Message.LEAVE), self.hostAddress)
+        self.connection.close()
+
+# The host listener class, collects the hosts that announce their games in the network
+class HostListener:
+    # Create host listener
+    def __init__(self, port = Config.MULTIPLAYER_DISCOVERY_PORT):
+        self.hosts = {}
+        self.changed = False
+        try:
+            self.connection = Connection(port, True)
+        except OSError:
+            self.connection = None
+
+    # Receive the announcements and remove the hosts that are gone
+    def update(self, time):
+        if self.connection == None:
+            return
+
+        for messageType, body, address in self.connection.receive():
+            if messageType == Message.ANNOUNCE:
+                try:
+                    host = Message.decode_announce(body)
+                except (struct.error, IndexError):
+                    continue
+                host['address'] = address[0]
+                host['last-seen'] = time
+
+                key = ( host['address'], host['port'] )
+                oldHost = self.hosts.get(key)
+                if oldHost == None or oldHost['players'] != host['players'] or oldHost['name'] != host['name'] or oldHost['map-name'] != host['map-name']:
+                    self.changed = True
+                self.hosts[key] = host
+
+        for key, host in list(self.hosts.items()):
+            if time - host['last-seen'] > Config.MULTIPLAYER_TIMEOUT:
+                del self.hosts[key]
+                self.changed = True
+
+    # Close host listener
+    def close(self):
+        if self.connection != None:
+            self.connection.close()
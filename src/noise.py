@@ -4,6 +4,12 @@
 
 import math
 
+# NumPy is optional and only used to evaluate the noise over a whole grid at once
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 class PerlinNoise:
     def __init__(self):
         self.permutation = [151, 160, 137, 91, 90, 15,
@@ -35,6 +41,9 @@ class PerlinNoise:
         self.p = [self.permutation[i] for i in range(256)]
         self.p += self.p
 
+        if numpy != None:
+            self.pArray = numpy.array(self.p, dtype=numpy.int64)
+
     def fade(self, t):
         return t * t * t * (t * (t * 6 - 15) + 10)
 
@@ -94,3 +103,53 @@ class PerlinNoise:
         res = u if (h & 1) == 0 else -u
         res += v if (h & 2) == 0 else -v
         return res
+
+    # Evaluate the noise for NumPy arrays of coordinates, gives the same values as noise()
+    def noise_grid(self, x, y, z):
+        p = self.pArray
+
+        # Find unit cube that contains point.
+        X = numpy.floor(x).astype(numpy.int64) & 255
+        Y = numpy.floor(y).astype(numpy.int64) & 255
+        Z = math.floor(z) & 255
+
+        # Find relative X, Y, Z
+        # of point in CUBE.
+        x = x - numpy.floor(x)
+        y = y - numpy.floor(y)
+        z = z - math.floor(z)
+
+        # compute fade curves
+        # for each of X, Y, Z
+        u = self.fade(x)
+        v = self.fade(y)
+        w = self.fade(z)
+
+        # Hash coordinates of the 8 cube corners
+        A = p[X] + Y
+        AA = p[A] + Z
+        AB = p[A + 1] + Z
+
+        B = p[X + 1] + Y
+        BA = p[B] + Z
+
+        BB = p[B + 1] + Z
+
+        # And add bleneded results from 8 corners of cube
+        return self.lerp(w, self.lerp(v, self.lerp(u, self.grad_grid(p[AA], x, y, z),
+                                                   self.grad_grid(p[BA], x-1, y, z)),
+                                      self.lerp(u, self.grad_grid(p[AB], x, y-1, z),
+                                                self.grad_grid(p[BB], x-1, y-1, z))),
+                         self.lerp(v, self.lerp(u, self.grad_grid(p[AA+1], x, y, z-1),
+                                                self.grad_grid(p[BA+1], x-1, y, z-1)),
+                                   self.lerp(u, self.grad_grid(p[AB+1], x, y-1, z-1),
+                                             self.grad_grid(p[BB+1], x-1, y-1, z-1))))
+
+    def grad_grid(self, hash, x, y, z):
+        h = hash & 15
+        u = numpy.where(h < 8, x, y)
+        v = numpy.where(h < 4, y, numpy.where((h == 12) | (h == 14), x, z))
+
+        res = numpy.where((h & 1) == 0, u, -u)
+        res += numpy.where((h & 2) == 0, v, -v)
+        return res
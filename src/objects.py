@@ -1,16 +1,110 @@
 # BassieRacing - Objects
 
 # Import modules
+import array
+import collections
 from constants import *
+from dialogs import *
+import hashlib
 import json
 import math
+import mmap
 from noise import *
+import os
 import pygame
 import random
 from stats import *
-import tkinter.messagebox
+import struct
 from utils import *
 
+# The scaled image cache class, keeps the least recently used scaled copies of images so every size is only scaled once
+class ScaledImageCache:
+    # Create scaled image cache
+    def __init__(self, maxSize):
+        self.maxSize = maxSize
+        self.images = {}
+        self.hits = 0
+        self.misses = 0
+
+    # Get a scaled copy of an image, the returned surface is shared and must not be changed
+    def get(self, image, width, height):
+        key = ( id(image), width, height )
+
+        # When the scaled image is cached move it to the back so it will be removed last
+        if key in self.images and self.images[key][0] is image:
+            self.hits += 1
+            entry = self.images.pop(key)
+            self.images[key] = entry
+            return entry[1]
+
+        # Scale the image and remove the least recently used scaled image when the cache is full
+        self.misses += 1
+        scaledImage = pygame.transform.smoothscale(image, ( width, height ))
+        self.images.pop(key, None)
+        self.images[key] = ( image, scaledImage )
+        while len(self.images) > self.maxSize:
+            self.images.pop(next(iter(self.images)))
+        return scaledImage
+
+    # Get the cache statistics
+    def get_stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self.images),
+            'bytes': sum(entry[1].get_width() * entry[1].get_height() * entry[1].get_bytesize() for entry in self.images.values())
+        }
+
+# The scaled tile sheets cache that is shared by all cameras
+scaledImageCache = ScaledImageCache(Config.SCALED_IMAGE_CACHE_SIZE)
+
+# The rotated image cache class, pre-renders images at a fixed number of angle steps so drawing a rotated image is only a lookup
+class RotatedImageCache:
+    # Create rotated image cache, it keeps the rotations of images until they use more than the max size in bytes
+    def __init__(self, angleSteps, maxSize):
+        self.angleSteps = angleSteps
+        self.maxSize = maxSize
+        self.rotations = {}
+        self.rotationsSize = 0
+
+    # Get the size in bytes of the rotations of an image
+    @staticmethod
+    def get_rotations_size(rotations):
+        return sum(image.get_width() * image.get_height() * image.get_bytesize() for image in rotations)
+
+    # Get all the pre-rendered rotations of an image, renders them the first time
+    def get_rotations(self, key, image):
+        # When the rotations are cached move them to the back so they will be removed last
+        if key in self.rotations:
+            rotations = self.rotations.pop(key)
+            self.rotations[key] = rotations
+            return rotations
+
+        # Render all the angle steps and remove the least recently used rotations when the cache is full
+        rotations = [ pygame.transform.rotate(image, i * 360 / self.angleSteps) for i in range(self.angleSteps) ]
+        rotationsSize = RotatedImageCache.get_rotations_size(rotations)
+        while len(self.rotations) > 0 and self.rotationsSize + rotationsSize > self.maxSize:
+            self.rotationsSize -= RotatedImageCache.get_rotations_size(self.rotations.pop(next(iter(self.rotations))))
+
+        self.rotations[key] = rotations
+        self.rotationsSize += rotationsSize
+        return rotations
+
+    # Get an image rotated by an angle in radians, rounded to the nearest angle step
+    def get(self, key, image, angle):
+        return self.get_rotations(key, image)[round(math.degrees(angle) * self.angleSteps / 360) % self.angleSteps]
+
+    # Get the cache statistics
+    def get_stats(self):
+        return {
+            'size': len(self.rotations),
+            'images': sum(len(rotations) for rotations in self.rotations.values()),
+            'bytes': self.rotationsSize
+        }
+
+# The pre-rotated vehicle sprites cache that is shared by all cameras
+rotatedImageCache = RotatedImageCache(Config.VEHICLE_ANGLE_STEPS, Config.VEHICLE_ROTATION_CACHE_SIZE)
+
 # The camera class
 class Camera:
     def __init__(self, x, y, tilesImage, tileSize, vehiclesImage, vehicleScale = 1, grid = False):
@@ -20,10 +114,10 @@ class Camera:
         if tileSize == Config.TILE_SPRITE_SIZE:
             self.tilesImage = tilesImage
         else:
-            self.tilesImage = pygame.transform.smoothscale(tilesImage, (
+            self.tilesImage = scaledImageCache.get(tilesImage,
                 math.floor(tilesImage.get_width() * (tileSize / Config.TILE_SPRITE_SIZE)),
                 math.floor(tilesImage.get_height() * (tileSize / Config.TILE_SPRITE_SIZE))
-            ))
+            )
         self.tileSize = tileSize
 
         self.vehicleScale = vehicleScale
@@ -49,6 +143,49 @@ class Camera:
         if self.movingRight:
             self.x += self.speed * delta
 
+# The vehicle grid class, keeps the vehicles of a race in buckets of map tiles so a crash check only looks at the nearby vehicles
+class VehicleGrid:
+    # Create vehicle grid
+    def __init__(self, cellSize = Config.TILE_SPRITE_SIZE):
+        self.cellSize = cellSize
+        self.cells = {}
+        self.vehicleCells = {}
+
+    # Get the cell of a position
+    def get_cell(self, x, y):
+        return ( math.floor(x / self.cellSize), math.floor(y / self.cellSize) )
+
+    # Put a vehicle in the cell of its position, call it every time the vehicle moves
+    def move(self, vehicle):
+        cell = self.get_cell(vehicle.x, vehicle.y)
+        oldCell = self.vehicleCells.get(vehicle)
+        if cell != oldCell:
+            if oldCell != None:
+                self.remove(vehicle)
+            if cell not in self.cells:
+                self.cells[cell] = []
+            self.cells[cell].append(vehicle)
+            self.vehicleCells[vehicle] = cell
+
+    # Remove a vehicle from the grid
+    def remove(self, vehicle):
+        cell = self.vehicleCells.pop(vehicle)
+        self.cells[cell].remove(vehicle)
+        if len(self.cells[cell]) == 0:
+            del self.cells[cell]
+
+    # Get the vehicles in the cells that are within a distance of a position
+    def get_nearby(self, x, y, distance):
+        left, top = self.get_cell(x - distance, y - distance)
+        right, bottom = self.get_cell(x + distance, y + distance)
+        nearby = []
+        for cellY in range(top, bottom + 1):
+            for cellX in range(left, right + 1):
+                cell = self.cells.get(( cellX, cellY ))
+                if cell != None:
+                    nearby.extend(cell)
+        return nearby
+
 # The vehicle class
 class Vehicle:
     NOT_MOVING = 0
@@ -59,18 +196,26 @@ class Vehicle:
     TURNING_LEFT = 1
     TURNING_RIGHT = 2
 
-    # Create vehicle
-    def __init__(self, game, id, vehicleType, color, map, vehicles, x, y, angle):
+    # The events of an update, so the game can play the right sound effects
+    CHECKPOINT_EVENT = 0
+    LAP_EVENT = 1
+    FINISH_EVENT = 2
+    CRASH_EVENT = 3
+
+    # Create vehicle, with a vehicle grid of the race only the nearby vehicles are checked for crashes
+    def __init__(self, game, id, vehicleType, color, map, vehicles, x, y, angle, vehicleGrid = None):
         self.game = game
         self.id = id
         self.vehicleType = vehicleType
         self.color = color
         self.map = map
         self.vehicles = vehicles
+        self.vehicleGrid = vehicleGrid
 
         self.lap = 0
         self.lapTimes = [ None for i in range(map.laps) ]
         self.checkedCheckpoints = [ False for checkpoint in map.checkpoints ]
+        self.checkedCount = 0
 
         self.started = False
         self.startTime = None
@@ -92,12 +237,22 @@ class Vehicle:
         self.y = y
         self.angle = angle
 
+        # The position before the last update to draw between
+        self.previousX = x
+        self.previousY = y
+        self.previousAngle = angle
+
         self.velocity = 0
         self.acceleration = 0
 
         self.moving = Vehicle.NOT_MOVING
         self.turning = Vehicle.NOT_TURNING
 
+        self.events = []
+
+        if self.vehicleGrid != None:
+            self.vehicleGrid.move(self)
+
     # Check crash:
     def check_crash(self):
         # When no earlier crash time set time
@@ -109,68 +264,59 @@ class Vehicle:
             # Crash the vehicle
             self.crashed = True
             self.crashTime = self.game.time
+            self.events.append(Vehicle.CRASH_EVENT)
+
+    # Get the position to draw the vehicle at, between the position before and after the last update
+    def get_interpolated_position(self):
+        alpha = self.game.alpha
+        return (
+            self.previousX + (self.x - self.previousX) * alpha,
+            self.previousY + (self.y - self.previousY) * alpha,
+            self.previousAngle + (self.angle - self.previousAngle) * alpha
+        )
+
+    # Update vehicle, the game only has to give the time so the update also works headless
+    def update(self, delta):
+        # Save the position before the update
+        self.previousX = self.x
+        self.previousY = self.y
+        self.previousAngle = self.angle
 
-            # Play crash sound effect
-            if self.game.settings['sound-effects']['enabled']:
-                self.game.crashSound.play()
-
-    # Update vehicle
-    def update(self, delta, camera):
         # When not started or when finished do nothing
         if not self.started or self.finished:
             return
 
-        # When crashed
+        # When crashed only wait for the crash animation
         if self.crashed:
-            # Check crash animation timeout
-            if self.game.time - self.crashTime > Config.EXPLOSION_ANIMATION_FRAME_COUNT * Config.EXPLOSION_ANIMATION_FRAME_TIME:
-                self.crashed = False
-                self.crashTime = None
-
-                # Teleport back to last checkpoint
-                if self.lastCheckpointDirection == Direction.TOP_TO_BOTTOM:
-                    if self.id == VehicleId.LEFT:
-                        self.x = (self.lastCheckpoint['x'] + self.lastCheckpoint['width'] // 2 - 1) * Config.TILE_SPRITE_SIZE + Config.TILE_SPRITE_SIZE / 2
-                    if self.id == VehicleId.RIGHT:
-                        self.x = (self.lastCheckpoint['x'] + self.lastCheckpoint['width'] // 2) * Config.TILE_SPRITE_SIZE + Config.TILE_SPRITE_SIZE / 2
-                    self.y = (self.lastCheckpoint['y'] - 1) * Config.TILE_SPRITE_SIZE + Config.TILE_SPRITE_SIZE / 2
-                    self.angle = math.radians(180)
-                    self.velocity = 0
-                    self.acceleration = 0
-
-                if self.lastCheckpointDirection == Direction.BOTTOM_TO_TOP:
-                    if self.id == VehicleId.LEFT:
-                        self.x = (self.lastCheckpoint['x'] + self.lastCheckpoint['width'] // 2 - 1) * Config.TILE_SPRITE_SIZE + Config.TILE_SPRITE_SIZE / 2
-                    if self.id == VehicleId.RIGHT:
-                        self.x = (self.lastCheckpoint['x'] + self.lastCheckpoint['width'] // 2) * Config.TILE_SPRITE_SIZE + Config.TILE_SPRITE_SIZE / 2
-                    self.y = (self.lastCheckpoint['y'] + self.lastCheckpoint['height']) * Config.TILE_SPRITE_SIZE + Config.TILE_SPRITE_SIZE / 2
-                    self.angle = 0
-                    self.velocity = 0
-                    self.acceleration = 0
-
-                if self.lastCheckpointDirection == Direction.LEFT_TO_RIGHT:
-                    self.x = (self.lastCheckpoint['x'] + self.lastCheckpoint['width']) * Config.TILE_SPRITE_SIZE + Config.TILE_SPRITE_SIZE / 2
-                    if self.id == VehicleId.LEFT:
-                        self.y = (self.lastCheckpoint['y'] + self.lastCheckpoint['height'] // 2 - 1) * Config.TILE_SPRITE_SIZE + Config.TILE_SPRITE_SIZE / 2
-                    if self.id == VehicleId.RIGHT:
-                        self.y = (self.lastCheckpoint['y'] + self.lastCheckpoint['height'] // 2) * Config.TILE_SPRITE_SIZE + Config.TILE_SPRITE_SIZE / 2
-                    self.angle = math.radians(90)
-                    self.velocity = 0
-                    self.acceleration = 0
-
-                if self.lastCheckpointDirection == Direction.RIGHT_TO_LEFT:
-                    self.x = (self.lastCheckpoint['x'] - 1) * Config.TILE_SPRITE_SIZE + Config.TILE_SPRITE_SIZE / 2
-                    if self.id == VehicleId.LEFT:
-                        self.y = (self.lastCheckpoint['y'] + self.lastCheckpoint['height'] // 2 - 1) * Config.TILE_SPRITE_SIZE + Config.TILE_SPRITE_SIZE / 2
-                    if self.id == VehicleId.RIGHT:
-                        self.y = (self.lastCheckpoint['y'] + self.lastCheckpoint['height'] // 2) * Config.TILE_SPRITE_SIZE + Config.TILE_SPRITE_SIZE / 2
-                    self.angle = math.radians(270)
-                    self.velocity = 0
-                    self.acceleration = 0
-
-            # Stop doing anything else
+            self.update_crashed()
             return
 
+        self.update_physics(delta)
+        self.update_tile()
+        self.check_vehicle_crashes()
+
+    # Update crashed vehicle, teleports back to the last checkpoint when the crash animation is over
+    def update_crashed(self):
+        # Check crash animation timeout
+        if self.game.time - self.crashTime > Config.EXPLOSION_ANIMATION_FRAME_COUNT * Config.EXPLOSION_ANIMATION_FRAME_TIME:
+            self.crashed = False
+            self.crashTime = None
+
+            # Teleport back to the slot of the vehicle at the last checkpoint
+            self.x, self.y, self.angle = self.map.get_slot_position(self.lastCheckpoint, self.lastCheckpointDirection, self.id)
+            self.velocity = 0
+            self.acceleration = 0
+
+            # Don't draw between the crash and the checkpoint position
+            self.previousX = self.x
+            self.previousY = self.y
+            self.previousAngle = self.angle
+
+            if self.vehicleGrid != None:
+                self.vehicleGrid.move(self)
+
+    # Update the angle, velocity and position of a driving vehicle
+    def update_physics(self, delta):
         # Handle turning
         if self.turning == Vehicle.TURNING_LEFT:
             self.angle += self.vehicleType['turningSpeed'] * delta
@@ -206,15 +352,20 @@ class Vehicle:
             self.x = 0
         if self.y < 0:
             self.y = 0
-        if self.x > self.map.width * camera.tileSize:
-            self.x = self.map.width * camera.tileSize
-        if self.y > self.map.height * camera.tileSize:
-            self.y = self.map.height * camera.tileSize
+        if self.x > self.map.width * Config.TILE_SPRITE_SIZE:
+            self.x = self.map.width * Config.TILE_SPRITE_SIZE
+        if self.y > self.map.height * Config.TILE_SPRITE_SIZE:
+            self.y = self.map.height * Config.TILE_SPRITE_SIZE
+
+        if self.vehicleGrid != None:
+            self.vehicleGrid.move(self)
 
+    # Handle the tile the vehicle is standing on: crashes next to the track, the finish and the checkpoints
+    def update_tile(self):
         # Caculate standing tile cordinates
         tile = {
-            'x': math.floor(self.x / camera.tileSize),
-            'y': math.floor(self.y / camera.tileSize)
+            'x': math.floor(self.x / Config.TILE_SPRITE_SIZE),
+            'y': math.floor(self.y / Config.TILE_SPRITE_SIZE)
         }
 
         # Check if the vehicle is inside the map
@@ -234,94 +385,81 @@ class Vehicle:
                 else:
                     self.lastCheckpointDirection = Direction.RIGHT_TO_LEFT
 
-                # Check if all checkpoints are checked
-                allChecked = True
-                for checked in self.checkedCheckpoints:
-                    if not checked:
-                        allChecked = False
-                        break
+                # If all checkpoints are checked go to the next lap
+                if self.checkedCount == len(self.checkedCheckpoints):
+                    self.complete_lap()
 
-                # If so go to the next lap
-                if allChecked:
-                    self.lapTimes[self.lap] = self.game.time - (self.finishTime if self.finishTime != None else self.startTime)
-                    self.finishTime = self.game.time
-                    self.lap += 1
-                    self.checkedCheckpoints = [ False for checkpoint in self.map.checkpoints ]
+            # When tile is a checkpoint tile find which checkpoint it is in the checkpoint grid
+            if self.map.track[tile['y']][tile['x']] == 3 and self.map.checkpointGrid[tile['y']][tile['x']] != 0:
+                i = self.map.checkpointGrid[tile['y']][tile['x']] - 1
+                checkpoint = self.map.checkpoints[i]
 
-                    if self.lap == self.map.laps:
-                        self.finished = True
+                # Update checkpoint
+                if checkpoint != self.lastCheckpoint:
+                    self.lastCheckpoint = checkpoint
+                    centerX = (checkpoint['x'] + checkpoint['width'] / 2) * Config.TILE_SPRITE_SIZE
+                    centerY = (checkpoint['y'] + checkpoint['height'] / 2) * Config.TILE_SPRITE_SIZE
 
-                        if self.game.settings['sound-effects']['enabled']:
-                            self.game.finishSound.play()
-                    else:
-                        if self.game.settings['sound-effects']['enabled']:
-                            self.game.lapSound.play()
+                    # When entered at the top half and vertical
+                    if self.y <= centerY and checkpoint['width'] >= checkpoint['height']:
+                        self.lastCheckpointDirection = Direction.TOP_TO_BOTTOM
 
-            # When tile is a checkpoint tile
-            if self.map.track[tile['y']][tile['x']] == 3:
-                # Check which checkpoint it is
-                for i, checkpoint in enumerate(self.map.checkpoints):
-                    if (
-                        tile['x'] >= checkpoint['x'] and tile['y'] >= checkpoint['y'] and
-                        tile['x'] < checkpoint['x'] + checkpoint['width'] and tile['y'] < checkpoint['y'] + checkpoint['height']
-                    ):
-                        # Update checkpoint
-                        if checkpoint != self.lastCheckpoint:
-                            self.lastCheckpoint = checkpoint
-
-                            # When entered at the top half and vertical
-                            checkpointRect = {
-                                'x': checkpoint['x'] * camera.tileSize,
-                                'y': checkpoint['y'] * camera.tileSize,
-                                'width':checkpoint['width'] * camera.tileSize,
-                                'height': checkpoint['height'] * camera.tileSize
-                            }
-
-                            if self.y <= checkpointRect['y'] + checkpointRect['height'] / 2 and checkpoint['width'] >= checkpoint['height']:
-                                self.lastCheckpointDirection = Direction.TOP_TO_BOTTOM
-
-                            # When entered at the bottom half and vertical
-                            elif self.y > checkpointRect['y'] + checkpointRect['height'] / 2 and checkpoint['width'] >= checkpoint['height']:
-                                self.lastCheckpointDirection = Direction.BOTTOM_TO_TOP
-
-                            # When entered at the left half and horizontal
-                            elif self.x <= checkpointRect['x'] + checkpointRect['width'] / 2 and checkpoint['width'] < checkpoint['height']:
-                                self.lastCheckpointDirection = Direction.RIGHT_TO_LEFT
-
-                            # When entered at the right half and horizontal
-                            elif self.x > checkpointRect['x'] + checkpointRect['width'] / 2 and checkpoint['width'] < checkpoint['height']:
-                                self.lastCheckpointDirection = Direction.LEFT_TO_RIGHT
-
-                        # Check checkpoint if not already checked
-                        if not self.checkedCheckpoints[i]:
-                            self.checkedCheckpoints[i] = True
-
-                            if self.game.settings['sound-effects']['enabled']:
-                                self.game.checkpointSound.play()
-                        break
+                    # When entered at the bottom half and vertical
+                    elif self.y > centerY and checkpoint['width'] >= checkpoint['height']:
+                        self.lastCheckpointDirection = Direction.BOTTOM_TO_TOP
+
+                    # When entered at the left half and horizontal
+                    elif self.x <= centerX and checkpoint['width'] < checkpoint['height']:
+                        self.lastCheckpointDirection = Direction.RIGHT_TO_LEFT
+
+                    # When entered at the right half and horizontal
+                    elif self.x > centerX and checkpoint['width'] < checkpoint['height']:
+                        self.lastCheckpointDirection = Direction.LEFT_TO_RIGHT
+
+                # Check checkpoint if not already checked
+                if not self.checkedCheckpoints[i]:
+                    self.checkedCheckpoints[i] = True
+                    self.checkedCount += 1
+                    self.events.append(Vehicle.CHECKPOINT_EVENT)
 
         # If out side map also check crash
         elif self.map.crashes['enabled']:
             self.check_crash()
 
-        # Check if vehicles are to close to crash
+    # Save the lap time and go to the next lap, the vehicle is finished after the last lap
+    def complete_lap(self):
+        self.lapTimes[self.lap] = self.game.time - (self.finishTime if self.finishTime != None else self.startTime)
+        self.finishTime = self.game.time
+        self.lap += 1
+        self.checkedCheckpoints = [ False for checkpoint in self.map.checkpoints ]
+        self.checkedCount = 0
+
+        if self.lap == self.map.laps:
+            self.finished = True
+            self.events.append(Vehicle.FINISH_EVENT)
+        else:
+            self.events.append(Vehicle.LAP_EVENT)
+
+    # Check if vehicles are to close to crash
+    def check_vehicle_crashes(self):
         if self.map.crashes['enabled']:
-            for vehicle in self.vehicles:
-                if vehicle != self and not vehicle.finished:
-                    # Calculate distence between two vehicles
-                    distence = math.sqrt((self.x - vehicle.x) ** 2 + (self.y - vehicle.y) ** 2)
+            crashDistence = max(self.vehicleType['width'], self.vehicleType['height']) / 3 * 2
+            if self.vehicleGrid != None:
+                vehicles = self.vehicleGrid.get_nearby(self.x, self.y, crashDistence)
+            else:
+                vehicles = self.vehicles
 
-                    # If to close crash both
-                    if distence < max(self.vehicleType['width'], self.vehicleType['height']) / 3 * 2:
+            for vehicle in vehicles:
+                if vehicle != self and not vehicle.finished:
+                    # If the squared distence between two vehicles is to small crash both
+                    if (self.x - vehicle.x) ** 2 + (self.y - vehicle.y) ** 2 < crashDistence ** 2:
                         self.crashed = True
                         self.crashTime = self.game.time
 
                         vehicle.crashed = True
                         vehicle.crashTime = vehicle.game.time
 
-                        # Play crash sound effect
-                        if self.game.settings['sound-effects']['enabled']:
-                            self.game.crashSound.play()
+                        self.events.append(Vehicle.CRASH_EVENT)
 
     # Crop the good vehicle image, scale it and save it in camera vehicle image cache
     def cropImage(self, camera):
@@ -339,15 +477,28 @@ class Vehicle:
         else:
             camera.vehicleImageCache[self.id] = cropSurface
 
+        # Pre-render the rotations of the vehicle image before the vehicle is drawn
+        rotatedImageCache.get_rotations(self.get_rotation_key(camera), camera.vehicleImageCache[self.id])
+
+    # Get the rotation cache key of the vehicle image of a camera
+    def get_rotation_key(self, camera):
+        return ( self.vehicleType['id'], self.color, camera.vehicleScale )
+
+    # Get the pre-rendered vehicle image of a camera rotated by an angle
+    def get_rotated_image(self, camera, angle):
+        return rotatedImageCache.get(self.get_rotation_key(camera), camera.vehicleImageCache[self.id], angle)
+
     # Draw vehicle
     def draw(self, surface, camera):
         # Draw vehicle when not finished
         if not self.finished:
+            vehicleX, vehicleY, vehicleAngle = self.get_interpolated_position()
+
             # When crashed draw crash animation
             if self.crashed:
                 # Calculate crash animation frame position
-                x = math.floor(self.x - Config.TILE_SPRITE_SIZE / 2 - (camera.x - surface.get_width() / 2))
-                y = math.floor(self.y - Config.TILE_SPRITE_SIZE / 2 - (camera.y - surface.get_height() / 2))
+                x = math.floor(vehicleX - Config.TILE_SPRITE_SIZE / 2 - (camera.x - surface.get_width() / 2))
+                y = math.floor(vehicleY - Config.TILE_SPRITE_SIZE / 2 - (camera.y - surface.get_height() / 2))
 
                 # Draw if visible
                 if (
@@ -360,9 +511,9 @@ class Vehicle:
             # Else draw vehicle
             else:
                 # Rotate vehicle image
-                rotatedVehicleImage = pygame.transform.rotate(camera.vehicleImageCache[self.id], math.degrees(self.angle))
-                x = math.floor(self.x - rotatedVehicleImage.get_width() / 2 - (camera.x - surface.get_width() / 2))
-                y = math.floor(self.y - rotatedVehicleImage.get_height() / 2 - (camera.y - surface.get_height() / 2))
+                rotatedVehicleImage = self.get_rotated_image(camera, vehicleAngle)
+                x = math.floor(vehicleX - rotatedVehicleImage.get_width() / 2 - (camera.x - surface.get_width() / 2))
+                y = math.floor(vehicleY - rotatedVehicleImage.get_height() / 2 - (camera.y - surface.get_height() / 2))
 
                 # Draw if visible
                 if (
@@ -371,14 +522,87 @@ class Vehicle:
                 ):
                     surface.blit(rotatedVehicleImage, ( x, y ))
 
+# The grid class, stores a map layer as one contiguous array of bytes or of other array items
+class Grid:
+    # Create grid
+    def __init__(self, width, height, data = None):
+        self.width = width
+        self.height = height
+        self.data = data if data != None else bytearray(width * height)
+
+        # Create row views so tiles can also be read and written with grid[y][x]
+        view = memoryview(self.data)
+        self.rows = [ view[y * width:(y + 1) * width] for y in range(height) ]
+
+    # Create grid from a nested list of rows
+    @staticmethod
+    def from_list(rows):
+        return Grid(len(rows[0]), len(rows), bytearray(b''.join(bytes(row) for row in rows)))
+
+    # Convert grid to a nested list of rows
+    def to_list(self):
+        return [ list(row) for row in self.rows ]
+
+    # Copy grid
+    def copy(self):
+        return Grid(self.width, self.height, bytearray(self.data))
+
+    # Get a tile
+    def get(self, x, y):
+        return self.data[y * self.width + x]
+
+    # Set a tile
+    def set(self, x, y, value):
+        self.data[y * self.width + x] = value
+
+    def __getitem__(self, y):
+        return self.rows[y]
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return self.height
+
+    def __eq__(self, other):
+        return isinstance(other, Grid) and self.width == other.width and self.height == other.height and self.data == other.data
+
 # The map class
 class Map:
+    # The neighbour bits of a tile blend mask
+    TOP = 1
+    BOTTOM = 2
+    LEFT = 4
+    RIGHT = 8
+    TOP_LEFT = 16
+    TOP_RIGHT = 32
+    BOTTOM_LEFT = 64
+    BOTTOM_RIGHT = 128
+
+    # The track blend mask uses the high bits for empty neighbours
+    TOP_EMPTY = 16
+    BOTTOM_EMPTY = 32
+    LEFT_EMPTY = 64
+    RIGHT_EMPTY = 128
+
+    # The binary map format: a fixed header, the game version and name strings and then the terrain and track planes with one byte per tile
+    BINARY_EXTENSION = '.brmap'
+    BINARY_MAGIC = b'BRMP'
+    BINARY_FORMAT_VERSION = 1
+    BINARY_HEADER = struct.Struct('<4sBqHHHBdiiBH')
+
     def __init__(self, id, name, width, height):
         self.id = id
         self.name = name
         self.width = width
         self.height = height
 
+        self.blendedTerrain = None
+        self.blendedTrack = None
+
+        self.chunks = {}
+        self.chunksSize = 0
+
     # Generate new random map
     @staticmethod
     def generate_new(game):
@@ -404,33 +628,94 @@ class Map:
             'y': random.randint(-1000000, 1000000)
         }
 
-        map.terrain = [ [ 0 for x in range(width) ] for y in range(height) ]
-        for y in range(height):
-            for x in range(width):
-                map.terrain[y][x] = Map.generate_terrain_tile(map, x, y)
-        map.fix_noise_errors()
-        map.blend_terrain()
+        map.generate_terrain()
 
-        map.track = [ [ 0 for x in range(width) ] for y in range(height) ]
+        map.track = Grid(width, height)
         map.blend_track(False)
 
         return map
 
-    # Create map by loading a JSON string
+    # Get the start position and angle of a vehicle next to the finish
+    def get_start_position(self, vehicleId):
+        if self.finish['width'] >= self.finish['height']:
+            return self.get_slot_position(self.finish, Direction.BOTTOM_TO_TOP, vehicleId)
+        return self.get_slot_position(self.finish, Direction.RIGHT_TO_LEFT, vehicleId)
+
+    # Get the position and angle of the slot of a vehicle behind a checkpoint, the first vehicles stand in the lanes across
+    # the track right behind the checkpoint from the middle out, the next ones stand on the track tiles further back
+    def get_slot_position(self, checkpoint, direction, vehicleId):
+        if direction == Direction.TOP_TO_BOTTOM or direction == Direction.BOTTOM_TO_TOP:
+            y = checkpoint['y'] - 1 if direction == Direction.TOP_TO_BOTTOM else checkpoint['y'] + checkpoint['height']
+            lanes = [ ( checkpoint['x'] + checkpoint['width'] // 2 + lane, y ) for lane in Map.get_slot_lanes(checkpoint['width']) ]
+            back = ( 0, -1 ) if direction == Direction.TOP_TO_BOTTOM else ( 0, 1 )
+            angle = math.radians(180) if direction == Direction.TOP_TO_BOTTOM else 0
+        else:
+            x = checkpoint['x'] + checkpoint['width'] if direction == Direction.LEFT_TO_RIGHT else checkpoint['x'] - 1
+            lanes = [ ( x, checkpoint['y'] + checkpoint['height'] // 2 + lane ) for lane in Map.get_slot_lanes(checkpoint['height']) ]
+            back = ( 1, 0 ) if direction == Direction.LEFT_TO_RIGHT else ( -1, 0 )
+            angle = math.radians(90) if direction == Direction.LEFT_TO_RIGHT else math.radians(270)
+
+        if vehicleId < len(lanes):
+            x, y = lanes[vehicleId]
+        else:
+            x, y = self.find_slot_tile(checkpoint, lanes, back, vehicleId)
+        return ( x * Config.TILE_SPRITE_SIZE + Config.TILE_SPRITE_SIZE / 2, y * Config.TILE_SPRITE_SIZE + Config.TILE_SPRITE_SIZE / 2, angle )
+
+    # Find the tile of a slot by a breadth first search from the lanes behind a checkpoint that doesn't cross the checkpoint,
+    # the track tiles are used first and only when the track is full the other tiles of the map
+    def find_slot_tile(self, checkpoint, lanes, back, vehicleId):
+        slots = list(lanes)
+        visited = set(lanes)
+        for onlyTrack in ( True, False ):
+            queue = collections.deque(slots)
+            while len(queue) > 0:
+                x, y = queue.popleft()
+                for dx, dy in ( back, ( back[1], back[0] ), ( -back[1], -back[0] ), ( -back[0], -back[1] ) ):
+                    tile = ( x + dx, y + dy )
+                    if (
+                        tile in visited or tile[0] < 0 or tile[1] < 0 or tile[0] >= self.width or tile[1] >= self.height or
+                        (onlyTrack and self.track[tile[1]][tile[0]] == 0) or
+                        (tile[0] >= checkpoint['x'] and tile[1] >= checkpoint['y'] and
+                            tile[0] < checkpoint['x'] + checkpoint['width'] and tile[1] < checkpoint['y'] + checkpoint['height'])
+                    ):
+                        continue
+                    visited.add(tile)
+                    slots.append(tile)
+                    if len(slots) > vehicleId:
+                        return slots[vehicleId]
+                    queue.append(tile)
+
+        # When the map is full the vehicles stand on top of each other
+        return slots[vehicleId % len(slots)]
+
+    # Get the tile offsets of the lanes from the middle of a checkpoint of a size, from the middle out
+    # so the first two vehicles always stand next to each other in the middle of the track
     @staticmethod
-    def load_from_string(jsonString):
+    def get_slot_lanes(size):
+        lanes = []
+        for i in range(size * 2):
+            lane = -(i // 2) - 1 if i % 2 == 0 else i // 2
+            if lane >= -(size // 2) and lane < size - size // 2:
+                lanes.append(lane)
+        if len(lanes) < 2:
+            return [ -1, 0 ]
+        return lanes
+
+    # Create map by loading a JSON string, the message about a different game version can be left out
+    @staticmethod
+    def load_from_string(jsonString, showVersionMessage = True):
         try:
             data = json.loads(jsonString)
         except:
-            tkinter.messagebox.showinfo('Corrupt JSON file!', 'This JSON file is corrupt\nYou can try to fix it with JSONLint (https://jsonlint.com/)')
+            dialogs.show_message('Corrupt JSON file!', 'This JSON file is corrupt\nYou can try to fix it with JSONLint (https://jsonlint.com/)')
             return
 
         if  'type' not in data or data['type'] != 'BassieRacing Map':
-            tkinter.messagebox.showinfo('Not a BassieRacing map!', 'This JSON file is not a BassieRacing Map')
+            dialogs.show_message('Not a BassieRacing map!', 'This JSON file is not a BassieRacing Map')
             return
 
-        if checkVersion(data['version']):
-            tkinter.messagebox.showinfo('Map uses different game version!', 'This map uses a different game version, some incompatibility may occur\n\n' +
+        if showVersionMessage and checkVersion(data['version']):
+            dialogs.show_message('Map uses different game version!', 'This map uses a different game version, some incompatibility may occur\n\n' +
                 'Map game version: ' + data['version'] + '\nThis game version: ' + Config.VERSION)
 
         map = Map(data['id'], data['name'], data['width'], data['height'])
@@ -447,21 +732,152 @@ class Map:
             'y': data['noise']['y']
         }
 
-        map.terrain = data['terrain']
+        map.terrain = Grid.from_list(data['terrain'])
         map.blend_terrain()
-        map.track = data['track']
+        map.track = Grid.from_list(data['track'])
         map.blend_track(True)
 
         return map
 
-    # Create map by loading a file
+    # Get a hash of the map size and tiles that changes when the map content changes
+    def get_content_hash(self):
+        contentHash = hashlib.sha1(struct.pack('<HH', self.width, self.height))
+        contentHash.update(self.terrain.data)
+        contentHash.update(self.track.data)
+        return contentHash.hexdigest()
+
+    # Get a hash of the whole binary map, the multiplayer hosts send it and the clients cache the maps of the hosts by it
+    def get_binary_hash(self):
+        return hashlib.sha1(self.save_to_binary()).digest()
+
+    # Read the header of a binary map buffer, raises a ValueError when the header is not valid
     @staticmethod
-    def load_from_file(file_path):
-        with open(file_path, 'r') as file:
-            return Map.load_from_string(file.read())
+    def read_binary_header(buffer):
+        (
+            magic, formatVersion, id, width, height, laps, crashesEnabled, crashesTimeout,
+            noiseX, noiseY, versionLength, nameLength
+        ) = Map.BINARY_HEADER.unpack_from(buffer, 0)
+
+        if magic != Map.BINARY_MAGIC:
+            raise ValueError('Wrong magic')
+        if formatVersion != Map.BINARY_FORMAT_VERSION:
+            raise ValueError('Unknown format version')
+
+        position = Map.BINARY_HEADER.size
+        version = bytes(buffer[position:position + versionLength]).decode('utf-8')
+        position += versionLength
+        name = bytes(buffer[position:position + nameLength]).decode('utf-8')
+        position += nameLength
+
+        return {
+            'id': id,
+            'version': version,
+            'name': name,
+            'width': width,
+            'height': height,
+            'laps': laps,
+            'crashes': {
+                'enabled': crashesEnabled != 0,
+                'timeout': crashesTimeout
+            },
+            'noise': {
+                'x': noiseX,
+                'y': noiseY
+            },
+            'position': position
+        }
+
+    # Create map by loading a binary map buffer, the map layers keep using the buffer without copying it,
+    # the message about a different game version can be left out
+    @staticmethod
+    def load_from_binary(buffer, showVersionMessage = True):
+        try:
+            header = Map.read_binary_header(buffer)
+            width = header['width']
+            height = header['height']
+            position = header['position']
+            if len(buffer) != position + width * height * 2:
+                raise ValueError('Wrong file size')
+        except:
+            dialogs.show_message('Corrupt map file!', 'This binary BassieRacing map file is corrupt')
+            return
+
+        if showVersionMessage and checkVersion(header['version']):
+            dialogs.show_message('Map uses different game version!', 'This map uses a different game version, some incompatibility may occur\n\n' +
+                'Map game version: ' + header['version'] + '\nThis game version: ' + Config.VERSION)
+
+        map = Map(header['id'], header['name'], width, height)
+
+        map.laps = header['laps']
+        map.crashes = header['crashes']
+
+        map.noise = {
+            'perlin': PerlinNoise(),
+            'x': header['noise']['x'],
+            'y': header['noise']['y']
+        }
 
-    # Save map to file
+        view = memoryview(buffer)
+        map.terrain = Grid(width, height, view[position:position + width * height])
+        map.blend_terrain()
+        position += width * height
+        map.track = Grid(width, height, view[position:position + width * height])
+        map.blend_track(True)
+
+        return map
+
+    # Create map by loading a file, binary map files are memory mapped and JSON files are parsed,
+    # the message about a different game version can be left out
+    @staticmethod
+    def load_from_file(file_path, showVersionMessage = True):
+        with open(file_path, 'rb') as file:
+            if file.read(len(Map.BINARY_MAGIC)) == Map.BINARY_MAGIC:
+                # Copy on write mapping so editing the map never changes the file
+                return Map.load_from_binary(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_COPY), showVersionMessage)
+
+            file.seek(0)
+            return Map.load_from_string(file.read(), showVersionMessage)
+
+    # Read only the metadata of a map file for listing it, returns None when the file is not a valid map
+    @staticmethod
+    def load_metadata_from_file(file_path):
+        try:
+            with open(file_path, 'rb') as file:
+                # Binary map files only need their header to be read
+                header = file.read(Map.BINARY_HEADER.size)
+                if header[:len(Map.BINARY_MAGIC)] == Map.BINARY_MAGIC:
+                    versionLength, nameLength = Map.BINARY_HEADER.unpack(header)[-2:]
+                    data = Map.read_binary_header(header + file.read(versionLength + nameLength))
+
+                # JSON files are parsed without creating and blending the map layers
+                else:
+                    data = json.loads(header + file.read())
+                    if data['type'] != 'BassieRacing Map':
+                        return
+        except:
+            return
+
+        return {
+            'id': data['id'],
+            'name': data['name'],
+            'width': data['width'],
+            'height': data['height'],
+            'laps': data['laps']
+        }
+
+    # Save map to file, the binary map format is used when the file has the binary map extension
     def save_to_file(self, file_path):
+        # Copy memory mapped map layers to memory because the file can be the one that is mapped
+        if not isinstance(self.terrain.data, bytearray):
+            self.terrain = self.terrain.copy()
+        if not isinstance(self.track.data, bytearray):
+            self.track = self.track.copy()
+
+        if os.path.splitext(file_path)[1].lower() == Map.BINARY_EXTENSION:
+            with open(file_path, 'wb') as file:
+                file.write(self.save_to_binary())
+            return
+
         with open(file_path, 'w') as file:
             data = {
                 'type': 'BassieRacing Map',
@@ -483,11 +899,46 @@ class Map:
                     'y': self.noise['y']
                 },
 
-                'terrain': self.terrain,
-                'track': self.track
+                'terrain': self.terrain.to_list(),
+                'track': self.track.to_list()
             }
             file.write(json.dumps(data, separators=(',', ':')) + '\n')
 
+    # Save map to a binary map buffer
+    def save_to_binary(self):
+        version = Config.VERSION.encode('utf-8')
+        name = self.name.encode('utf-8')
+        header = Map.BINARY_HEADER.pack(
+            Map.BINARY_MAGIC, Map.BINARY_FORMAT_VERSION, self.id, self.width, self.height, self.laps,
+            1 if self.crashes['enabled'] else 0, self.crashes['timeout'],
+            self.noise['x'], self.noise['y'], len(version), len(name)
+        )
+        return header + version + name + bytes(self.terrain.data) + bytes(self.track.data)
+
+    # Generate, fix and blend the terrain of the whole map
+    def generate_terrain(self, useNumpy = True):
+        # When NumPy is available do it with array operations
+        if useNumpy and numpy != None:
+            x = numpy.arange(self.width, dtype=numpy.int64) + (self.noise['x'] - self.width // 2)
+            y = numpy.arange(self.height, dtype=numpy.int64) + (self.noise['y'] - self.height // 2)
+            n = self.noise['perlin'].noise_grid((x / 20)[numpy.newaxis, :], (y / 20)[:, numpy.newaxis], 2)
+
+            terrain = numpy.zeros(( self.height, self.width ), dtype=numpy.int64)
+            terrain[n > 0.05] = 1
+            terrain[n > 0.25] = 2
+            Map.fix_noise_errors_array(terrain)
+
+            self.terrain = Grid(self.width, self.height, bytearray(terrain.astype(numpy.uint8).tobytes()))
+            oldBlendedTerrain = self.blendedTerrain
+            self.blendedTerrain = Grid(self.width, self.height, bytearray(Map.blend_terrain_array(terrain).astype(numpy.uint8).tobytes()))
+            self.invalidate_chunks(oldBlendedTerrain, self.blendedTerrain)
+
+        # Else generate it tile by tile
+        else:
+            self.terrain = Grid(self.width, self.height, bytearray(self.generate_terrain_tile(x, y) for y in range(self.height) for x in range(self.width)))
+            self.fix_noise_errors()
+            self.blend_terrain()
+
     # Generate terrain tile
     def generate_terrain_tile(self, x, y):
         n = self.noise['perlin'].noise((x + (self.noise['x'] - self.width // 2)) / 20, (y + (self.noise['y'] - self.height // 2)) / 20, 2)
@@ -512,260 +963,501 @@ class Map:
                     if (y != 0 and self.terrain[y - 1][x] == 2) and (y != self.height - 1 and self.terrain[y + 1][x] == 2):
                         self.terrain[y][x] = 2
 
+    # Fix single tile noise errors of a NumPy terrain array, gives the same result as fix_noise_errors()
+    @staticmethod
+    def fix_noise_errors_array(terrain):
+        height, width = terrain.shape
+        border = numpy.full(1, -1, dtype=terrain.dtype)
+        borderRow = numpy.full(width, -1, dtype=terrain.dtype)
+
+        # The rows are fixed from top to bottom because every row uses the fixed row above it
+        for y in range(height):
+            row = terrain[y].copy()
+            up = terrain[y - 1] if y != 0 else borderRow
+            down = terrain[y + 1] if y != height - 1 else borderRow
+            right = numpy.concatenate(( row[1:], border ))
+            verticalDirt = (up == 1) & (down == 1)
+            verticalSand = (up == 2) & (down == 2)
+
+            # Every tile uses its fixed left neighbour, so repeat until the row is stable
+            fixedRow = row
+            while True:
+                left = numpy.concatenate(( border, fixedRow[:-1] ))
+                newRow = row.copy()
+                newRow[(newRow == 0) & (((left == 1) & (right == 1)) | verticalDirt)] = 1
+                newRow[(newRow == 1) & (((left == 2) & (right == 2)) | verticalSand)] = 2
+                if numpy.array_equal(newRow, fixedRow):
+                    break
+                fixedRow = newRow
+
+            terrain[y] = fixedRow
+
+    # Blend a NumPy terrain array, gives the same result as blending every tile with blend_terrain_tile()
+    @staticmethod
+    def blend_terrain_array(terrain):
+        padded = numpy.pad(terrain, 1, constant_values=-1)
+        blendType = terrain + 1
+
+        # Create the neighbour masks and look them up in the blend table
+        mask = (
+            (padded[:-2, 1:-1] == blendType) * Map.TOP |
+            (padded[2:, 1:-1] == blendType) * Map.BOTTOM |
+            (padded[1:-1, :-2] == blendType) * Map.LEFT |
+            (padded[1:-1, 2:] == blendType) * Map.RIGHT |
+            (padded[:-2, :-2] == blendType) * Map.TOP_LEFT |
+            (padded[:-2, 2:] == blendType) * Map.TOP_RIGHT |
+            (padded[2:, :-2] == blendType) * Map.BOTTOM_LEFT |
+            (padded[2:, 2:] == blendType) * Map.BOTTOM_RIGHT
+        )
+        return numpy.array(terrainBlendTable, dtype=numpy.int64)[terrain, mask]
+
+    # Get the blended terrain tile for a terrain type and neighbour mask, used to create the blend table
+    @staticmethod
+    def blend_terrain_mask(terrainType, mask):
+        # Grass tiles are blended with dirt and dirt tiles are blended with sand
+        if terrainType == 0:
+            firstTile = 1
+            defaultTile = 0
+        elif terrainType == 1:
+            firstTile = 14
+            defaultTile = 13
+        elif terrainType == 2:
+            return 26
+        else:
+            return 0
+
+        # 1/4 corner
+        if mask & Map.LEFT and mask & Map.TOP:
+            return firstTile + 8
+        elif mask & Map.RIGHT and mask & Map.TOP:
+            return firstTile + 9
+        elif mask & Map.LEFT and mask & Map.BOTTOM:
+            return firstTile + 10
+        elif mask & Map.RIGHT and mask & Map.BOTTOM:
+            return firstTile + 11
+
+        # Border
+        elif mask & Map.TOP:
+            return firstTile
+        elif mask & Map.BOTTOM:
+            return firstTile + 1
+        elif mask & Map.LEFT:
+            return firstTile + 2
+        elif mask & Map.RIGHT:
+            return firstTile + 3
+
+        # 3/4 corner
+        elif mask & Map.TOP_LEFT:
+            return firstTile + 4
+        elif mask & Map.TOP_RIGHT:
+            return firstTile + 5
+        elif mask & Map.BOTTOM_LEFT:
+            return firstTile + 6
+        elif mask & Map.BOTTOM_RIGHT:
+            return firstTile + 7
+
+        else:
+            return defaultTile
+
+    # Blend a single terrain tile
+    def blend_terrain_tile(self, x, y):
+        terrainType = self.terrain[y][x]
+        blendType = terrainType + 1
+        top = y != 0
+        bottom = y != self.height - 1
+        left = x != 0
+        right = x != self.width - 1
+
+        mask = 0
+        if top and self.terrain[y - 1][x] == blendType:
+            mask |= Map.TOP
+        if bottom and self.terrain[y + 1][x] == blendType:
+            mask |= Map.BOTTOM
+        if left and self.terrain[y][x - 1] == blendType:
+            mask |= Map.LEFT
+        if right and self.terrain[y][x + 1] == blendType:
+            mask |= Map.RIGHT
+        if top and left and self.terrain[y - 1][x - 1] == blendType:
+            mask |= Map.TOP_LEFT
+        if top and right and self.terrain[y - 1][x + 1] == blendType:
+            mask |= Map.TOP_RIGHT
+        if bottom and left and self.terrain[y + 1][x - 1] == blendType:
+            mask |= Map.BOTTOM_LEFT
+        if bottom and right and self.terrain[y + 1][x + 1] == blendType:
+            mask |= Map.BOTTOM_RIGHT
+
+        return terrainBlendTable[terrainType][mask]
+
     # Blend terrain
-    def blend_terrain(self):
-        # Blend terrain tiles
-        self.blendedTerrain = [ [ 0 for x in range(self.width) ] for y in range(self.height) ]
-        for y in range(self.height):
-            for x in range(self.width):
-                # Grass terrain tile
-                if self.terrain[y][x] == 0:
-                    # Dirt 1/4 corner
-                    if (x != 0 and self.terrain[y][x - 1] == 1) and (y != 0 and self.terrain[y - 1][x] == 1):
-                        self.blendedTerrain[y][x] = 9
-                    elif (x != self.width - 1 and self.terrain[y][x + 1] == 1) and (y != 0 and self.terrain[y - 1][x] == 1):
-                        self.blendedTerrain[y][x] = 10
-                    elif (x != 0 and self.terrain[y][x - 1] == 1) and (y != self.height - 1 and self.terrain[y + 1][x] == 1):
-                        self.blendedTerrain[y][x] = 11
-                    elif (x != self.width - 1 and self.terrain[y][x + 1] == 1) and (y != self.height - 1 and self.terrain[y + 1][x] == 1):
-                        self.blendedTerrain[y][x] = 12
-
-                    # Dirt border
-                    elif y != 0 and self.terrain[y - 1][x] == 1:
-                        self.blendedTerrain[y][x] = 1
-                    elif y != self.height - 1 and self.terrain[y + 1][x] == 1:
-                        self.blendedTerrain[y][x] = 2
-                    elif x != 0 and self.terrain[y][x - 1] == 1:
-                        self.blendedTerrain[y][x] = 3
-                    elif x != self.width - 1 and self.terrain[y][x + 1] == 1:
-                        self.blendedTerrain[y][x] = 4
-
-                    # Dirt 3/4 corner
-                    elif x != 0 and y != 0 and self.terrain[y - 1][x - 1] == 1:
-                        self.blendedTerrain[y][x] = 5
-                    elif x != self.width - 1 and y != 0 and self.terrain[y - 1][x + 1] == 1:
-                        self.blendedTerrain[y][x] = 6
-                    elif x != 0 and y != self.height - 1 and self.terrain[y + 1][x - 1] == 1:
-                        self.blendedTerrain[y][x] = 7
-                    elif x != self.width - 1 and y != self.height - 1 and self.terrain[y + 1][x + 1] == 1:
-                        self.blendedTerrain[y][x] = 8
+    def blend_terrain(self, useNumpy = True):
+        # When NumPy is available do it with array operations
+        if useNumpy and numpy != None:
+            terrain = numpy.frombuffer(bytes(self.terrain.data), dtype=numpy.uint8).reshape(( self.height, self.width )).astype(numpy.int64)
+            blendedTerrain = bytearray(Map.blend_terrain_array(terrain).astype(numpy.uint8).tobytes())
 
+        # Else blend it tile by tile
+        else:
+            blendedTerrain = bytearray(self.blend_terrain_tile(x, y) for y in range(self.height) for x in range(self.width))
+
+        oldBlendedTerrain = self.blendedTerrain
+        self.blendedTerrain = Grid(self.width, self.height, blendedTerrain)
+
+        # Remove the cached chunks with changed tiles
+        self.invalidate_chunks(oldBlendedTerrain, self.blendedTerrain)
+
+    # Find map finish start point, starting the search at a tile position
+    def find_finish(self, start = 0):
+        for position in range(start, self.width * self.height):
+            x = position % self.width
+            y = position // self.width
+            if self.track[y][x] == 2:
+                width = 0
+                for i in range(self.width):
+                    if x + i != self.width and self.track[y][x + i] == 2:
+                        width += 1
                     else:
-                        self.blendedTerrain[y][x] = 0
-
-                # Dirt terrain tile
-                if self.terrain[y][x] == 1:
-                    # Sand 1/4 corner
-                    if (x != 0 and self.terrain[y][x - 1] == 2) and (y != 0 and self.terrain[y - 1][x] == 2):
-                        self.blendedTerrain[y][x] = 22
-                    elif (x != self.width - 1 and self.terrain[y][x + 1] == 2) and (y != 0 and self.terrain[y - 1][x] == 2):
-                        self.blendedTerrain[y][x] = 23
-                    elif (x != 0 and self.terrain[y][x - 1] == 2) and (y != self.height - 1 and self.terrain[y + 1][x] == 2):
-                        self.blendedTerrain[y][x] = 24
-                    elif (x != self.width - 1 and self.terrain[y][x + 1] == 2) and (y != self.height - 1 and self.terrain[y + 1][x] == 2):
-                        self.blendedTerrain[y][x] = 25
-
-                    # Sand border
-                    elif y != 0 and self.terrain[y - 1][x] == 2:
-                        self.blendedTerrain[y][x] = 14
-                    elif y != self.height - 1 and self.terrain[y + 1][x] == 2:
-                        self.blendedTerrain[y][x] = 15
-                    elif x != 0 and self.terrain[y][x - 1] == 2:
-                        self.blendedTerrain[y][x] = 16
-                    elif x != self.width - 1 and self.terrain[y][x + 1] == 2:
-                        self.blendedTerrain[y][x] = 17
-
-                    # Sand 3/4 corner
-                    elif x != 0 and y != 0 and self.terrain[y - 1][x - 1] == 2:
-                        self.blendedTerrain[y][x] = 18
-                    elif x != self.width - 1 and y != 0 and self.terrain[y - 1][x + 1] == 2:
-                        self.blendedTerrain[y][x] = 19
-                    elif x != 0 and y != self.height - 1 and self.terrain[y + 1][x - 1] == 2:
-                        self.blendedTerrain[y][x] = 20
-                    elif x != self.width - 1 and y != self.height - 1 and self.terrain[y + 1][x + 1] == 2:
-                        self.blendedTerrain[y][x] = 21
+                        break
 
+                height = 0
+                for i in range(self.height):
+                    if y + i != self.height and self.track[y + i][x] == 2:
+                        height += 1
                     else:
-                        self.blendedTerrain[y][x] = 13
+                        break
 
-                # Sand terrain tile
-                if self.terrain[y][x] == 2:
-                    self.blendedTerrain[y][x] = 26
+                self.finish = {
+                    'x': x,
+                    'y': y,
+                    'width': width,
+                    'height': height
+                }
 
-    # Find map finish start point
-    def find_finish(self):
-        for y in range(self.height):
-            for x in range(self.width):
-                if self.track[y][x] == 2:
-                    width = 0
-                    for i in range(self.width):
-                        if x + i != self.width and self.track[y][x + i] == 2:
-                            width += 1
-                        else:
-                            break
-
-                    height = 0
-                    for i in range(self.height):
-                        if y + i != self.height and self.track[y + i][x] == 2:
-                            height += 1
-                        else:
-                            break
-
-                    self.finish = {
-                        'x': x,
-                        'y': y,
-                        'width': width,
-                        'height': height
-                    }
-
-                    return True
+                return True
+
+        # When no finish is found use a default finish in the center of the map
+        self.finish = {
+            'x': self.width // 2,
+            'y': self.height // 2,
+            'width': 1,
+            'height': 2
+        }
 
         return False
 
+    # Find the checkpoints that start in a list of tiles
+    def find_checkpoints(self, tiles):
+        for x, y in tiles:
+            # Add a checkpoint when the tile is not in an earlier checkpoint
+            if self.track[y][x] == 3 and not any(Map.checkpoint_contains(checkpoint, x, y) for checkpoint in self.checkpoints):
+                self.checkpoints.append(self.measure_checkpoint(x, y))
+
+    # Measure the checkpoint that starts at a tile, it reaches as far right and down as the checkpoint tiles go
+    def measure_checkpoint(self, x, y):
+        width = 0
+        for i in range(self.width):
+            if x + i != self.width and self.track[y][x + i] == 3:
+                width += 1
+            else:
+                break
+
+        height = 0
+        for i in range(self.height):
+            if y + i != self.height and self.track[y + i][x] == 3:
+                height += 1
+            else:
+                break
+
+        return {
+            'x': x,
+            'y': y,
+            'width': width,
+            'height': height
+        }
+
+    # Check if a tile is inside a checkpoint
+    @staticmethod
+    def checkpoint_contains(checkpoint, x, y):
+        return (
+            x >= checkpoint['x'] and y >= checkpoint['y'] and
+            x < checkpoint['x'] + checkpoint['width'] and y < checkpoint['y'] + checkpoint['height']
+        )
+
+    # Get the blended track tile for a track type and neighbour mask, used to create the blend table
+    @staticmethod
+    def blend_track_mask(trackType, mask):
+        # Asphalt track tile
+        if trackType == 1:
+            # Closed
+            if mask & Map.TOP_EMPTY and mask & Map.BOTTOM_EMPTY:
+                return 10
+            elif mask & Map.LEFT_EMPTY and mask & Map.RIGHT_EMPTY:
+                return 11
+
+            # Corners
+            elif mask & Map.TOP_EMPTY and mask & Map.LEFT_EMPTY:
+                return 6
+            elif mask & Map.TOP_EMPTY and mask & Map.RIGHT_EMPTY:
+                return 7
+            elif mask & Map.BOTTOM_EMPTY and mask & Map.LEFT_EMPTY:
+                return 8
+            elif mask & Map.BOTTOM_EMPTY and mask & Map.RIGHT_EMPTY:
+                return 9
+
+            # Straight border
+            elif mask & Map.TOP_EMPTY:
+                return 2
+            elif mask & Map.BOTTOM_EMPTY:
+                return 3
+            elif mask & Map.LEFT_EMPTY:
+                return 4
+            elif mask & Map.RIGHT_EMPTY:
+                return 5
+
+            else:
+                return 1
+
+        # Finish and checkpoint track tiles
+        if trackType == 2 or trackType == 3:
+            firstTile = 12 if trackType == 2 else 20
+
+            # Open
+            if mask & Map.TOP and mask & Map.BOTTOM:
+                return firstTile
+            elif mask & Map.LEFT and mask & Map.RIGHT:
+                return firstTile + 1
+
+            # Straight border
+            elif mask & Map.TOP_EMPTY and mask & Map.BOTTOM:
+                return firstTile + 2
+            elif mask & Map.BOTTOM_EMPTY and mask & Map.TOP:
+                return firstTile + 3
+            elif mask & Map.LEFT_EMPTY and mask & Map.RIGHT:
+                return firstTile + 4
+            elif mask & Map.RIGHT_EMPTY and mask & Map.LEFT:
+                return firstTile + 5
+
+            # Closed
+            elif mask & Map.TOP_EMPTY and mask & Map.BOTTOM_EMPTY:
+                return firstTile + 6
+            elif mask & Map.LEFT_EMPTY and mask & Map.RIGHT_EMPTY:
+                return firstTile + 7
+
+            else:
+                return firstTile + 1
+
+        return 0
+
+    # Blend a NumPy track array, gives the same result as blending every tile with blend_track_tile()
+    @staticmethod
+    def blend_track_array(track):
+        padded = numpy.pad(track, 1, constant_values=0)
+        top = padded[:-2, 1:-1]
+        bottom = padded[2:, 1:-1]
+        left = padded[1:-1, :-2]
+        right = padded[1:-1, 2:]
+
+        # Create the neighbour masks and look them up in the blend table
+        mask = (
+            (top == track) * Map.TOP |
+            (bottom == track) * Map.BOTTOM |
+            (left == track) * Map.LEFT |
+            (right == track) * Map.RIGHT |
+            (top == 0) * Map.TOP_EMPTY |
+            (bottom == 0) * Map.BOTTOM_EMPTY |
+            (left == 0) * Map.LEFT_EMPTY |
+            (right == 0) * Map.RIGHT_EMPTY
+        )
+        return numpy.array(trackBlendTable, dtype=numpy.int64)[track, mask]
+
+    # Blend a single track tile
+    def blend_track_tile(self, x, y):
+        trackType = self.track[y][x]
+        top = self.track[y - 1][x] if y != 0 else 0
+        bottom = self.track[y + 1][x] if y != self.height - 1 else 0
+        left = self.track[y][x - 1] if x != 0 else 0
+        right = self.track[y][x + 1] if x != self.width - 1 else 0
+
+        return trackBlendTable[trackType][
+            (top == trackType) |
+            (bottom == trackType) << 1 |
+            (left == trackType) << 2 |
+            (right == trackType) << 3 |
+            (top == 0) << 4 |
+            (bottom == 0) << 5 |
+            (left == 0) << 6 |
+            (right == 0) << 7
+        ]
+
     # Blend track
-    def blend_track(self, showNoErrorMessages):
+    def blend_track(self, showNoErrorMessages, useNumpy = True):
         # Find map finish
-        if not self.find_finish():
-            if showNoErrorMessages:
-                tkinter.messagebox.showinfo('Map has no finish!', 'This map has no finish, this can cause the game to crash')
-            self.finish = {
-                'x': self.width // 2,
-                'y': self.height // 2,
-                'width': 1,
-                'height': 2
-            }
+        if not self.find_finish() and showNoErrorMessages:
+            dialogs.show_message('Map has no finish!', 'This map has no finish, this can cause the game to crash')
 
         # Find checkpoints
         self.checkpoints = []
-        for y in range(self.height):
-            for x in range(self.width):
-                if self.track[y][x] == 3:
-                    # Check if checkpoint already exists
-                    alreadyExists = False
-                    for checkpoint in self.checkpoints:
-                        if (
-                            x >= checkpoint['x'] and y >= checkpoint['y'] and
-                            x < checkpoint['x'] + checkpoint['width'] and y < checkpoint['y'] + checkpoint['height']
-                        ):
-                            alreadyExists = True
-                            break
-
-                    # Else add checkpoint
-                    if not alreadyExists:
-                        width = 0
-                        for i in range(self.width):
-                            if x + i != self.width and self.track[y][x + i] == 3:
-                                width += 1
-                            else:
-                                break
-
-                        height = 0
-                        for i in range(self.height):
-                            if y + i != self.height and self.track[y + i][x] == 3:
-                                height += 1
-                            else:
-                                break
-
-                        self.checkpoints.append({
-                            'x': x,
-                            'y': y,
-                            'width': width,
-                            'height': height
-                        })
-
-                        x += width
+        self.find_checkpoints(self.get_checkpoint_tiles(0))
+        self.index_checkpoints()
 
         if len(self.checkpoints) == 0 and showNoErrorMessages:
-            tkinter.messagebox.showinfo('Map has no checkpoints!', 'This map has no checkpoints, this can cause the game to crash')
-
-        # Blend track tiles
-        self.blendedTrack = [ [ 0 for x in range(self.width) ] for y in range(self.height) ]
-        for y in range(self.height):
-            for x in range(self.width):
-                # Asphalt track tile
-                if self.track[y][x] == 1:
-                    # Closed
-                    if (y == 0 or self.track[y - 1][x] == 0) and (y == self.height - 1 or self.track[y + 1][x] == 0):
-                        self.blendedTrack[y][x] = 10
-                    elif (x == 0 or self.track[y][x - 1] == 0) and (x == self.width - 1 or self.track[y][x + 1] == 0):
-                        self.blendedTrack[y][x] = 11
-
-                    # Corners
-                    elif (y == 0 or self.track[y - 1][x] == 0) and (x == 0 or self.track[y][x - 1] == 0):
-                        self.blendedTrack[y][x] = 6
-                    elif (y == 0 or self.track[y - 1][x] == 0) and (x == self.width - 1 or self.track[y][x + 1] == 0):
-                        self.blendedTrack[y][x] = 7
-                    elif (y == self.height - 1 or self.track[y + 1][x] == 0) and (x == 0 or self.track[y][x - 1] == 0):
-                        self.blendedTrack[y][x] = 8
-                    elif (y == self.height - 1 or self.track[y + 1][x] == 0) and (x == self.width - 1 or self.track[y][x + 1] == 0):
-                        self.blendedTrack[y][x] = 9
-
-                    # Straight border
-                    elif y == 0 or self.track[y - 1][x] == 0:
-                        self.blendedTrack[y][x] = 2
-                    elif y == self.height - 1 or self.track[y + 1][x] == 0:
-                        self.blendedTrack[y][x] = 3
-                    elif x == 0 or self.track[y][x - 1] == 0:
-                        self.blendedTrack[y][x] = 4
-                    elif x == self.width - 1 or self.track[y][x + 1] == 0:
-                        self.blendedTrack[y][x] = 5
+            dialogs.show_message('Map has no checkpoints!', 'This map has no checkpoints, this can cause the game to crash')
 
-                    else:
-                        self.blendedTrack[y][x] = 1
-
-                # Finish track tile
-                if self.track[y][x] == 2:
-                    # Open
-                    if (y != 0 and self.track[y - 1][x] == 2) and (y != self.height - 1 and self.track[y + 1][x] == 2):
-                        self.blendedTrack[y][x] = 12
-                    elif (x != 0 and self.track[y][x - 1] == 2) and (x != self.width - 1 and self.track[y][x + 1] == 2):
-                        self.blendedTrack[y][x] = 13
-
-                    # Straight border
-                    elif (y == 0 or self.track[y - 1][x] == 0) and (y != self.height - 1 and self.track[y + 1][x] == 2):
-                        self.blendedTrack[y][x] = 14
-                    elif (y == self.height - 1 or self.track[y + 1][x] == 0) and (y != 0 and self.track[y - 1][x] == 2):
-                        self.blendedTrack[y][x] = 15
-                    elif (x == 0 or self.track[y][x - 1] == 0) and (x != self.width - 1 and self.track[y][x + 1] == 2):
-                        self.blendedTrack[y][x] = 16
-                    elif (x == self.width - 1 or self.track[y][x + 1] == 0) and (x != 0 and self.track[y][x - 1] == 2):
-                        self.blendedTrack[y][x] = 17
-
-                    # Closed
-                    elif (y == 0 or self.track[y - 1][x] == 0) and (y == self.height - 1 or self.track[y + 1][x] == 0):
-                        self.blendedTrack[y][x] = 18
-                    elif (x == 0 or self.track[y][x - 1] == 0) and (x == self.width - 1 or self.track[y][x + 1] == 0):
-                        self.blendedTrack[y][x] = 19
+        # When NumPy is available do it with array operations
+        if useNumpy and numpy != None:
+            track = numpy.frombuffer(bytes(self.track.data), dtype=numpy.uint8).reshape(( self.height, self.width )).astype(numpy.int64)
+            blendedTrack = bytearray(Map.blend_track_array(track).astype(numpy.uint8).tobytes())
 
-                    else:
-                        self.blendedTrack[y][x] = 13
-
-                # Checkpoint track tile
-                if self.track[y][x] == 3:
-                    # Open
-                    if (y != 0 and self.track[y - 1][x] == 3) and (y != self.height - 1 and self.track[y + 1][x] == 3):
-                        self.blendedTrack[y][x] = 20
-                    elif (x != 0 and self.track[y][x - 1] == 3) and (x != self.width - 1 and self.track[y][x + 1] == 3):
-                        self.blendedTrack[y][x] = 21
-
-                    # Straight border
-                    elif (y == 0 or self.track[y - 1][x] == 0) and (y != self.height - 1 and self.track[y + 1][x] == 3):
-                        self.blendedTrack[y][x] = 22
-                    elif (y == self.height - 1 or self.track[y + 1][x] == 0) and (y != 0 and self.track[y - 1][x] == 3):
-                        self.blendedTrack[y][x] = 23
-                    elif (x == 0 or self.track[y][x - 1] == 0) and (x != self.width - 1 and self.track[y][x + 1] == 3):
-                        self.blendedTrack[y][x] = 24
-                    elif (x == self.width - 1 or self.track[y][x + 1] == 0) and (x != 0 and self.track[y][x - 1] == 3):
-                        self.blendedTrack[y][x] = 25
-
-                    # Closed
-                    elif (y == 0 or self.track[y - 1][x] == 0) and (y == self.height - 1 or self.track[y + 1][x] == 0):
-                        self.blendedTrack[y][x] = 26
-                    elif (x == 0 or self.track[y][x - 1] == 0) and (x == self.width - 1 or self.track[y][x + 1] == 0):
-                        self.blendedTrack[y][x] = 27
+        # Else blend it tile by tile
+        else:
+            blendedTrack = bytearray(self.blend_track_tile(x, y) for y in range(self.height) for x in range(self.width))
+
+        oldBlendedTrack = self.blendedTrack
+        self.blendedTrack = Grid(self.width, self.height, blendedTrack)
+
+        # Remove the cached chunks with changed tiles
+        self.invalidate_chunks(oldBlendedTrack, self.blendedTrack)
+
+    # Update the map finish after the track tile at x, y has changed
+    def update_finish(self, x, y):
+        start = self.finish['y'] * self.width + self.finish['x']
+        position = y * self.width + x
+
+        # When the finish start moved search again from the first possible tile
+        if self.track[self.finish['y']][self.finish['x']] != 2 or position < start:
+            self.find_finish(min(start, position))
+
+        # When the tile is in the finish start row or column measure the finish again
+        elif x == self.finish['x'] or y == self.finish['y']:
+            self.find_finish(start)
+
+    # Update the map checkpoints after the track tile at x, y has changed, the checkpoints are found in map order and a checkpoint
+    # tile inside an earlier checkpoint belongs to it, so the checkpoints are found again from the first tile that can change them:
+    # the changed tile or the start of a checkpoint that contains it or that ends next to it
+    def update_checkpoints(self, x, y):
+        position = y * self.width + x
+        start = position
+        for checkpoint in self.checkpoints:
+            if (
+                x >= checkpoint['x'] and y >= checkpoint['y'] and
+                x <= checkpoint['x'] + checkpoint['width'] and y <= checkpoint['y'] + checkpoint['height']
+            ):
+                start = min(start, checkpoint['y'] * self.width + checkpoint['x'])
+
+        # Keep the checkpoints before the start, the tiles inside them are looked up in the old checkpoint grid
+        oldCheckpoints = self.checkpoints
+        firstIndex = 0
+        while firstIndex < len(oldCheckpoints) and oldCheckpoints[firstIndex]['y'] * self.width + oldCheckpoints[firstIndex]['x'] < start:
+            firstIndex += 1
+        self.checkpoints = oldCheckpoints[:firstIndex]
+
+        # Find the checkpoints again until the tiles after the changed tile are not inside a checkpoint that has changed,
+        # from there on the old checkpoints are found again so they are kept
+        oldIndex = firstIndex
+        reach = self.get_changed_checkpoints_reach(oldCheckpoints[firstIndex:oldIndex], self.checkpoints[firstIndex:])
+        for tileX, tileY in self.get_checkpoint_tiles(start):
+            tilePosition = tileY * self.width + tileX
+            if oldIndex < len(oldCheckpoints) and oldCheckpoints[oldIndex]['y'] * self.width + oldCheckpoints[oldIndex]['x'] < tilePosition:
+                while oldIndex < len(oldCheckpoints) and oldCheckpoints[oldIndex]['y'] * self.width + oldCheckpoints[oldIndex]['x'] < tilePosition:
+                    oldIndex += 1
+                reach = self.get_changed_checkpoints_reach(oldCheckpoints[firstIndex:oldIndex], self.checkpoints[firstIndex:])
+            if tilePosition > position and tilePosition > reach:
+                break
+
+            checkpointIndex = self.checkpointGrid[tileY][tileX]
+            if not (
+                (checkpointIndex != 0 and checkpointIndex <= firstIndex) or
+                any(Map.checkpoint_contains(checkpoint, tileX, tileY) for checkpoint in self.checkpoints[firstIndex:])
+            ):
+                self.checkpoints.append(self.measure_checkpoint(tileX, tileY))
+                reach = self.get_changed_checkpoints_reach(oldCheckpoints[firstIndex:oldIndex], self.checkpoints[firstIndex:])
+        else:
+            oldIndex = len(oldCheckpoints)
+
+        self.checkpoints += oldCheckpoints[oldIndex:]
+        self.reindex_checkpoints(oldCheckpoints)
+
+    # Get the last tile position inside the checkpoints that are only in the old or only in the new checkpoints, -1 when there are none
+    def get_changed_checkpoints_reach(self, oldCheckpoints, newCheckpoints):
+        oldRects = set(( checkpoint['x'], checkpoint['y'], checkpoint['width'], checkpoint['height'] ) for checkpoint in oldCheckpoints)
+        newRects = set(( checkpoint['x'], checkpoint['y'], checkpoint['width'], checkpoint['height'] ) for checkpoint in newCheckpoints)
+        return max(( (y + height - 1) * self.width + x + width - 1 for x, y, width, height in oldRects ^ newRects ), default=-1)
+
+    # Get the checkpoint tiles in map order from a tile position, every row is searched as bytes because the track
+    # of a binary map is a memory view
+    def get_checkpoint_tiles(self, start):
+        for y in range(start // self.width, self.height):
+            row = bytes(self.track[y])
+            x = row.find(3, max(start - y * self.width, 0))
+            while x != -1:
+                yield ( x, y )
+                x = row.find(3, x + 1)
+
+    # Index the checkpoints in a grid so a vehicle finds the checkpoint of a tile at once,
+    # a cell holds the checkpoint index plus one and the first checkpoint wins when they overlap
+    def index_checkpoints(self):
+        self.checkpointGrid = Grid(self.width, self.height, array.array('H', bytes(self.width * self.height * 2)))
+        for i in range(len(self.checkpoints) - 1, -1, -1):
+            self.fill_checkpoint_cells(self.checkpoints[i], i + 1)
+
+    # Update the checkpoint grid after the checkpoints have changed, only the checkpoints from the first changed one have
+    # other indexes, so only the cells of those old and new checkpoints are cleared and filled again, also by the earlier checkpoints that overlap them
+    def reindex_checkpoints(self, oldCheckpoints):
+        start = 0
+        while start < min(len(oldCheckpoints), len(self.checkpoints)) and oldCheckpoints[start] == self.checkpoints[start]:
+            start += 1
+
+        changedCheckpoints = oldCheckpoints[start:] + self.checkpoints[start:]
+        for checkpoint in oldCheckpoints[start:]:
+            self.fill_checkpoint_cells(checkpoint, 0)
+        for i in range(len(self.checkpoints) - 1, -1, -1):
+            if i >= start:
+                self.fill_checkpoint_cells(self.checkpoints[i], i + 1)
+            else:
+                for changedCheckpoint in changedCheckpoints:
+                    self.fill_checkpoint_cells(self.checkpoints[i], i + 1, changedCheckpoint)
+
+    # Fill the cells of a checkpoint in the checkpoint grid with a value, only the cells inside the area checkpoint when given
+    def fill_checkpoint_cells(self, checkpoint, value, area = None):
+        startX, startY = checkpoint['x'], checkpoint['y']
+        endX, endY = checkpoint['x'] + checkpoint['width'], checkpoint['y'] + checkpoint['height']
+        if area != None:
+            startX, startY = max(startX, area['x']), max(startY, area['y'])
+            endX, endY = min(endX, area['x'] + area['width']), min(endY, area['y'] + area['height'])
+        for y in range(startY, endY):
+            if endX > startX:
+                self.checkpointGrid[y][startX:endX] = array.array('H', [ value ]) * (endX - startX)
+
+    # Set a terrain tile and only blend the tiles around it
+    def set_terrain_tile(self, x, y, terrainType):
+        if self.terrain[y][x] != terrainType:
+            self.terrain[y][x] = terrainType
+            self.blend_area(self.blendedTerrain, self.blend_terrain_tile, x, y)
+
+    # Set a track tile and only update the finish, checkpoints and tiles around it
+    def set_track_tile(self, x, y, trackType):
+        oldTrackType = self.track[y][x]
+        if oldTrackType != trackType:
+            self.track[y][x] = trackType
+
+            if oldTrackType == 2 or trackType == 2:
+                self.update_finish(x, y)
+
+            if oldTrackType == 3 or trackType == 3:
+                self.update_checkpoints(x, y)
+
+            self.blend_area(self.blendedTrack, self.blend_track_tile, x, y)
+
+    # Blend the three by three tiles around a tile again
+    def blend_area(self, blendedGrid, blendTile, x, y):
+        dirtyChunks = set()
+        for tileY in range(max(y - 1, 0), min(y + 2, self.height)):
+            for tileX in range(max(x - 1, 0), min(x + 2, self.width)):
+                blendedTile = blendTile(tileX, tileY)
+                if blendedGrid[tileY][tileX] != blendedTile:
+                    blendedGrid[tileY][tileX] = blendedTile
+                    dirtyChunks.add(( tileX // Config.MAP_CHUNK_SIZE, tileY // Config.MAP_CHUNK_SIZE ))
+        self.remove_chunks(dirtyChunks)
 
-                    else:
-                        self.blendedTrack[y][x] = 21
     # Resize map
     def resize(self, width, height):
         old_width = self.width
@@ -780,21 +1472,20 @@ class Map:
 
         # Extend map
         if dw > 0:
-            self.terrain = [ [ 0 for x in range(width) ] for y in range(height) ]
+            self.terrain = Grid(width, height)
+            self.track = Grid(width, height)
             for y in range(height):
+                # Copy the old rows in one piece
+                if y - dh >= 0 and y - dh < old_height:
+                    self.terrain[y][dw:dw + old_width] = old_terrain[y - dh]
+                    self.track[y][dw:dw + old_width] = old_track[y - dh]
+
+                # Generate the new terrain tiles around it
                 for x in range(width):
-                    if x - dw >= 0 and y - dh >= 0 and x - dw < old_width and y - dh < old_height:
-                        self.terrain[y][x] = old_terrain[y - dh][x - dw]
-                    else:
+                    if x - dw < 0 or y - dh < 0 or x - dw >= old_width or y - dh >= old_height:
                         self.terrain[y][x] = self.generate_terrain_tile(x, y)
             self.fix_noise_errors()
             self.blend_terrain()
-
-            self.track = [ [ 0 for x in range(width) ] for y in range(height) ]
-            for y in range(height):
-                for x in range(width):
-                    if x - dw >= 0 and y - dh >= 0 and x - dw < old_width and y - dh < old_height:
-                        self.track[y][x] = old_track[y - dh][x - dw]
             self.blend_track(False)
 
         # Crop map
@@ -802,76 +1493,316 @@ class Map:
             dw = abs(dw)
             dh = abs(dh)
 
-            self.terrain = [ [ 0 for x in range(width) ] for y in range(height) ]
+            self.terrain = Grid(width, height)
+            self.track = Grid(width, height)
             for y in range(height):
-                for x in range(width):
-                    self.terrain[y][x] = old_terrain[dh + y][dw + x]
+                self.terrain[y][:] = old_terrain[dh + y][dw:dw + width]
+                self.track[y][:] = old_track[dh + y][dw:dw + width]
             self.blend_terrain()
-
-            self.track = [ [ 0 for x in range(width) ] for y in range(height) ]
-            for y in range(height):
-                for x in range(width):
-                    self.track[y][x] = old_track[dh + y][dw + x]
             self.blend_track(False)
 
-    # Draw the map
-    def draw(self, surface, camera):
-        # Draw terrain tiles to surface
+    # Remove the cached chunks that contain tiles which differ between two blended grids
+    def invalidate_chunks(self, oldGrid, newGrid):
+        # When the map size changed remove all chunks
+        if oldGrid == None or oldGrid.width != self.width or oldGrid.height != self.height:
+            self.chunks = {}
+            self.chunksSize = 0
+            return
+
+        # When nothing changed keep all chunks
+        if oldGrid.data == newGrid.data:
+            return
+
+        # Find the chunks of the changed tiles
+        dirtyChunks = set()
         for y in range(self.height):
-            for x in range(self.width):
+            if oldGrid[y] != newGrid[y]:
+                for x in range(self.width):
+                    if oldGrid[y][x] != newGrid[y][x]:
+                        dirtyChunks.add(( x // Config.MAP_CHUNK_SIZE, y // Config.MAP_CHUNK_SIZE ))
+
+        self.remove_chunks(dirtyChunks)
+
+    # Remove cached chunks for every tile size and grid flag
+    def remove_chunks(self, dirtyChunks):
+        if len(dirtyChunks) > 0:
+            for key in list(self.chunks):
+                if ( key[2], key[3] ) in dirtyChunks:
+                    chunk = self.chunks.pop(key)
+                    self.chunksSize -= chunk.get_width() * chunk.get_height() * 4
+
+    # Get a pre-rendered map chunk from the chunk cache or render it
+    def get_chunk(self, chunkX, chunkY, camera):
+        key = ( camera.tileSize, camera.grid, chunkX, chunkY )
+
+        # When the chunk is cached move it to the back so it will be removed last
+        if key in self.chunks:
+            chunk = self.chunks.pop(key)
+            self.chunks[key] = chunk
+            return chunk
+
+        # Render the terrain and track tiles of the chunk once
+        startX = chunkX * Config.MAP_CHUNK_SIZE
+        startY = chunkY * Config.MAP_CHUNK_SIZE
+        endX = min(startX + Config.MAP_CHUNK_SIZE, self.width)
+        endY = min(startY + Config.MAP_CHUNK_SIZE, self.height)
+        chunk = pygame.Surface(( int((endX - startX) * camera.tileSize), int((endY - startY) * camera.tileSize) ), pygame.SRCALPHA)
+        chunk.fill(Color.TRANSPARENT)
+        self.draw_tiles(chunk, camera, startX, startY, endX, endY, startX * camera.tileSize, startY * camera.tileSize)
+
+        # Remove the least recently used chunks when the cache is full
+        chunkSize = chunk.get_width() * chunk.get_height() * 4
+        while len(self.chunks) > 0 and self.chunksSize + chunkSize > Config.MAP_CHUNK_CACHE_SIZE:
+            oldChunk = self.chunks.pop(next(iter(self.chunks)))
+            self.chunksSize -= oldChunk.get_width() * oldChunk.get_height() * 4
+
+        self.chunks[key] = chunk
+        self.chunksSize += chunkSize
+        return chunk
+
+    # Draw a range of map tiles to a surface
+    def draw_tiles(self, surface, camera, startX, startY, endX, endY, offsetX, offsetY):
+        tileScale = camera.tileSize / Config.TILE_SPRITE_SIZE
+
+        # Draw terrain tiles to surface
+        for y in range(startY, endY):
+            for x in range(startX, endX):
                 tileType = terrainTiles[self.blendedTerrain[y][x]]
-                tile = {
-                    'x': math.floor(x * camera.tileSize - (camera.x - surface.get_width() / 2)),
-                    'y': math.floor(y * camera.tileSize - (camera.y - surface.get_height() / 2))
-                }
+                tileX = math.floor(x * camera.tileSize - offsetX)
+                tileY = math.floor(y * camera.tileSize - offsetY)
+
+                if camera.grid:
+                    surface.blit(camera.tilesImage, ( tileX + 1, tileY + 1 ), (
+                        math.floor(tileType['x'] * tileScale) + 1,
+                        math.floor(tileType['y'] * tileScale) + 1,
+                        camera.tileSize - 1,
+                        camera.tileSize - 1
+                    ))
+                else:
+                    surface.blit(camera.tilesImage, ( tileX, tileY ), (
+                        math.floor(tileType['x'] * tileScale),
+                        math.floor(tileType['y'] * tileScale),
+                        camera.tileSize,
+                        camera.tileSize
+                    ))
+
+        # Draw track tiles to surface
+        for y in range(startY, endY):
+            for x in range(startX, endX):
+                trackId = self.blendedTrack[y][x]
+                if trackId != 0:
+                    tileType = trackTiles[trackId]
+                    tileX = math.floor(x * camera.tileSize - offsetX)
+                    tileY = math.floor(y * camera.tileSize - offsetY)
 
-                # Draw tile if visible
-                if (
-                    tile['x'] + camera.tileSize >= 0 and tile['y'] + camera.tileSize >= 0 and
-                    tile['x'] < surface.get_width() and tile['y'] < surface.get_height()
-                ):
                     if camera.grid:
-                        surface.blit(camera.tilesImage, ( tile['x'] + 1, tile['y'] + 1 ), (
-                            math.floor(tileType['x'] * (camera.tileSize / Config.TILE_SPRITE_SIZE)) + 1,
-                            math.floor(tileType['y'] * (camera.tileSize / Config.TILE_SPRITE_SIZE)) + 1,
+                        surface.blit(camera.tilesImage, ( tileX + 1, tileY + 1 ), (
+                            math.floor(tileType['x'] * tileScale) + 1,
+                            math.floor(tileType['y'] * tileScale) + 1,
                             camera.tileSize - 1,
                             camera.tileSize - 1
                         ))
                     else:
-                        surface.blit(camera.tilesImage, ( tile['x'], tile['y'] ), (
-                            math.floor(tileType['x'] * (camera.tileSize / Config.TILE_SPRITE_SIZE)),
-                            math.floor(tileType['y'] * (camera.tileSize / Config.TILE_SPRITE_SIZE)),
+                        surface.blit(camera.tilesImage, ( tileX, tileY ), (
+                            math.floor(tileType['x'] * tileScale),
+                            math.floor(tileType['y'] * tileScale),
                             camera.tileSize,
                             camera.tileSize
                         ))
 
-        # Draw track tiles to surface
-        for y in range(self.height):
-            for x in range(self.width):
-                trackId = self.blendedTrack[y][x]
-                if trackId != 0:
-                    tileType = trackTiles[trackId]
-                    tile = {
-                        'x': math.floor(x * camera.tileSize - (camera.x - surface.get_width() / 2)),
-                        'y': math.floor(y *  camera.tileSize - (camera.y - surface.get_height() / 2))
-                    }
+    # Draw the map
+    def draw(self, surface, camera, useChunks = True):
+        # Tiles smaller than a pixel are not drawn
+        if camera.tileSize <= 0:
+            return
 
-                    # Draw tile if visible
-                    if (
-                        tile['x'] + camera.tileSize >= 0 and tile['y'] + camera.tileSize >= 0 and
-                        tile['x'] < surface.get_width() and tile['y'] < surface.get_height()
-                    ):
-                        if camera.grid:
-                            surface.blit(camera.tilesImage, ( tile['x'] + 1, tile['y'] + 1 ), (
-                                math.floor(tileType['x'] * (camera.tileSize / Config.TILE_SPRITE_SIZE)) + 1,
-                                math.floor(tileType['y'] * (camera.tileSize / Config.TILE_SPRITE_SIZE)) + 1,
-                                camera.tileSize - 1,
-                                camera.tileSize - 1
-                            ))
-                        else:
-                            surface.blit(camera.tilesImage, ( tile['x'], tile['y'] ), (
-                                math.floor(tileType['x'] * (camera.tileSize / Config.TILE_SPRITE_SIZE)),
-                                math.floor(tileType['y'] * (camera.tileSize / Config.TILE_SPRITE_SIZE)),
-                                camera.tileSize,
-                                camera.tileSize
-                            ))
+        offsetX = camera.x - surface.get_width() / 2
+        offsetY = camera.y - surface.get_height() / 2
+
+        # Draw only the visible tiles directly to surface
+        if not useChunks:
+            startX = max(math.floor(offsetX / camera.tileSize), 0)
+            startY = max(math.floor(offsetY / camera.tileSize), 0)
+            endX = min(math.floor((offsetX + surface.get_width()) / camera.tileSize) + 1, self.width)
+            endY = min(math.floor((offsetY + surface.get_height()) / camera.tileSize) + 1, self.height)
+            self.draw_tiles(surface, camera, startX, startY, endX, endY, offsetX, offsetY)
+            return
+
+        # Calculate the visible chunk range
+        chunkSize = Config.MAP_CHUNK_SIZE * camera.tileSize
+        startX = max(math.floor(offsetX / chunkSize), 0)
+        startY = max(math.floor(offsetY / chunkSize), 0)
+        endX = min(math.floor((offsetX + surface.get_width()) / chunkSize), (self.width - 1) // Config.MAP_CHUNK_SIZE)
+        endY = min(math.floor((offsetY + surface.get_height()) / chunkSize), (self.height - 1) // Config.MAP_CHUNK_SIZE)
+
+        # Only draw the visible pre-rendered chunks to surface
+        for chunkY in range(startY, endY + 1):
+            for chunkX in range(startX, endX + 1):
+                surface.blit(self.get_chunk(chunkX, chunkY, camera), (
+                    math.floor(chunkX * chunkSize - offsetX),
+                    math.floor(chunkY * chunkSize - offsetY)
+                ))
+
+# The map catalogue class, lists maps by their metadata and only loads the full maps that are needed
+class MapCatalogue:
+    # The metadata index is cached next to the settings file
+    INDEX_PATH = '~/bassieracing-maps.json'
+    INDEX_TYPE = 'BassieRacing Map Index'
+
+    # The paths of the maps that were loaded once, all catalogues only show the message about a different game version of a map
+    # the first time it is loaded because the maps are loaded again every time they scroll into view
+    versionMessageMapPaths = set()
+
+    # Create map catalogue from a list of map file paths
+    def __init__(self, mapPaths):
+        self.maps = []
+        self.loadedMaps = {}
+
+        # Load the metadata index
+        index = {}
+        if os.path.isfile(os.path.expanduser(MapCatalogue.INDEX_PATH)):
+            try:
+                with open(os.path.expanduser(MapCatalogue.INDEX_PATH), 'r') as file:
+                    data = json.load(file)
+                if data['type'] == MapCatalogue.INDEX_TYPE and data['version'] == Config.VERSION:
+                    index = data['maps']
+            except:
+                pass
+
+        # Read the metadata of new and changed map files, the others come from the index
+        changed = len(index) != len(mapPaths)
+        for mapPath in mapPaths:
+            if mapPath in index and self.is_fresh(index[mapPath]):
+                self.maps.append(index[mapPath])
+            else:
+                changed = True
+                metadata = self.read_metadata(mapPath)
+                if metadata != None:
+                    self.maps.append(metadata)
+
+        if changed:
+            self.save_index()
+
+    # List the paths of the default maps and the custom maps of the settings, removes the custom maps that are deleted
+    @staticmethod
+    def list_map_paths(settings):
+        mapPaths = [ os.path.abspath('assets/maps/' + filename) for filename in os.listdir('assets/maps/') if os.path.isfile('assets/maps/' + filename) ]
+        for customMapPath in settings['custom-maps']:
+            customMapPath = os.path.abspath(customMapPath)
+            if customMapPath not in mapPaths:
+                if os.path.isfile(customMapPath):
+                    mapPaths.append(customMapPath)
+                else:
+                    settings['custom-maps'].remove(customMapPath)
+        return mapPaths
+
+    # Find the catalogue entry of a map by its id
+    def find_map(self, mapId):
+        for metadata in self.maps:
+            if metadata['id'] == mapId:
+                return metadata
+
+    # Check if the metadata of a map file is still valid by comparing the modified time and size of the file
+    def is_fresh(self, metadata):
+        try:
+            stat = os.stat(metadata['path'])
+        except OSError:
+            return False
+        return stat.st_mtime_ns == metadata['mtime'] and stat.st_size == metadata['size']
+
+    # Read the metadata of a map file
+    def read_metadata(self, mapPath):
+        try:
+            stat = os.stat(mapPath)
+        except OSError:
+            return
+        metadata = Map.load_metadata_from_file(mapPath)
+        if metadata != None:
+            metadata['path'] = mapPath
+            metadata['mtime'] = stat.st_mtime_ns
+            metadata['size'] = stat.st_size
+        return metadata
+
+    # Save the metadata index
+    def save_index(self):
+        try:
+            with open(os.path.expanduser(MapCatalogue.INDEX_PATH), 'w') as file:
+                file.write(json.dumps({
+                    'type': MapCatalogue.INDEX_TYPE,
+                    'version': Config.VERSION,
+                    'maps': { metadata['path']: metadata for metadata in self.maps }
+                }, separators=(',', ':')) + '\n')
+        except OSError:
+            pass
+
+    # Add an already loaded map to the catalogue
+    def add_map(self, mapPath, map):
+        metadata = self.read_metadata(mapPath)
+        if metadata != None:
+            self.maps.append(metadata)
+            self.loadedMaps[mapPath] = map
+            self.save_index()
+        return metadata
+
+    # Remove a map from the catalogue
+    def remove_map(self, metadata):
+        self.maps.remove(metadata)
+        self.loadedMaps.pop(metadata['path'], None)
+
+    # Get the full map of a catalogue entry, loads the map file when it is not loaded yet
+    def load_map(self, metadata):
+        if metadata['path'] not in self.loadedMaps:
+            map = Map.load_from_file(metadata['path'], metadata['path'] not in MapCatalogue.versionMessageMapPaths)
+            MapCatalogue.versionMessageMapPaths.add(metadata['path'])
+            if map == None:
+                return
+            self.loadedMaps[metadata['path']] = map
+        return self.loadedMaps[metadata['path']]
+
+    # Unload all full maps except the given ones
+    def keep_maps(self, maps):
+        self.loadedMaps = { mapPath: map for mapPath, map in self.loadedMaps.items() if map in maps }
+
+# The map cache class, keeps the binary maps of the multiplayer hosts in a directory with their content hash as file name
+class MapCache:
+    # Create map cache
+    def __init__(self, cachePath):
+        self.cachePath = os.path.expanduser(cachePath)
+
+    # Get the file path of a cached map
+    def get_file_path(self, mapHash):
+        return os.path.join(self.cachePath, mapHash.hex() + Map.BINARY_EXTENSION)
+
+    # Find the map with the id and content hash in the map catalogue or in the cache, returns None when there is none
+    def find_map(self, catalogue, mapId, mapHash):
+        metadata = catalogue.find_map(mapId)
+        if metadata != None:
+            map = catalogue.load_map(metadata)
+            if map != None and map.get_binary_hash() == mapHash:
+                return map
+
+        try:
+            with open(self.get_file_path(mapHash), 'rb') as file:
+                data = file.read()
+        except OSError:
+            return
+        if hashlib.sha1(data).digest() == mapHash:
+            return Map.load_from_binary(bytearray(data))
+
+    # Put the binary map data of a host in the cache and load it, the file is replaced at once so it is never half written
+    def put_map(self, mapHash, data):
+        try:
+            os.makedirs(self.cachePath, exist_ok=True)
+            with open(self.get_file_path(mapHash) + '.tmp', 'wb') as file:
+                file.write(data)
+            os.replace(self.get_file_path(mapHash) + '.tmp', self.get_file_path(mapHash))
+        except OSError:
+            pass
+        return Map.load_from_binary(bytearray(data))
+
+# The map cache that is shared by the multiplayer clients
+mapCache = MapCache(Config.MAP_CACHE_PATH)
+
+# The blend tables that map a tile type and neighbour mask to a blended tile
+terrainBlendTable = [ [ Map.blend_terrain_mask(terrainType, mask) for mask in range(256) ] for terrainType in range(3) ]
+trackBlendTable = [ [ Map.blend_track_mask(trackType, mask) for mask in range(256) ] for trackType in range(4) ]
@@ -2,11 +2,12 @@
 
 # Import modules
 from constants import *
+from dialogs import *
 import math
+from network import *
 from objects import *
 import os
 import random
-import tkinter.filedialog
 from utils import *
 import webbrowser
 from widgets import *
@@ -117,7 +118,20 @@ class MenuPage(Page):
 
         # Start music if enabled in settings
         if game.settings['music']['enabled'] and not pygame.mixer.music.get_busy():
-            pygame.mixer.music.play(0, game.settings['music']['position'])
+            game.play_music()
+
+    # Handle menu page events
+    def handle_event(self, event):
+        if Page.handle_event(self, event):
+            return True
+
+        # When the new version check is done show the new version label
+        if event.type == pygame.USEREVENT + 3:
+            self.widgets = []
+            self.topWidgets = []
+            self.create_widgets()
+
+        return False
 
     # Create menu page widgets
     def create_widgets(self):
@@ -211,6 +225,7 @@ class PlayPage(Page):
 class MultiplayerPage(Page):
     # Create multiplayer page
     def __init__(self, game):
+        self.hostListener = HostListener()
         Page.__init__(self, game)
 
     # Create multiplayer page widgets
@@ -221,20 +236,48 @@ class MultiplayerPage(Page):
         self.widgets.append(Button(self.game, 'Host a game', self.game.width // 6, y, self.game.width // 3 - 8, 64, self.game.textFont, Color.BLACK, Color.WHITE, self.host_button_clicked))
         self.widgets.append(Button(self.game, 'Direct connect', self.game.width // 6 + (self.game.width // 3 - 8) + 16, y, (self.game.width // 3 - 8), 64, self.game.textFont, Color.BLACK, Color.WHITE, self.direct_connect_button_clicked))
         y += 64 + 24
-        self.widgets.append(Label(self.game, 'Hosted games in your network will appear here', 0, y, self.game.width, 320, self.game.textFont, Color.WHITE))
+
+        # Show the hosted games that are found in the network
+        hosts = list(self.hostListener.hosts.values())[:4]
+        if len(hosts) == 0:
+            self.widgets.append(Label(self.game, 'Hosted games in your network will appear here', 0, y, self.game.width, 320, self.game.textFont, Color.WHITE))
+        for i, host in enumerate(hosts):
+            self.widgets.append(Button(self.game, '%s - %s (%d/%d)' % (host['name'], host['map-name'], host['players'], Config.MULTIPLAYER_MAX_CLIENTS + 1),
+                self.game.width // 6, y + i * (64 + 16), self.game.width // 3 * 2, 64, self.game.textFont, Color.BLACK, Color.WHITE, self.hosted_game_button_clicked, host))
         y += 320 + 24
+
         self.widgets.append(Button(self.game, 'Back', self.game.width // 4, y, self.game.width // 2, 64, self.game.textFont, Color.BLACK, Color.WHITE, self.back_button_clicked))
 
+    # Update multiplayer page
+    def update(self, delta):
+        # Listen for hosted games and show the changes
+        self.hostListener.update(self.game.time)
+        if self.hostListener.changed:
+            self.hostListener.changed = False
+            self.widgets = []
+            self.topWidgets = []
+            self.create_widgets()
+
     # Host button clicked
     def host_button_clicked(self):
+        self.hostListener.close()
         self.game.page = SelectMapPage(self.game, GameMode.MULTIPLAYER)
 
     # Direct connect button clicked
     def direct_connect_button_clicked(self):
+        self.hostListener.close()
         self.game.page = DirectConnectPage(self.game)
 
+    # Hosted game button clicked
+    def hosted_game_button_clicked(self, host):
+        self.hostListener.close()
+        network = NetworkClient(host['address'], self.game.settings['account']['username'], self.game.settings['selected']['left']['vehicle-id'],
+            self.game.settings['selected']['left']['vehicle-color'], host['port'])
+        self.game.page = LobbyPage(self.game, GameMode.MULTIPLAYER, None, network)
+
     # Back button clicked
     def back_button_clicked(self):
+        self.hostListener.close()
         self.game.page = PlayPage(self.game)
 
 # The direct connect page class
@@ -265,29 +308,142 @@ class DirectConnectPage(Page):
 
     # Connect button clicked
     def connect_button_clicked(self):
-        pass
+        # The address can end with a port
+        address = self.game.settings['multiplayer']['last-address'].strip()
+        port = Config.MULTIPLAYER_PORT
+        if ':' in address:
+            address, port = address.rsplit(':', 1)
+            if not port.isdigit():
+                return
+            port = int(port)
+        if address == '':
+            return
+
+        network = NetworkClient(address, self.game.settings['account']['username'], self.game.settings['selected']['left']['vehicle-id'],
+            self.game.settings['selected']['left']['vehicle-color'], port)
+        self.game.page = LobbyPage(self.game, GameMode.MULTIPLAYER, None, network)
 
 # The lobby page class
 class LobbyPage(Page):
-    # Create lobby page
-    def __init__(self, game, gamemode, map):
+    # Create lobby page, the host knows the map and the client finds it or gets it from the host when the host welcomes it
+    def __init__(self, game, gamemode, map, network):
         self.gamemode = gamemode
         self.map = map
+        self.network = network
+        self.players = []
         Page.__init__(self, game)
 
     # Create lobby page widgets
     def create_widgets(self):
         self.widgets.append(Label(self.game, 'Game Lobby', 0, 24, self.game.width, 72, self.game.titleFont, Color.WHITE))
+        y = 24 + 72 + 24
+        if self.map != None:
+            self.widgets.append(Label(self.game, 'Map: ' + self.map.name, 0, y, self.game.width, 48, self.game.textFont, Color.WHITE))
+        elif self.network.mapTransfer != None:
+            self.widgets.append(Label(self.game, 'Downloading the map of the host...', 0, y, self.game.width, 48, self.game.textFont, Color.WHITE))
+        else:
+            self.widgets.append(Label(self.game, 'Joining the game...', 0, y, self.game.width, 48, self.game.textFont, Color.WHITE))
+        y += 48 + 24
+
+        # The host shows the players and the client waits for the host
+        if isinstance(self.network, NetworkHost):
+            self.widgets.append(Label(self.game, self.game.settings['account']['username'] + ' (host)', 0, y, self.game.width, 48, self.game.textFont, Color.WHITE))
+            y += 48 + 16
+            for client in self.network.clients.values():
+                self.widgets.append(Label(self.game, client['name'] + ('' if client['ready'] else ' (downloading the map)'), 0, y, self.game.width, 48, self.game.textFont, Color.WHITE))
+                y += 48 + 16
+            if len(self.network.clients) == 0:
+                self.widgets.append(Label(self.game, 'Waiting for a player to join...', 0, y, self.game.width, 48, self.game.textFont, Color.LIGHT_GRAY))
+        elif self.map != None:
+            self.widgets.append(Label(self.game, 'Waiting for the host to start the race...', 0, y, self.game.width, 48, self.game.textFont, Color.LIGHT_GRAY))
+
         self.widgets.append(Button(self.game, 'Close', 16, self.game.height - 64 - 16, 240, 64, self.game.textFont, Color.BLACK, Color.WHITE, self.close_button_clicked))
-        self.widgets.append(Button(self.game, 'Race!', self.game.width - 16 - 240, self.game.height - 64 - 16, 240, 64, self.game.textFont, Color.BLACK, Color.WHITE, self.race_button_clicked))
+        if isinstance(self.network, NetworkHost):
+            self.widgets.append(Button(self.game, 'Race!', self.game.width - 16 - 240, self.game.height - 64 - 16, 240, 64, self.game.textFont, Color.BLACK, Color.WHITE, self.race_button_clicked))
+
+    # Update lobby page
+    def update(self, delta):
+        self.network.update(self.game.time)
+
+        # The host shows the players that join, leave and get the map
+        if isinstance(self.network, NetworkHost):
+            players = [ ( client['name'], client['ready'] ) for client in self.network.clients.values() ]
+            if players != self.players:
+                self.players = players
+                self.widgets = []
+                self.topWidgets = []
+                self.create_widgets()
+            return
+
+        if self.network.closed:
+            self.network.close()
+            dialogs.show_message('Can\'t join the game', 'The host can\'t be reached or the game is full')
+            self.game.focus()
+            self.game.page = MultiplayerPage(self.game)
+            return
+
+        # Find the map of the host in the maps and the map cache when the client is welcomed, or else get it from the host
+        if self.map == None and self.network.mapHash != None and self.network.mapTransfer == None:
+            catalogue = MapCatalogue(MapCatalogue.list_map_paths(self.game.settings))
+            self.map = mapCache.find_map(catalogue, self.network.mapId, self.network.mapHash)
+            if self.map != None:
+                self.network.set_ready()
+            else:
+                self.network.request_map()
+            self.widgets = []
+            self.topWidgets = []
+            self.create_widgets()
+
+        # Cache the map of the host when it is received
+        if self.map == None and self.network.mapTransfer != None:
+            if self.network.mapTransfer.data != None:
+                self.map = mapCache.put_map(self.network.mapHash, self.network.mapTransfer.data)
+            if self.network.mapTransfer.failed or (self.network.mapTransfer.data != None and self.map == None):
+                self.network.close()
+                dialogs.show_message('Can\'t join the game', 'The map of the host is corrupt')
+                self.game.focus()
+                self.game.page = MultiplayerPage(self.game)
+                return
+            if self.map != None:
+                self.network.set_ready()
+                self.widgets = []
+                self.topWidgets = []
+                self.create_widgets()
+
+        # Start the race when the host starts it
+        if self.map != None and self.network.vehicleData != None:
+            self.game.page = GamePage(self.game, self.gamemode, self.map, [
+                {
+                    'type': vehicles[vehicleTypeId],
+                    'color': color
+                }
+                for vehicleTypeId, color in self.network.vehicleData
+            ], self.network)
 
     # Close button clicked
     def close_button_clicked(self):
+        self.network.close()
         self.game.page = MultiplayerPage(self.game)
 
-    # Race button clicked
+    # Race button clicked, the race starts when the client has the map
     def race_button_clicked(self):
-        pass
+        if len(self.network.clients) == 0 or not self.network.get_client(VehicleId.RIGHT)['ready']:
+            return
+
+        # The host drives the left vehicle and the client the right vehicle
+        client = self.network.get_client(VehicleId.RIGHT)
+        vehicleData = [
+            ( self.game.settings['selected']['left']['vehicle-id'], self.game.settings['selected']['left']['vehicle-color'] ),
+            ( client['vehicle-type-id'], client['color'] )
+        ]
+        self.network.start(vehicleData)
+        self.game.page = GamePage(self.game, self.gamemode, self.map, [
+            {
+                'type': vehicles[vehicleTypeId],
+                'color': color
+            }
+            for vehicleTypeId, color in vehicleData
+        ], self.network)
 
 # The select map page class
 class SelectMapPage(Page):
@@ -318,15 +474,25 @@ class SelectMapPage(Page):
 
     # Load button clicked
     def load_button_clicked(self):
-        file_path = tkinter.filedialog.askopenfilename(title='Select a BassieRacing Map to load...', filetypes=[ ( 'JSON files', '*.json' ) ])
+        file_path = dialogs.ask_open_file('Select a BassieRacing Map to load...', [ ( 'JSON files', '*.json' ), ( 'Binary map files', '*' + Map.BINARY_EXTENSION ) ])
         if file_path:
             self.game.focus()
             self.mapSelector.load_map(file_path)
 
     # Continue button clicked
     def continue_button_clicked(self):
+        if self.mapSelector.selectedMap == None:
+            return
+
         if self.gamemode == GameMode.MULTIPLAYER:
-            self.game.page = LobbyPage(self.game, self.gamemode, self.mapSelector.selectedMap)
+            try:
+                network = NetworkHost(self.game.settings['account']['username'], self.mapSelector.selectedMap.id, self.mapSelector.selectedMap.name,
+                    self.mapSelector.selectedMap.save_to_binary())
+            except OSError as exception:
+                dialogs.show_message('Can\'t host the game', 'The multiplayer port %d can\'t be used: %s' % (Config.MULTIPLAYER_PORT, exception))
+                self.game.focus()
+                return
+            self.game.page = LobbyPage(self.game, self.gamemode, self.mapSelector.selectedMap, network)
         else:
             self.game.page = SelectVehiclePage(self.game, self.gamemode, self.mapSelector.selectedMap)
 
@@ -392,47 +558,29 @@ class SelectVehiclePage(Page):
 
 # The game page class
 class GamePage(Page):
-    # Create game page
-    def __init__(self, game, gamemode, map, vehicleData):
+    # Create game page, multiplayer games get the network host or client of the lobby
+    def __init__(self, game, gamemode, map, vehicleData, network = None):
         self.gamemode = gamemode
         self.map = map
+        self.network = network
 
-        # Create the vehicles
+        # Create the vehicles next to the finish
         self.vehicles = []
+        self.vehicleGrid = VehicleGrid()
 
-        # Check if finish is horizontal
-        if map.finish['height'] > map.finish['width']:
-            self.leftVehicle = Vehicle(game, VehicleId.LEFT, vehicleData[0]['type'], vehicleData[0]['color'], map, self.vehicles,
-                (map.finish['x'] - 1) * Config.TILE_SPRITE_SIZE + Config.TILE_SPRITE_SIZE / 2,
-                (map.finish['y'] + map.finish['height'] // 2 - 1) * Config.TILE_SPRITE_SIZE + Config.TILE_SPRITE_SIZE / 2,
-                math.radians(270)
-            )
-            self.vehicles.append(self.leftVehicle)
+        self.leftVehicle = Vehicle(game, VehicleId.LEFT, vehicleData[0]['type'], vehicleData[0]['color'], map, self.vehicles, *map.get_start_position(VehicleId.LEFT), self.vehicleGrid)
+        self.vehicles.append(self.leftVehicle)
 
-            if gamemode == GameMode.SPLIT_SCREEN:
-                self.rightVehicle = Vehicle(game, VehicleId.RIGHT, vehicleData[1]['type'], vehicleData[1]['color'], map, self.vehicles,
-                    (map.finish['x'] - 1)  * Config.TILE_SPRITE_SIZE + Config.TILE_SPRITE_SIZE / 2,
-                    (map.finish['y'] + map.finish['height'] // 2)  * Config.TILE_SPRITE_SIZE + Config.TILE_SPRITE_SIZE / 2,
-                    math.radians(270)
-                )
-                self.vehicles.append(self.rightVehicle)
+        if gamemode == GameMode.SPLIT_SCREEN or gamemode == GameMode.MULTIPLAYER:
+            self.rightVehicle = Vehicle(game, VehicleId.RIGHT, vehicleData[1]['type'], vehicleData[1]['color'], map, self.vehicles, *map.get_start_position(VehicleId.RIGHT), self.vehicleGrid)
+            self.vehicles.append(self.rightVehicle)
 
-        # Or when the finish is vertical
-        else:
-            self.leftVehicle = Vehicle(game, VehicleId.LEFT, vehicleData[0]['type'], vehicleData[0]['color'], map, self.vehicles,
-                (map.finish['x'] + map.finish['width'] // 2 - 1) * Config.TILE_SPRITE_SIZE + Config.TILE_SPRITE_SIZE / 2,
-                (map.finish['y'] + map.finish['height']) * Config.TILE_SPRITE_SIZE + Config.TILE_SPRITE_SIZE / 2,
-                0
-            )
-            self.vehicles.append(self.leftVehicle)
-
-            if gamemode == GameMode.SPLIT_SCREEN:
-                self.rightVehicle = Vehicle(game, VehicleId.RIGHT, vehicleData[1]['type'], vehicleData[1]['color'], map, self.vehicles,
-                    (map.finish['x'] + map.finish['width'] // 2)  * Config.TILE_SPRITE_SIZE + Config.TILE_SPRITE_SIZE / 2,
-                    (map.finish['y'] + map.finish['height'])  * Config.TILE_SPRITE_SIZE + Config.TILE_SPRITE_SIZE / 2,
-                    0
-                )
-                self.vehicles.append(self.rightVehicle)
+        # In multiplayer the host drives the left vehicle and the client the vehicle that the host gave it
+        if gamemode == GameMode.MULTIPLAYER:
+            if isinstance(network, NetworkHost):
+                self.ownVehicle = self.leftVehicle
+            else:
+                self.ownVehicle = self.vehicles[network.vehicleId]
 
         # Create page
         Page.__init__(self, game, Color.BLACK)
@@ -457,21 +605,35 @@ class GamePage(Page):
             self.widgets.append(Rect(self.game, (self.game.width - minimap_size) // 2 - 2, 8, minimap_size + 4, minimap_size + 4, Color.BLACK))
             self.widgets.append(MiniMap(self.game, self.map, self.vehicles, (self.game.width - minimap_size) // 2, 10, minimap_size, minimap_size))
 
+        if self.gamemode == GameMode.MULTIPLAYER:
+            self.ownVehicleViewport = VehicleViewport(self.game, self.gamemode, self.ownVehicle, 0, 0, self.game.width, self.game.height, self.map, self.vehicles)
+            self.widgets.append(self.ownVehicleViewport)
+
+            self.widgets.append(Rect(self.game, self.game.width - minimap_size - 12, self.game.height - minimap_size - 12, minimap_size + 4, minimap_size + 4, Color.BLACK))
+            self.widgets.append(MiniMap(self.game, self.map, self.vehicles, self.game.width - minimap_size - 10, self.game.height - minimap_size - 10, minimap_size, minimap_size))
+
         self.widgets.append(Button(self.game, 'Back', self.game.width - 16 - 128, 16, 128, 64, self.game.textFont, Color.BLACK, Color.WHITE, self.back_button_clicked))
 
     # Back button clicked
     def back_button_clicked(self):
-        self.game.page = PlayPage(self.game)
+        if self.gamemode == GameMode.MULTIPLAYER:
+            self.network.close()
+            self.game.page = MultiplayerPage(self.game)
+        else:
+            self.game.page = PlayPage(self.game)
 
     # Update game page
     def update(self, delta):
         # Update vehicle viewports
-        self.leftVehicleViewport.update(delta)
+        if self.gamemode == GameMode.MULTIPLAYER:
+            self.ownVehicleViewport.update(delta)
+        else:
+            self.leftVehicleViewport.update(delta)
         if self.gamemode == GameMode.SPLIT_SCREEN:
             self.rightVehicleViewport.update(delta)
 
         # When countdown is over start vehicle
-        if not self.leftVehicle.started and self.leftVehicleViewport.countdownClock.ended:
+        if self.gamemode != GameMode.MULTIPLAYER and not self.leftVehicle.started and self.leftVehicleViewport.countdownClock.ended:
             self.leftVehicle.started = True
             self.leftVehicle.startTime = self.game.time
 
@@ -479,12 +641,47 @@ class GamePage(Page):
             self.rightVehicle.started = True
             self.rightVehicle.startTime = self.game.time
 
-        # Update all the vehicles
+        # In multiplayer the host starts all vehicles when its countdown is over
+        if (
+            self.gamemode == GameMode.MULTIPLAYER and isinstance(self.network, NetworkHost) and
+            not self.leftVehicle.started and self.ownVehicleViewport.countdownClock.ended
+        ):
+            for vehicle in self.vehicles:
+                vehicle.started = True
+                vehicle.startTime = self.game.time
+
+        # Update all the vehicles, the multiplayer client moves its own vehicle right away with its inputs
+        # and corrects it with the states of the host, the other vehicle is drawn between the states of the host
+        if self.gamemode == GameMode.MULTIPLAYER and isinstance(self.network, NetworkClient):
+            for vehicle in self.vehicles:
+                vehicle.previousX = vehicle.x
+                vehicle.previousY = vehicle.y
+                vehicle.previousAngle = vehicle.angle
+            self.network.predict(self.ownVehicle)
+            self.network.update(self.game.time)
+            self.network.apply_state(self.vehicles)
+            self.network.interpolate_vehicles(self.vehicles, delta)
+
+        # The multiplayer host moves the vehicle of the client one update step for every input that it received, then it sends the vehicle states
+        elif self.gamemode == GameMode.MULTIPLAYER:
+            self.network.update_race(self.game.time, self.vehicles, delta)
+        else:
+            for vehicle in self.vehicles:
+                vehicle.update(delta)
+
+        # Play the sound effects of the vehicle events
         for vehicle in self.vehicles:
-            if vehicle.id == VehicleId.LEFT:
-                vehicle.update(delta, self.leftVehicleViewport.camera)
-            if vehicle.id == VehicleId.RIGHT:
-                vehicle.update(delta, self.rightVehicleViewport.camera)
+            if self.game.settings['sound-effects']['enabled']:
+                for event in vehicle.events:
+                    if event == Vehicle.CHECKPOINT_EVENT:
+                        self.game.checkpointSound.play()
+                    if event == Vehicle.LAP_EVENT:
+                        self.game.lapSound.play()
+                    if event == Vehicle.FINISH_EVENT:
+                        self.game.finishSound.play()
+                    if event == Vehicle.CRASH_EVENT:
+                        self.game.crashSound.play()
+            vehicle.events = []
 
         # When both vehicles are finished go to the stats page
         if self.gamemode == GameMode.SINGLE_PLAYER and self.leftVehicle.finished:
@@ -492,6 +689,21 @@ class GamePage(Page):
         if self.gamemode == GameMode.SPLIT_SCREEN and self.leftVehicle.finished and self.rightVehicle.finished:
             self.game.page = StatsPage(self.game, self.gamemode, self.map, self.vehicles)
 
+        # In multiplayer the host sends the last vehicle states before it leaves
+        if self.gamemode == GameMode.MULTIPLAYER:
+            if self.leftVehicle.finished and self.rightVehicle.finished:
+                if isinstance(self.network, NetworkHost):
+                    self.network.send_state(self.game.time, self.vehicles)
+                self.network.close()
+                self.game.page = StatsPage(self.game, self.gamemode, self.map, self.vehicles)
+
+            # Stop the race when the other player left
+            elif (isinstance(self.network, NetworkHost) and len(self.network.clients) == 0) or (isinstance(self.network, NetworkClient) and self.network.closed):
+                self.network.close()
+                dialogs.show_message('Multiplayer', 'The other player left the race')
+                self.game.focus()
+                self.game.page = MultiplayerPage(self.game)
+
 # The stats page class
 class StatsPage(Page):
     # Create stats page
@@ -503,7 +715,7 @@ class StatsPage(Page):
         # Calculate fastest time
         if gamemode == GameMode.SINGLE_PLAYER:
             fastestTime = vehicles[VehicleId.LEFT].finishTime - vehicles[VehicleId.LEFT].startTime
-        if gamemode == GameMode.SPLIT_SCREEN:
+        if gamemode == GameMode.SPLIT_SCREEN or gamemode == GameMode.MULTIPLAYER:
             fastestTime = min(
                 vehicles[VehicleId.LEFT].finishTime - vehicles[VehicleId.LEFT].startTime,
                 vehicles[VehicleId.RIGHT].finishTime - vehicles[VehicleId.RIGHT].startTime
@@ -573,8 +785,8 @@ class StatsPage(Page):
                     y += 48 + 16
             y += 16
 
-        # Create stats for the split screen gamemode
-        if self.gamemode == GameMode.SPLIT_SCREEN:
+        # Create stats for the split screen and multiplayer gamemodes
+        if self.gamemode == GameMode.SPLIT_SCREEN or self.gamemode == GameMode.MULTIPLAYER:
             if self.vehicles[VehicleId.LEFT].finishTime - self.vehicles[VehicleId.LEFT].startTime < self.vehicles[VehicleId.RIGHT].finishTime - self.vehicles[VehicleId.RIGHT].startTime:
                 # Create vehicle image
                 vehicleImageSurface = self.game.vehiclesImage.subsurface((
@@ -586,7 +798,7 @@ class StatsPage(Page):
                 self.widgets.append(Image(self.game, vehicleImageSurface, self.game.width // 4, y, self.game.width // 2, 128))
                 y += 128 + 16
 
-                self.widgets.append(Label(self.game, 'Left player wins!', self.game.width // 4, y, self.game.width // 2, 48, self.game.textFont, Color.WHITE))
+                self.widgets.append(Label(self.game, 'Host wins!' if self.gamemode == GameMode.MULTIPLAYER else 'Left player wins!', self.game.width // 4, y, self.game.width // 2, 48, self.game.textFont, Color.WHITE))
                 y += 48 + 16
             else:
                 # Create vehicle image
@@ -599,7 +811,7 @@ class StatsPage(Page):
                 self.widgets.append(Image(self.game, vehicleImageSurface, self.game.width // 4, y, self.game.width // 2, 128))
                 y += 128 + 16
 
-                self.widgets.append(Label(self.game, 'Right player wins!', self.game.width // 4, y, self.game.width // 2, 64, self.game.textFont, Color.WHITE))
+                self.widgets.append(Label(self.game, 'Guest wins!' if self.gamemode == GameMode.MULTIPLAYER else 'Right player wins!', self.game.width // 4, y, self.game.width // 2, 64, self.game.textFont, Color.WHITE))
                 y += 64 + 16
 
             self.widgets.append(Label(self.game, 'Total: %s %s' % (formatTime(self.vehicles[VehicleId.LEFT].finishTime - self.vehicles[VehicleId.LEFT].startTime), formatTime(self.vehicles[VehicleId.RIGHT].finishTime - self.vehicles[VehicleId.RIGHT].startTime)), self.game.width // 4, y, self.game.width // 2, 48, self.game.textFont, Color.WHITE))
@@ -708,7 +920,7 @@ class EditorPage(Page):
 
     # Open button clicked
     def open_button_clicked(self):
-        file_path = tkinter.filedialog.askopenfilename(title='Select a BassieRacing Map to open...', filetypes=[ ( 'JSON files', '*.json' ) ])
+        file_path = dialogs.ask_open_file('Select a BassieRacing Map to open...', [ ( 'JSON files', '*.json' ), ( 'Binary map files', '*' + Map.BINARY_EXTENSION ) ])
         if file_path:
             self.game.settings['map-editor']['last-path'] = file_path
 
@@ -723,7 +935,7 @@ class EditorPage(Page):
     # Save button clicked
     def save_button_clicked(self):
         if self.game.settings['map-editor']['last-path'] == None:
-            file_path = tkinter.filedialog.asksaveasfilename(title='Select a location to save the BassieRacing Map...', filetypes=[ ( 'JSON files', '*.json' ) ], defaultextension='.json')
+            file_path = dialogs.ask_save_file('Select a location to save the BassieRacing Map...', [ ( 'JSON files', '*.json' ), ( 'Binary map files', '*' + Map.BINARY_EXTENSION ) ], '.json')
             if file_path:
                 self.game.settings['map-editor']['last-path'] = file_path
 
@@ -933,7 +1145,7 @@ class SettingsPage(Page):
 
         if active:
             if not pygame.mixer.music.get_busy():
-                pygame.mixer.music.play(0, self.game.settings['music']['position'])
+                self.game.play_music()
             else:
                 pygame.mixer.music.unpause()
         else:
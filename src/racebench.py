@@ -0,0 +1,140 @@
+# BassieRacing - Race benchmark
+# Measures the vehicle updates of headless races with many vehicles that start in their own slots behind the finish,
+# path drivers drive the vehicles once and their inputs are replayed in every run, so every run gets the same inputs
+# The batch mode compares the update loop of the vehicles with the numpy vehicle batch, with the crashes off and on
+# The grid mode compares the crash checks against all vehicles with the crash checks against the vehicle grid
+# Usage: python src/racebench.py batch map.json [seconds]
+#        python src/racebench.py grid map.json [seconds]
+
+# Hide pygame support message
+import os
+os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = 'hide'
+
+# Import modules
+from constants import *
+from objects import *
+from simulation import *
+from stats import *
+import sys
+import time
+
+# The vehicle counts of the races
+VEHICLE_COUNTS = [ 2, 8, 32, 128 ]
+
+# The recording driver class, remembers the inputs that a driver gives every step
+class RecordingDriver:
+    def __init__(self, driver):
+        self.driver = driver
+        self.inputs = []
+
+    def __call__(self, simulation, vehicle):
+        inputs = self.driver(simulation, vehicle)
+        self.inputs.append(inputs)
+        return inputs
+
+# The replay driver class, gives the recorded inputs of every step again
+class ReplayDriver:
+    def __init__(self, inputs):
+        self.inputs = inputs
+
+    def __call__(self, simulation, vehicle):
+        return self.inputs[min(simulation.steps, len(self.inputs) - 1)]
+
+# Get the vehicle data of a race, the vehicle types take turns
+def createVehicleData(count):
+    return [ { 'type': vehicles[i % len(vehicles)], 'color': i % 5 } for i in range(count) ]
+
+# Let path drivers drive a race and return the inputs of every vehicle
+def recordInputs(map, count, steps):
+    driver = PathDriver(map)
+    drivers = [ RecordingDriver(driver) for i in range(count) ]
+    simulation = Simulation(map, createVehicleData(count), drivers)
+    for i in range(steps):
+        simulation.step()
+    return [ driver.inputs for driver in drivers ]
+
+# Replay the inputs of a race and return the duration of a step in microseconds and the simulation,
+# without the vehicle grid the vehicles check the whole vehicles list for crashes
+def replayRace(map, inputs, steps, batched, useGrid = True):
+    simulation = Simulation(map, createVehicleData(len(inputs)), [ ReplayDriver(vehicleInputs) for vehicleInputs in inputs ], batched=batched)
+    if not useGrid:
+        simulation.vehicleGrid = None
+        for vehicle in simulation.vehicles:
+            vehicle.vehicleGrid = None
+    startTime = time.perf_counter()
+    for i in range(steps):
+        simulation.step()
+    return ( (time.perf_counter() - startTime) / steps * 1e6, simulation )
+
+# Get the largest position difference between the vehicles of two simulations
+def getMaxDifference(simulation, otherSimulation):
+    return max(max(abs(vehicle.x - otherVehicle.x), abs(vehicle.y - otherVehicle.y))
+        for vehicle, otherVehicle in zip(simulation.vehicles, otherSimulation.vehicles))
+
+# Count the events of a type of a simulation
+def countEvents(simulation, event):
+    return sum(1 for time, vehicleId, otherEvent in simulation.events if otherEvent == event)
+
+# Compare the update loop with the vehicle batch, with the crashes off the batch must give the same states and events
+def batchBenchmark(mapPath, seconds):
+    if numpy == None:
+        print('The vehicle batch needs numpy')
+        return
+    map = Map.load_from_file(mapPath)
+    if map == None:
+        return
+    steps = round(seconds * Config.UPDATES_PER_SECOND)
+    crashesEnabled = map.crashes['enabled']
+
+    print('%s, %d steps, us per step' % (map.name, steps))
+    for crashes in ( False, True ):
+        map.crashes['enabled'] = crashes
+        for count in VEHICLE_COUNTS:
+            inputs = recordInputs(map, count, steps)
+            loopTime, loopSimulation = replayRace(map, inputs, steps, False)
+            batchTime, batchSimulation = replayRace(map, inputs, steps, True)
+            print('crashes %-3s %4d vehicles: update loop %7.1f, batch %7.1f (%.1fx), same states %-3s same events %-3s max difference %.3g px, checkpoints %d/%d, crashes %d/%d' % (
+                'on' if crashes else 'off', count, loopTime, batchTime, loopTime / batchTime,
+                'yes' if loopSimulation.get_state() == batchSimulation.get_state() else 'no',
+                'yes' if loopSimulation.events == batchSimulation.events else 'no',
+                getMaxDifference(loopSimulation, batchSimulation),
+                countEvents(loopSimulation, Vehicle.CHECKPOINT_EVENT), countEvents(batchSimulation, Vehicle.CHECKPOINT_EVENT),
+                countEvents(loopSimulation, Vehicle.CRASH_EVENT), countEvents(batchSimulation, Vehicle.CRASH_EVENT)
+            ))
+    map.crashes['enabled'] = crashesEnabled
+
+# Compare the crash checks against the whole vehicles list with the crash checks against the vehicle grid, both must give the same states
+def gridBenchmark(mapPath, seconds):
+    map = Map.load_from_file(mapPath)
+    if map == None:
+        return
+    steps = round(seconds * Config.UPDATES_PER_SECOND)
+    crashesEnabled = map.crashes['enabled']
+    map.crashes['enabled'] = True
+
+    print('%s with crashes on, %d steps, us per step' % (map.name, steps))
+    for count in VEHICLE_COUNTS:
+        inputs = recordInputs(map, count, steps)
+        listTime, listSimulation = replayRace(map, inputs, steps, False, False)
+        gridTime, gridSimulation = replayRace(map, inputs, steps, False, True)
+        print('%4d vehicles: list %7.1f, grid %7.1f (%.1fx), same states %-3s same events %-3s crashes %d' % (
+            count, listTime, gridTime, listTime / gridTime,
+            'yes' if listSimulation.get_state() == gridSimulation.get_state() else 'no',
+            'yes' if listSimulation.events == gridSimulation.events else 'no',
+            countEvents(gridSimulation, Vehicle.CRASH_EVENT)
+        ))
+    map.crashes['enabled'] = crashesEnabled
+
+# Run the benchmark
+if __name__ == '__main__':
+    if len(sys.argv) < 3 or sys.argv[1] not in ( 'batch', 'grid' ):
+        print('Usage: python src/racebench.py batch map.json [seconds]\n       python src/racebench.py grid map.json [seconds]')
+        sys.exit(1)
+
+    # Show map errors in the console
+    dialogs.use_console()
+
+    if sys.argv[1] == 'batch':
+        batchBenchmark(sys.argv[2], float(sys.argv[3]) if len(sys.argv) > 3 else 10)
+    if sys.argv[1] == 'grid':
+        gridBenchmark(sys.argv[2], float(sys.argv[3]) if len(sys.argv) > 3 else 10)
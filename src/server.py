@@ -0,0 +1,237 @@
+# BassieRacing - Server
+# The lobby server, hosts many race rooms and relays the messages of the games between the players of a room,
+# it runs with asyncio on one UDP port and doesn't need pygame
+# A player joins or creates a room, selects its vehicle, the owner of the room selects the map with its content hash, and every change
+# is sent to all players of the room, the first player of a room is its owner and hosts the race
+# Pings, room lists and room joins of new addresses are answered to everyone, so their replies are not bigger than the requests
+# and every address can only send a few of them per second, a new address only gets a cookie and joins a room when it sends
+# that cookie back, so a spoofed address never gets room messages and the server can't be used to flood it
+# Usage: python src/server.py [port]
+
+# Import modules
+import asyncio
+from constants import *
+import hashlib
+import hmac
+import itertools
+from network import *
+import os
+import struct
+import sys
+import time
+
+# The lobby server class
+class LobbyServer(asyncio.DatagramProtocol):
+    # Create lobby server
+    def __init__(self):
+        self.transport = None
+        self.rooms = {}
+        self.players = {}
+        self.nextRoomId = 1
+
+        # The ( tokens, time ) request buckets of the addresses that send pings, room lists and first room joins
+        self.requestBuckets = {}
+
+        # The secret of the cookies of new addresses
+        self.cookieSecret = os.urandom(16)
+
+        self.packetsReceived = 0
+        self.packetsRelayed = 0
+
+    # Start the server when the socket is ready
+    def connection_made(self, transport):
+        self.transport = transport
+
+    # Handle a message of a player
+    def datagram_received(self, data, address):
+        self.packetsReceived += 1
+        message = Message.decode(data)
+        if message == None:
+            return
+        messageType, body = message
+
+        try:
+            player = self.players.get(address)
+            if player != None:
+                player['last-seen'] = time.monotonic()
+
+            # Relay a message of the game to one or all other players of the room
+            if messageType == Message.RELAY and player != None:
+                self.relay(player, *Message.decode_relay(body))
+
+            if messageType == Message.PING and self.allow_request(address):
+                self.transport.sendto(Message.encode(Message.PONG, body), address)
+
+            if messageType == Message.ROOM_LIST and self.allow_request(address):
+                self.send_rooms(address, Message.decode_room_list(body), len(data))
+
+            # A new address first gets a cookie and only joins when it sends that cookie back
+            if messageType == Message.ROOM_JOIN and (player != None or self.allow_request(address)):
+                join = Message.decode_room_join(body)
+                if player != None or self.check_cookie(address, join['cookie']):
+                    self.join(address, join)
+                else:
+                    self.transport.sendto(Message.encode_cookie(self.get_cookie(address, int(time.monotonic() // Config.SERVER_COOKIE_TIME))), address)
+
+            if messageType == Message.ROOM_LEAVE and player != None:
+                self.leave(player)
+
+            # Only the owner of a room selects the map
+            if messageType == Message.ROOM_MAP and player != None:
+                room = self.rooms[player['room-id']]
+                if player['index'] == room['owner']:
+                    room['map-id'], room['map-hash'], room['map-name'] = Message.decode_room_map(body)
+                    self.send_room(room)
+                else:
+                    self.transport.sendto(Message.encode_error('Only the owner of the room can select the map'), address)
+
+            if messageType == Message.ROOM_VEHICLE and player != None:
+                player['vehicle-type-id'], player['color'] = Message.decode_room_vehicle(body)
+                self.send_room(self.rooms[player['room-id']])
+
+        # Ignore broken messages
+        except (struct.error, IndexError):
+            pass
+
+    # Check if an address may send another ping or room list, every address has a bucket that fills with the request rate
+    def allow_request(self, address):
+        now = time.monotonic()
+        tokens, lastTime = self.requestBuckets.get(address, ( Config.SERVER_REQUEST_BURST, now ))
+        tokens = min(tokens + (now - lastTime) * Config.SERVER_REQUEST_RATE, Config.SERVER_REQUEST_BURST)
+        if tokens < 1:
+            self.requestBuckets[address] = ( tokens, now )
+            return False
+        self.requestBuckets[address] = ( tokens - 1, now )
+        return True
+
+    # Get the cookie of an address for a cookie time step
+    def get_cookie(self, address, timeStep):
+        return hmac.new(self.cookieSecret, ('%s:%d:%d' % ( address[0], address[1], timeStep )).encode('utf8'), hashlib.sha256).digest()[:Message.COOKIE_SIZE]
+
+    # Check the cookie of an address, the cookie of the previous time step is still valid
+    def check_cookie(self, address, cookie):
+        timeStep = int(time.monotonic() // Config.SERVER_COOKIE_TIME)
+        return any(hmac.compare_digest(cookie, self.get_cookie(address, step)) for step in ( timeStep, timeStep - 1 ))
+
+    # Send the rooms from an offset, only as many as fit in the size of the request
+    def send_rooms(self, address, offset, size):
+        rooms = []
+        for room in itertools.islice(self.rooms.values(), offset, offset + Config.SERVER_ROOMS_LIST_SIZE):
+            if len(Message.encode_rooms(rooms + [ room ])) > size:
+                break
+            rooms.append(room)
+        self.transport.sendto(Message.encode_rooms(rooms), address)
+
+    # Join a room or create a new room when the room id is zero, a player that is in another room leaves it first
+    def join(self, address, join):
+        player = self.players.get(address)
+        if player != None:
+            if player['room-id'] == join['room-id']:
+                self.transport.sendto(Message.encode_room(self.rooms[player['room-id']], player['index']), address)
+                return
+            self.leave(player)
+
+        if join['room-id'] == 0:
+            if len(self.rooms) >= Config.SERVER_MAX_ROOMS:
+                self.transport.sendto(Message.encode_error('The server has no free rooms'), address)
+                return
+            room = {
+                'id': self.nextRoomId,
+                'name': join['room-name'],
+                'owner': 0,
+                'map-id': 0,
+                'map-hash': bytes(20),
+                'map-name': '',
+                'players': {}
+            }
+            self.rooms[room['id']] = room
+            self.nextRoomId = self.nextRoomId % 0xffff + 1
+            while self.nextRoomId in self.rooms:
+                self.nextRoomId = self.nextRoomId % 0xffff + 1
+        else:
+            room = self.rooms.get(join['room-id'])
+            if room == None:
+                self.transport.sendto(Message.encode_error('The room doesn\'t exist'), address)
+                return
+            if len(room['players']) >= Config.SERVER_ROOM_SIZE:
+                self.transport.sendto(Message.encode_error('The room is full'), address)
+                return
+
+        # The player gets the first free index of the room
+        index = 0
+        while index in room['players']:
+            index += 1
+        player = {
+            'address': address,
+            'name': join['name'],
+            'vehicle-type-id': join['vehicle-type-id'],
+            'color': join['color'],
+            'room-id': room['id'],
+            'index': index,
+            'last-seen': time.monotonic()
+        }
+        room['players'][index] = player
+        self.players[address] = player
+        self.send_room(room)
+
+    # Leave the room of a player, the player with the lowest index becomes the owner when the owner leaves and empty rooms are removed
+    def leave(self, player):
+        del self.players[player['address']]
+        room = self.rooms[player['room-id']]
+        del room['players'][player['index']]
+        if len(room['players']) == 0:
+            del self.rooms[room['id']]
+            return
+        if player['index'] == room['owner']:
+            room['owner'] = min(room['players'])
+        self.send_room(room)
+
+    # Send the room to all its players
+    def send_room(self, room):
+        for player in room['players'].values():
+            self.transport.sendto(Message.encode_room(room, player['index']), player['address'])
+
+    # Relay a message of the game from a player to one or all other players of its room
+    def relay(self, player, playerIndex, data):
+        room = self.rooms[player['room-id']]
+        message = Message.encode_relay(player['index'], data)
+        if playerIndex == Message.ALL_PLAYERS:
+            for otherPlayer in room['players'].values():
+                if otherPlayer['index'] != player['index']:
+                    self.transport.sendto(message, otherPlayer['address'])
+                    self.packetsRelayed += 1
+        else:
+            otherPlayer = room['players'].get(playerIndex)
+            if otherPlayer != None:
+                self.transport.sendto(message, otherPlayer['address'])
+                self.packetsRelayed += 1
+
+    # Remove the players that are gone and the request buckets that are full again
+    def remove_timed_out_players(self):
+        now = time.monotonic()
+        for player in list(self.players.values()):
+            if now - player['last-seen'] > Config.MULTIPLAYER_TIMEOUT:
+                self.leave(player)
+
+        for address, ( tokens, lastTime ) in list(self.requestBuckets.items()):
+            if tokens + (now - lastTime) * Config.SERVER_REQUEST_RATE >= Config.SERVER_REQUEST_BURST:
+                del self.requestBuckets[address]
+
+# Run the lobby server until it is stopped
+async def serve(port):
+    server = LobbyServer()
+    transport, protocol = await asyncio.get_running_loop().create_datagram_endpoint(lambda: server, local_addr=( '0.0.0.0', port ))
+    print('Lobby server listening on UDP port %d' % port, flush=True)
+    try:
+        while True:
+            await asyncio.sleep(1)
+            server.remove_timed_out_players()
+    finally:
+        transport.close()
+
+# Run the lobby server
+if __name__ == '__main__':
+    try:
+        asyncio.run(serve(int(sys.argv[1]) if len(sys.argv) > 1 else Config.SERVER_PORT))
+    except KeyboardInterrupt:
+        pass
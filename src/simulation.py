@@ -0,0 +1,383 @@
+# BassieRacing - Simulation
+# A headless race simulation that steps a map and its vehicles with an explicit clock, without a display, audio or widgets
+# Usage: python src/simulation.py map.json [vehicle id] [laps] [races]
+
+# Hide pygame support message
+import os
+os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = 'hide'
+
+# Import modules
+from constants import *
+import math
+from objects import *
+from stats import *
+import sys
+import time
+from utils import *
+
+# NumPy is optional and only used to step many vehicles at once with a vehicle batch
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# The input script class, drives a vehicle with a list of timed ( time, moving, turning ) keyframes
+class InputScript:
+    def __init__(self, keyframes):
+        self.keyframes = keyframes
+        self.index = 0
+
+    # Get the inputs of the last keyframe that started
+    def __call__(self, simulation, vehicle):
+        while self.index + 1 < len(self.keyframes) and self.keyframes[self.index + 1][0] <= simulation.time:
+            self.index += 1
+        if len(self.keyframes) == 0 or self.keyframes[self.index][0] > simulation.time:
+            return ( Vehicle.NOT_MOVING, Vehicle.NOT_TURNING )
+        return self.keyframes[self.index][1:]
+
+# The path driver class, drives a vehicle over the track to the nearest unchecked checkpoint and then to the finish
+class PathDriver:
+    # The number of path tiles to look ahead and the speeds to drive with
+    LOOK_AHEAD = 10
+    CORNER_VELOCITY = 150
+    VELOCITY_PER_PIXEL = 1
+
+    def __init__(self, map):
+        self.map = map
+        self.distances = {}
+
+    # Get the distances of all the track tiles to a checkpoint, calculated once with a breadth first search
+    def get_distances(self, checkpoint):
+        key = ( checkpoint['x'], checkpoint['y'], checkpoint['width'], checkpoint['height'] )
+        if key not in self.distances:
+            distances = {}
+            queue = []
+            for y in range(checkpoint['y'], checkpoint['y'] + checkpoint['height']):
+                for x in range(checkpoint['x'], checkpoint['x'] + checkpoint['width']):
+                    distances[( x, y )] = 0
+                    queue.append(( x, y ))
+
+            for x, y in queue:
+                for nx, ny in ( ( x, y - 1 ), ( x, y + 1 ), ( x - 1, y ), ( x + 1, y ) ):
+                    if (
+                        nx >= 0 and ny >= 0 and nx < self.map.width and ny < self.map.height and
+                        self.map.track[ny][nx] != 0 and ( nx, ny ) not in distances
+                    ):
+                        distances[( nx, ny )] = distances[( x, y )] + 1
+                        queue.append(( nx, ny ))
+
+            self.distances[key] = distances
+        return self.distances[key]
+
+    # Check if a straight line only crosses track tiles
+    def is_on_track(self, x1, y1, x2, y2):
+        steps = math.floor(math.sqrt((x2 - x1) ** 2 + (y2 - y1) ** 2) / (Config.TILE_SPRITE_SIZE / 4)) + 1
+        for i in range(steps + 1):
+            x = math.floor((x1 + (x2 - x1) * i / steps) / Config.TILE_SPRITE_SIZE)
+            y = math.floor((y1 + (y2 - y1) * i / steps) / Config.TILE_SPRITE_SIZE)
+            if x < 0 or y < 0 or x >= self.map.width or y >= self.map.height or self.map.track[y][x] == 0:
+                return False
+        return True
+
+    # Decide the inputs of the vehicle
+    def __call__(self, simulation, vehicle):
+        tile = ( math.floor(vehicle.x / Config.TILE_SPRITE_SIZE), math.floor(vehicle.y / Config.TILE_SPRITE_SIZE) )
+
+        # Find the nearest unchecked checkpoint or the finish when all are checked
+        target = None
+        for i, checkpoint in enumerate(self.map.checkpoints):
+            if not vehicle.checkedCheckpoints[i]:
+                distances = self.get_distances(checkpoint)
+                if tile in distances and (target == None or distances[tile] < target[tile]):
+                    target = distances
+        if target == None:
+            target = self.get_distances(self.map.finish)
+        if tile not in target:
+            return ( Vehicle.MOVING_FORWARD, Vehicle.NOT_TURNING )
+
+        # Aim at the furthest tile of the path ahead that can be reached in a straight line over the track
+        aimX = vehicle.x
+        aimY = vehicle.y
+        for i in range(PathDriver.LOOK_AHEAD):
+            x, y = tile
+            for neighbour in ( ( x, y - 1 ), ( x, y + 1 ), ( x - 1, y ), ( x + 1, y ) ):
+                if neighbour in target and target[neighbour] < target[tile]:
+                    tile = neighbour
+                    break
+            else:
+                break
+
+            tileX = tile[0] * Config.TILE_SPRITE_SIZE + Config.TILE_SPRITE_SIZE / 2
+            tileY = tile[1] * Config.TILE_SPRITE_SIZE + Config.TILE_SPRITE_SIZE / 2
+            if i > 0 and not self.is_on_track(vehicle.x, vehicle.y, tileX, tileY):
+                break
+            aimX = tileX
+            aimY = tileY
+
+        # Steer to the aim and drive slower when it is close or when the vehicle has to turn a lot
+        angle = (math.atan2(vehicle.x - aimX, vehicle.y - aimY) - vehicle.angle + math.pi) % (math.pi * 2) - math.pi
+        turning = Vehicle.NOT_TURNING
+        if angle > 0.03:
+            turning = Vehicle.TURNING_LEFT
+        if angle < -0.03:
+            turning = Vehicle.TURNING_RIGHT
+
+        maxVelocity = PathDriver.CORNER_VELOCITY
+        if abs(angle) <= 0.5:
+            maxVelocity = max(maxVelocity, math.sqrt((aimX - vehicle.x) ** 2 + (aimY - vehicle.y) ** 2) * PathDriver.VELOCITY_PER_PIXEL)
+
+        moving = Vehicle.NOT_MOVING
+        if vehicle.velocity < maxVelocity:
+            moving = Vehicle.MOVING_FORWARD
+        elif vehicle.velocity > maxVelocity * 1.3:
+            moving = Vehicle.MOVING_BACKWARD
+        return ( moving, turning )
+
+# The vehicle batch class, keeps the driving state of many vehicles in arrays and steps their physics at once with numpy,
+# it is made for headless runs so it does not keep the previous positions to draw between and the vehicles must not use a vehicle grid
+class VehicleBatch:
+    # Create vehicle batch, the vehicles keep their laps, checkpoints and crashes and handle them with their own rules
+    def __init__(self, map, vehicles):
+        self.map = map
+        self.vehicles = vehicles
+        self.track = numpy.frombuffer(map.track.data, dtype=numpy.uint8).reshape(( map.height, map.width ))
+
+        # The stats of the vehicle types
+        self.turningSpeed = numpy.array([ vehicle.vehicleType['turningSpeed'] for vehicle in vehicles ], dtype=numpy.float64)
+        self.forwardAcceleration = numpy.array([ vehicle.vehicleType['forwardAcceleration'] for vehicle in vehicles ], dtype=numpy.float64)
+        self.backwardAcceleration = numpy.array([ vehicle.vehicleType['backwardAcceleration'] for vehicle in vehicles ], dtype=numpy.float64)
+        self.maxForwardVelocity = numpy.array([ vehicle.vehicleType['maxForwardVelocity'] for vehicle in vehicles ], dtype=numpy.float64)
+        self.maxBackwardVelocity = numpy.array([ vehicle.vehicleType['maxBackwardVelocity'] for vehicle in vehicles ], dtype=numpy.float64)
+        self.crashDistance = numpy.array([ max(vehicle.vehicleType['width'], vehicle.vehicleType['height']) / 3 * 2 for vehicle in vehicles ], dtype=numpy.float64)
+
+        # The driving state and the inputs of the vehicles
+        self.x = numpy.zeros(len(vehicles), dtype=numpy.float64)
+        self.y = numpy.zeros(len(vehicles), dtype=numpy.float64)
+        self.angle = numpy.zeros(len(vehicles), dtype=numpy.float64)
+        self.velocity = numpy.zeros(len(vehicles), dtype=numpy.float64)
+        self.acceleration = numpy.zeros(len(vehicles), dtype=numpy.float64)
+        self.moving = numpy.zeros(len(vehicles), dtype=numpy.int8)
+        self.turning = numpy.zeros(len(vehicles), dtype=numpy.int8)
+
+        # Which vehicles drive and which have a running crash timeout
+        self.driving = numpy.zeros(len(vehicles), dtype=bool)
+        self.crashing = numpy.zeros(len(vehicles), dtype=bool)
+        self.load()
+
+    # Read the state of all vehicles into the arrays
+    def load(self):
+        for i in range(len(self.vehicles)):
+            self.load_vehicle(i)
+
+    # Read the state of one vehicle into the arrays
+    def load_vehicle(self, i):
+        vehicle = self.vehicles[i]
+        self.x[i] = vehicle.x
+        self.y[i] = vehicle.y
+        self.angle[i] = vehicle.angle
+        self.velocity[i] = vehicle.velocity
+        self.acceleration[i] = vehicle.acceleration
+        self.driving[i] = vehicle.started and not vehicle.finished and not vehicle.crashed
+        self.crashing[i] = vehicle.crashTime != None
+
+    # Write the driving state of all vehicles back to the vehicles
+    def store(self):
+        for vehicle, x, y, angle, velocity, acceleration in zip(self.vehicles, self.x.tolist(), self.y.tolist(),
+            self.angle.tolist(), self.velocity.tolist(), self.acceleration.tolist()
+        ):
+            vehicle.x = x
+            vehicle.y = y
+            vehicle.angle = angle
+            vehicle.velocity = velocity
+            vehicle.acceleration = acceleration
+
+    # Write the driving state of some vehicles back to the vehicles
+    def store_vehicles(self, indexes):
+        for i in indexes:
+            vehicle = self.vehicles[i]
+            vehicle.x = float(self.x[i])
+            vehicle.y = float(self.y[i])
+            vehicle.angle = float(self.angle[i])
+            vehicle.velocity = float(self.velocity[i])
+            vehicle.acceleration = float(self.acceleration[i])
+
+    # Step all vehicles, does the same as Vehicle.update but only the vehicles that are crashed or are not
+    # on a normal track tile run their own rules, vehicle crashes are checked after all vehicles have moved
+    def step(self, delta):
+        # Read the inputs
+        self.moving[:] = [ vehicle.moving for vehicle in self.vehicles ]
+        self.turning[:] = [ vehicle.turning for vehicle in self.vehicles ]
+
+        # Let the crashed vehicles wait for the crash animation, they start driving again the next step
+        indexes = numpy.flatnonzero(self.driving)
+        for i in numpy.flatnonzero(~self.driving).tolist():
+            vehicle = self.vehicles[i]
+            if vehicle.started and not vehicle.finished and vehicle.crashed:
+                vehicle.update_crashed()
+                if not vehicle.crashed:
+                    self.load_vehicle(i)
+
+        # Handle turning
+        turning = self.turning[indexes]
+        turningSpeed = self.turningSpeed[indexes] * delta
+        angle = self.angle[indexes]
+        angle = numpy.where(turning == Vehicle.TURNING_LEFT, angle + turningSpeed, angle)
+        angle = numpy.where(turning == Vehicle.TURNING_RIGHT, angle - turningSpeed, angle)
+
+        # Handle moving, slow down when not moving
+        moving = self.moving[indexes]
+        velocity = self.velocity[indexes]
+        acceleration = self.acceleration[indexes]
+        acceleration = numpy.where(moving == Vehicle.MOVING_FORWARD, acceleration + self.forwardAcceleration[indexes] * delta,
+            numpy.where(moving == Vehicle.MOVING_BACKWARD, acceleration + self.backwardAcceleration[indexes] * delta, 0))
+        velocity = numpy.where(moving == Vehicle.NOT_MOVING, velocity - velocity * delta, velocity)
+
+        # Cap velocity by vehicle stats
+        velocity = velocity + acceleration * delta
+        velocity = numpy.minimum(velocity, self.maxForwardVelocity[indexes])
+        velocity = numpy.maximum(velocity, self.maxBackwardVelocity[indexes])
+
+        # Calculate new position and prevent out the map driving
+        x = numpy.clip(self.x[indexes] - velocity * numpy.sin(angle) * delta, 0, self.map.width * Config.TILE_SPRITE_SIZE)
+        y = numpy.clip(self.y[indexes] - velocity * numpy.cos(angle) * delta, 0, self.map.height * Config.TILE_SPRITE_SIZE)
+
+        self.x[indexes] = x
+        self.y[indexes] = y
+        self.angle[indexes] = angle
+        self.velocity[indexes] = velocity
+        self.acceleration[indexes] = acceleration
+
+        # Find the vehicles that are not on a normal track tile or have a running crash timeout
+        tileX = numpy.floor(x / Config.TILE_SPRITE_SIZE).astype(numpy.int64)
+        tileY = numpy.floor(y / Config.TILE_SPRITE_SIZE).astype(numpy.int64)
+        inside = (tileX < self.map.width) & (tileY < self.map.height)
+        tiles = self.track[numpy.minimum(tileY, self.map.height - 1), numpy.minimum(tileX, self.map.width - 1)]
+        normal = inside & ((tiles == 1) | ((tiles == 0) & (not self.map.crashes['enabled']))) & ~self.crashing[indexes]
+
+        # Let them run their own tile rules
+        special = indexes[~normal].tolist()
+        self.store_vehicles(special)
+        for i in special:
+            self.vehicles[i].update_tile()
+            self.load_vehicle(i)
+
+        # Check if vehicles are to close to crash with squared distances, only the vehicles that are close check it themselves
+        if self.map.crashes['enabled'] and len(indexes) > 0:
+            others = numpy.flatnonzero(numpy.array([ not vehicle.finished for vehicle in self.vehicles ], dtype=bool))
+            distances = (x[:, numpy.newaxis] - self.x[others]) ** 2 + (y[:, numpy.newaxis] - self.y[others]) ** 2
+            close = distances < (self.crashDistance[indexes] ** 2)[:, numpy.newaxis]
+            close &= indexes[:, numpy.newaxis] != others
+            rows = numpy.flatnonzero(close.any(axis=1)).tolist()
+            if len(rows) > 0:
+                self.store()
+                for row in rows:
+                    vehicle = self.vehicles[indexes[row]]
+                    if not vehicle.crashed:
+                        vehicle.check_vehicle_crashes()
+                self.load()
+
+# The simulation class
+class Simulation:
+    # Create a simulation of a race, every vehicle is driven by a driver function that returns the inputs,
+    # batched simulations step the vehicles with a vehicle batch when numpy is installed
+    def __init__(self, map, vehicleData, drivers, timeStep = 1 / Config.UPDATES_PER_SECOND, batched = False):
+        self.map = map
+        self.drivers = drivers
+        self.timeStep = timeStep
+
+        # The clock of the simulation, the vehicles use it instead of the game
+        self.time = 0
+        self.alpha = 1
+        self.steps = 0
+
+        # Create the started vehicles next to the finish, a vehicle batch finds the close vehicles itself
+        batched = batched and numpy != None
+        self.vehicles = []
+        self.vehicleGrid = VehicleGrid() if not batched else None
+        for i, data in enumerate(vehicleData):
+            vehicle = Vehicle(self, i, data['type'], data['color'], map, self.vehicles, *map.get_start_position(i), self.vehicleGrid)
+            vehicle.started = True
+            vehicle.startTime = self.time
+            self.vehicles.append(vehicle)
+        self.batch = VehicleBatch(map, self.vehicles) if batched else None
+
+        # The log of all ( time, vehicle id, event ) vehicle events
+        self.events = []
+
+    # Check if all vehicles are finished
+    def is_finished(self):
+        for vehicle in self.vehicles:
+            if not vehicle.finished:
+                return False
+        return True
+
+    # Step the simulation one time step
+    def step(self):
+        # Get the inputs of the drivers
+        for i, vehicle in enumerate(self.vehicles):
+            if self.drivers[i] != None:
+                vehicle.moving, vehicle.turning = self.drivers[i](self, vehicle)
+
+        # Update all the vehicles
+        self.time += self.timeStep
+        self.steps += 1
+        if self.batch != None:
+            self.batch.step(self.timeStep)
+            self.batch.store()
+        else:
+            for vehicle in self.vehicles:
+                vehicle.update(self.timeStep)
+
+        # Log the vehicle events
+        for vehicle in self.vehicles:
+            for event in vehicle.events:
+                self.events.append(( self.time, vehicle.id, event ))
+            vehicle.events = []
+
+    # Step the simulation until all vehicles are finished or the time is over
+    def run(self, maxTime):
+        while not self.is_finished() and self.time < maxTime:
+            self.step()
+
+    # Get the state of all vehicles, to compare simulation runs
+    def get_state(self):
+        return [
+            ( vehicle.x, vehicle.y, vehicle.angle, vehicle.velocity, vehicle.lap, vehicle.crashed, vehicle.finished )
+            for vehicle in self.vehicles
+        ]
+
+# Simulate races of a vehicle on a map with the path driver and print the lap times
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print('Usage: python src/simulation.py map.json [vehicle id] [laps] [races]')
+        sys.exit(1)
+
+    # Show map errors in the console
+    dialogs.use_console()
+
+    map = Map.load_from_file(sys.argv[1])
+    if map == None:
+        sys.exit(1)
+    vehicleType = vehicles[int(sys.argv[2]) if len(sys.argv) > 2 else 0]
+    if len(sys.argv) > 3:
+        map.laps = int(sys.argv[3])
+    races = int(sys.argv[4]) if len(sys.argv) > 4 else 1
+
+    startTime = time.perf_counter()
+    totalTime = 0
+    laps = 0
+    driver = PathDriver(map)
+    for i in range(races):
+        simulation = Simulation(map, [ { 'type': vehicleType, 'color': VehicleColor.BLUE } ], [ driver ])
+        simulation.run(map.laps * 600)
+        vehicle = simulation.vehicles[0]
+        totalTime += simulation.time
+        laps += vehicle.lap
+        print('Race %d: %s in %d/%d laps, lap times: %s' % (
+            i + 1, 'finished' if vehicle.finished else 'not finished', vehicle.lap, map.laps,
+            ', '.join(formatTime(lapTime) for lapTime in vehicle.lapTimes if lapTime != None)
+        ))
+
+    duration = time.perf_counter() - startTime
+    print('Simulated %d laps (%.1f s race time) in %.2f s: %.1f laps per second, %.0fx real time' % (
+        laps, totalTime, duration, laps / duration, totalTime / duration))
@@ -3,6 +3,7 @@
 # Import modules
 from constants import *
 from objects import *
+import glob
 import os
 import pygame
 from stats import *
@@ -332,6 +333,74 @@ class Image(Widget):
                 self.y + (self.height - self.surface.get_height()) // 2
             ))
 
+# The map thumbnail cache class, keeps the least recently used map thumbnails in memory and optionally as PNG files on disk
+class ThumbnailCache:
+    # Create thumbnail cache
+    def __init__(self, maxSize, cachePath = None, maxDiskSize = None):
+        self.maxSize = maxSize
+        self.maxDiskSize = maxDiskSize
+        self.cachePath = os.path.expanduser(cachePath) if cachePath != None else None
+        self.thumbnails = {}
+
+    # Get the file path of a cached thumbnail
+    def get_file_path(self, key):
+        return os.path.join(self.cachePath, '%d-%s-%dx%d.png' % key)
+
+    # Get a cached thumbnail of a map, returns None when there is none
+    def get(self, map, width, height):
+        key = ( map.id, map.get_content_hash(), width, height )
+
+        # When the thumbnail is cached move it to the back so it will be removed last
+        if key in self.thumbnails:
+            thumbnail = self.thumbnails.pop(key)
+            self.thumbnails[key] = thumbnail
+            return thumbnail
+
+        # Try to load the thumbnail from disk
+        if self.cachePath != None and os.path.isfile(self.get_file_path(key)):
+            try:
+                thumbnail = pygame.image.load(self.get_file_path(key)).convert_alpha()
+            except pygame.error:
+                return
+            self.add(key, thumbnail)
+            return thumbnail
+
+    # Put a rendered thumbnail of a map in the cache
+    def put(self, map, thumbnail):
+        key = ( map.id, map.get_content_hash(), thumbnail.get_width(), thumbnail.get_height() )
+        self.add(key, thumbnail)
+
+        # Save the thumbnail to disk and remove the old thumbnails
+        if self.cachePath != None:
+            try:
+                os.makedirs(self.cachePath, exist_ok=True)
+                pygame.image.save(thumbnail, self.get_file_path(key))
+                self.remove_old_files(key)
+            except (OSError, pygame.error):
+                pass
+
+    # Remove the saved thumbnails of older contents of the same map and size and the least recently saved thumbnails
+    # when there are more than the max disk size
+    def remove_old_files(self, key):
+        filePath = self.get_file_path(key)
+        for oldFilePath in glob.glob(os.path.join(self.cachePath, '%d-*-%dx%d.png' % ( key[0], key[2], key[3] ))):
+            if oldFilePath != filePath:
+                os.remove(oldFilePath)
+
+        if self.maxDiskSize != None:
+            filePaths = sorted(glob.glob(os.path.join(self.cachePath, '*.png')), key=os.path.getmtime)
+            for oldFilePath in filePaths[:max(len(filePaths) - self.maxDiskSize, 0)]:
+                os.remove(oldFilePath)
+
+    # Add a thumbnail to the memory cache and remove the least recently used thumbnails when the cache is full
+    def add(self, key, thumbnail):
+        self.thumbnails[key] = thumbnail
+        while len(self.thumbnails) > self.maxSize:
+            self.thumbnails.pop(next(iter(self.thumbnails)))
+
+# The map thumbnail cache that is shared by all mini maps
+thumbnailCache = ThumbnailCache(Config.THUMBNAIL_CACHE_SIZE, Config.THUMBNAIL_CACHE_PATH, Config.THUMBNAIL_CACHE_DISK_SIZE)
+
 # The mini map widget class
 class MiniMap(Widget):
     # Create mini map
@@ -339,7 +408,6 @@ class MiniMap(Widget):
         Widget.__init__(self, game, x, y, width, height, clickCallback, callbackExtra)
         self.game = game
         self.vehicles = vehicles
-        self.surface = pygame.Surface(( width, height ), pygame.SRCALPHA)
         self.map = None
         self.set_map(map)
 
@@ -348,49 +416,59 @@ class MiniMap(Widget):
         if map != self.map:
             self.map = map
 
-            # Calculate new tile size and create a camera
+            # Calculate new tile size
             self.tileSize = self.width // map.width
             self.vehicleScale = (self.tileSize * 5) / Config.TILE_SPRITE_SIZE
-            self.camera = Camera(
-                (map.width * self.tileSize) / 2,
-                (map.height * self.tileSize) / 2,
-                self.game.tilesImage, self.tileSize,
-                self.game.vehiclesImage, self.vehicleScale
-            )
-
-            # Crop the vehicles with the right camera
+            self.camera = None
+
+            # Create a camera and crop the vehicles with it when vehicles are given
             if self.vehicles != None:
+                self.create_camera()
                 for vehicle in self.vehicles:
                     vehicle.cropImage(self.camera)
 
-            # Draw the map tiles once for performace
-            self.surface.fill(Color.TRANSPARENT)
-            self.map.draw(self.surface, self.camera)
+            # Use the cached thumbnail of the map or draw the map tiles once for performace, without filling the chunk cache
+            self.surface = thumbnailCache.get(self.map, self.width, self.height)
+            if self.surface == None:
+                if self.camera == None:
+                    self.create_camera()
+                self.surface = pygame.Surface(( self.width, self.height ), pygame.SRCALPHA)
+                self.surface.fill(Color.TRANSPARENT)
+                self.map.draw(self.surface, self.camera, False)
+                thumbnailCache.put(self.map, self.surface)
+
+    # Create a camera for the mini map
+    def create_camera(self):
+        self.camera = Camera(
+            (self.map.width * self.tileSize) / 2,
+            (self.map.height * self.tileSize) / 2,
+            self.game.tilesImage, self.tileSize,
+            self.game.vehiclesImage, self.vehicleScale
+        )
 
     # Draw mini map
     def draw(self, surface):
-        # Draw special when vehicles are given
-        if self.vehicles != None:
-            # Copy the surface to draw the vehicles
-            surfaceCopy = self.surface.copy()
+        # Draw the cached map surface
+        surface.blit(self.surface, ( self.x, self.y ))
+
+        # Draw the vehicles if given directly on top of it, clipped to the mini map, a map wider than the mini map has no tiles to draw them on
+        if self.vehicles != None and self.tileSize > 0:
+            oldClip = surface.get_clip()
+            surface.set_clip(oldClip.clip(( self.x, self.y, self.width, self.height )))
 
-            # Draw the vehicles if given
             for vehicle in self.vehicles:
                 if not vehicle.finished:
-                    rotatedVehicleImage = pygame.transform.rotate(self.camera.vehicleImageCache[vehicle.id], math.degrees(vehicle.angle))
-                    x = math.floor((vehicle.x / (Config.TILE_SPRITE_SIZE / self.tileSize)) - rotatedVehicleImage.get_width() / 2 - (self.camera.x - self.width / 2))
-                    y = math.floor((vehicle.y / (Config.TILE_SPRITE_SIZE / self.tileSize)) - rotatedVehicleImage.get_height() / 2 - (self.camera.y - self.height / 2))
+                    vehicleX, vehicleY, vehicleAngle = vehicle.get_interpolated_position()
+                    rotatedVehicleImage = vehicle.get_rotated_image(self.camera, vehicleAngle)
+                    x = math.floor((vehicleX / (Config.TILE_SPRITE_SIZE / self.tileSize)) - rotatedVehicleImage.get_width() / 2 - (self.camera.x - self.width / 2))
+                    y = math.floor((vehicleY / (Config.TILE_SPRITE_SIZE / self.tileSize)) - rotatedVehicleImage.get_height() / 2 - (self.camera.y - self.height / 2))
                     if (
                         x + rotatedVehicleImage.get_width() >= 0 and y + rotatedVehicleImage.get_height() >= 0 and
                         x - rotatedVehicleImage.get_width() < self.width and y - rotatedVehicleImage.get_height() < self.height
                     ):
-                        surfaceCopy.blit(rotatedVehicleImage, ( x, y ))
+                        surface.blit(rotatedVehicleImage, ( self.x + x, self.y + y ))
 
-            # Draw surface
-            surface.blit(surfaceCopy, ( self.x, self.y ))
-        else:
-            # Draw surface
-            surface.blit(self.surface, ( self.x, self.y ))
+            surface.set_clip(oldClip)
 
 # The countdown clock widget
 class CountdownClock(Widget):
@@ -479,24 +557,12 @@ class MapSelector(WidgetGroup):
         self.changedCallback = changedCallback
         self.callbackExtra = callbackExtra
 
-        # List default maps
-        self.mapPaths = [ os.path.abspath('assets/maps/' + filename) for filename in os.listdir('assets/maps/') if os.path.isfile('assets/maps/' + filename) ]
-
-        # Add custom maps from settings and remove deleted ones
-        for customMapPath in game.settings['custom-maps']:
-            customMapPath = os.path.abspath(customMapPath)
-            if customMapPath not in self.mapPaths:
-                if os.path.isfile(customMapPath):
-                    self.mapPaths.append(customMapPath)
-                else:
-                    game.settings['custom-maps'].remove(customMapPath)
+        # List default maps and custom maps from settings
+        self.mapPaths = MapCatalogue.list_map_paths(game.settings)
 
-        # Load maps
-        self.maps = []
-        for i, mapPath in enumerate(self.mapPaths):
-            map = Map.load_from_file(mapPath)
-            if map != None:
-                self.maps.append(map)
+        # Read the map metadata, the full maps are only loaded when they are visible
+        self.catalogue = MapCatalogue(self.mapPaths)
+        self.maps = self.catalogue.maps
 
         # Set selected or selected first
         if selectedMapId == None:
@@ -504,7 +570,7 @@ class MapSelector(WidgetGroup):
         else:
             foundMap = False
             for i, map in enumerate(self.maps):
-                if map.id == selectedMapId:
+                if map['id'] == selectedMapId:
                     foundMap = True
                     self.selectedMapIndex = i
                     break
@@ -513,23 +579,47 @@ class MapSelector(WidgetGroup):
                 self.selectedMapIndex = len(self.maps) - 1
 
         # Create widgets
-        self.selectedMap = self.maps[self.selectedMapIndex]
         self.create_widgets()
 
+    # Load the full maps of the three visible map slots and unload the others, there are none when no map can be loaded
+    def load_visible_maps(self):
+        if len(self.maps) == 0:
+            self.catalogue.keep_maps([])
+            return []
+
+        visibleMaps = []
+        for i in range(3):
+            position = (self.selectedMapIndex - 1 + i) % len(self.maps)
+            map = self.catalogue.load_map(self.maps[position])
+
+            # Remove maps that can't be loaded and try again
+            if map == None:
+                self.catalogue.remove_map(self.maps[position])
+                if position < self.selectedMapIndex or self.selectedMapIndex == len(self.maps):
+                    self.selectedMapIndex -= 1
+                return self.load_visible_maps()
+
+            visibleMaps.append(map)
+
+        self.catalogue.keep_maps(visibleMaps)
+        return visibleMaps
+
     # Create map selector widgets
     def create_widgets(self):
         self.widgets = []
 
+        # Show only a message when there are no maps
+        visibleMaps = self.load_visible_maps()
+        if len(visibleMaps) == 0:
+            self.selectedMap = None
+            self.widgets.append(Label(self.game, 'No maps can be loaded', self.x, self.y, self.width, self.height, self.game.textFont, Color.WHITE))
+            return
+        self.selectedMap = visibleMaps[1]
+
         column_width = (self.width - 48 - 48) // 3
         rx = self.x + 48
         for i in range(3):
-            position = (self.selectedMapIndex - 1) + i
-            if position == -1:
-                map = self.maps[len(self.maps) - 1]
-            elif position == len(self.maps):
-                map = self.maps[0]
-            else:
-                map = self.maps[position]
+            map = visibleMaps[i]
 
             if i == 0:
                 self.widgets.append(Rect(self.game, rx, self.y, column_width, self.height, None, self.rotate_left_button_clicked))
@@ -568,11 +658,10 @@ class MapSelector(WidgetGroup):
     # Set selected map
     def set_selected(self, selectedMapIndex):
         self.selectedMapIndex = selectedMapIndex
-        self.selectedMap = self.maps[self.selectedMapIndex]
         self.create_widgets()
 
         # Call change callback
-        if self.changedCallback != None:
+        if self.changedCallback != None and self.selectedMap != None:
             if self.callbackExtra != None:
                 self.changedCallback(self.selectedMap, self.callbackExtra)
             else:
@@ -583,19 +672,20 @@ class MapSelector(WidgetGroup):
         file_path = os.path.abspath(file_path)
 
         # Check if map is not already pressent
-        if file_path not in self.mapPaths:
-            # Add and select it
-            map = Map.load_from_file(file_path)
-            if map != None:
+        for i, map in enumerate(self.maps):
+            if map['path'] == file_path:
+                # Just selected the map
+                self.set_selected(i)
+                return
+
+        # Add and select it
+        map = Map.load_from_file(file_path)
+        if map != None and self.catalogue.add_map(file_path, map) != None:
+            if file_path not in self.mapPaths:
                 self.mapPaths.append(file_path)
-                if file_path not in self.game.settings['custom-maps']:
-                    self.game.settings['custom-maps'].append(file_path)
-                self.maps.append(map)
-                self.set_selected(len(self.maps) - 1)
-
-        # Just selected the map
-        else:
-            self.set_selected(self.mapPaths.index(file_path))
+            if file_path not in self.game.settings['custom-maps']:
+                self.game.settings['custom-maps'].append(file_path)
+            self.set_selected(len(self.maps) - 1)
 
     # Handle rotate left button click
     def rotate_left_button_clicked(self):
@@ -665,7 +755,7 @@ class VehicleSelector(WidgetGroup):
         self.create_widgets()
 
         # Call change callback
-        if self.changedCallback != None:
+        if self.changedCallback != None and self.selectedMap != None:
             if self.callbackExtra != None:
                 self.changedCallback(self.selectedVehicle, self.selectedVehicleColor, self.callbackExtra)
             else:
@@ -680,7 +770,7 @@ class VehicleSelector(WidgetGroup):
         self.create_widgets()
 
         # Call change callback
-        if self.changedCallback != None:
+        if self.changedCallback != None and self.selectedMap != None:
             if self.callbackExtra != None:
                 self.changedCallback(self.selectedVehicle, self.selectedVehicleColor, self.callbackExtra)
             else:
@@ -749,10 +839,10 @@ class VehicleViewport(WidgetGroup):
     def handle_event(self, event):
         # Handle keydown events
         if event.type == pygame.KEYDOWN:
-            # Single player game mode
-            if self.gamemode == GameMode.SINGLE_PLAYER:
+            # Single player and multiplayer game mode, in multiplayer the own vehicle can have any id
+            if self.gamemode == GameMode.SINGLE_PLAYER or self.gamemode == GameMode.MULTIPLAYER:
                 # Handle player movement
-                if self.vehicle.id == VehicleId.LEFT:
+                if self.vehicle.id == VehicleId.LEFT or self.gamemode == GameMode.MULTIPLAYER:
                     if event.key == pygame.K_w or event.key == pygame.K_UP:
                         self.vehicle.moving = Vehicle.MOVING_FORWARD
                     if event.key == pygame.K_s or event.key == pygame.K_DOWN:
@@ -788,10 +878,10 @@ class VehicleViewport(WidgetGroup):
 
          # Handle keyup events
         if event.type == pygame.KEYUP:
-            # Single player game mode
-            if self.gamemode == GameMode.SINGLE_PLAYER:
+            # Single player and multiplayer game mode, in multiplayer the own vehicle can have any id
+            if self.gamemode == GameMode.SINGLE_PLAYER or self.gamemode == GameMode.MULTIPLAYER:
                 # Handle player movement
-                if self.vehicle.id == VehicleId.LEFT:
+                if self.vehicle.id == VehicleId.LEFT or self.gamemode == GameMode.MULTIPLAYER:
                     if event.key == pygame.K_w or event.key == pygame.K_s or event.key == pygame.K_UP or event.key == pygame.K_DOWN:
                         self.vehicle.moving = Vehicle.NOT_MOVING
                     if event.key == pygame.K_a or event.key == pygame.K_d or event.key == pygame.K_LEFT or event.key == pygame.K_RIGHT:
@@ -835,8 +925,7 @@ class VehicleViewport(WidgetGroup):
         self.surface.fill(Color.DARK)
 
         # Update camera
-        self.camera.x = self.vehicle.x
-        self.camera.y = self.vehicle.y
+        self.camera.x, self.camera.y, _ = self.vehicle.get_interpolated_position()
 
         # Draw the map to surface
         self.map.draw(self.surface, self.camera)
@@ -906,32 +995,25 @@ class MapEditor(WidgetGroup):
 
         if tile['x'] >= 0 and tile['y'] >= 0 and tile['x'] < self.map.width and tile['y'] < self.map.height:
             if tool == MapEditor.GRASS_BRUSH:
-                self.map.terrain[tile['y']][tile['x']] = 0
-                self.map.blend_terrain()
+                self.map.set_terrain_tile(tile['x'], tile['y'], 0)
 
             if tool == MapEditor.DIRT_BRUSH:
-                self.map.terrain[tile['y']][tile['x']] = 1
-                self.map.blend_terrain()
+                self.map.set_terrain_tile(tile['x'], tile['y'], 1)
 
             if tool == MapEditor.SAND_BRUSH:
-                self.map.terrain[tile['y']][tile['x']] = 2
-                self.map.blend_terrain()
+                self.map.set_terrain_tile(tile['x'], tile['y'], 2)
 
             if tool == MapEditor.ASPHALT_BRUSH:
-                self.map.track[tile['y']][tile['x']] = 1
-                self.map.blend_track(False)
+                self.map.set_track_tile(tile['x'], tile['y'], 1)
 
             if tool == MapEditor.FINISH_BRUSH:
-                self.map.track[tile['y']][tile['x']] = 2
-                self.map.blend_track(False)
+                self.map.set_track_tile(tile['x'], tile['y'], 2)
 
             if tool == MapEditor.CHECKPOINT_BRUSH:
-                self.map.track[tile['y']][tile['x']] = 3
-                self.map.blend_track(False)
+                self.map.set_track_tile(tile['x'], tile['y'], 3)
 
             if tool == MapEditor.TRACK_ERASER:
-                self.map.track[tile['y']][tile['x']] = 0
-                self.map.blend_track(False)
+                self.map.set_track_tile(tile['x'], tile['y'], 0)
 
     # Handle page events
     def handle_event(self, event):
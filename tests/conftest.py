@@ -0,0 +1,11 @@
+# BassieRacing - Tests
+# The modules live flat in src and import each other by name, so the tests put src on the module path
+
+# Hide pygame support message
+import os
+os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = 'hide'
+
+# Import modules
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
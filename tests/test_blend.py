@@ -0,0 +1,117 @@
+# BassieRacing - Blend tests
+
+# Import modules
+import hashlib
+import json
+from objects import *
+import os
+import pytest
+import random
+
+MAPS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'assets', 'maps')
+
+# The SHA-1 digests of the JSON lists of the blended terrain and track tiles of the bundled maps,
+# made with the old blend code that checked the neighbours of every tile with if and elif chains
+OLD_BLEND_DIGESTS = {
+    'baby-park.json': ( '9287b6b38c47daf0a6f3b95f71de5bc2d9a61e71', 'd22e5156f5aeef9e8650681fe33edc9cca900de1' ),
+    'classic-eight.json': ( '9b3b6a7bed600d1e6fc628d812dc7d005b3191cb', 'b79fae510bc1945b4b385891debdb0c5bc2078a3' ),
+    'monaco.json': ( '21e52c01484e969244311f3bb95c8fc125c11bcc', 'c490e6d7a96ed0bbdc1b58c8aebf00337486633d' ),
+    'nurburgring.json': ( '3d67ccf74f3af593c238fdcc2a64be1e0d84bef4', '1dfe1f7d7ca7fe5b740e175dda1a09cb35d6dea4' ),
+    'sepang.json': ( 'f07106eed5f9fa560a3fa21dd1e65d66ce3db69d', 'c04164f141b58228cd20e6fecefeeb8307c0f2bf' ),
+    'silverstone.json': ( '7f74a26638f2df3317d203bbf3820ea927e3e0d2', 'fa91609c8cb1b71bc2604ebeb8bcda0c27d8ef7e' ),
+    'weird-maze.json': ( '9b11e39abb96cb8ff34014df5cda60e6ee9ff5d0', '392cb7193ef7fc0df1d902f0cf9ee0b4d9f61620' ),
+    'zandvoort.json': ( '772ec3ffa248b371032ea18f04762224038e2450', '32328047fbe15b20e2e31c023ff17b441c32fb4f' ),
+    'custom/parking-spot.json': ( '90f534d00e92b5bc950323c2471ea398f38be362', '2d9f8ca9bb476036eb2404da3f0bd744bd4fc8db' ),
+    'custom/tester.json': ( '30d8a502816bcc2ec15a27c567fcb5879fd8fe20', 'ce367d382b53af3318e179a7edb42cebf2d49c47' ),
+    'custom/the-line.json': ( 'f100c4847f99cad061d6c7b218dcfef4830c67a8', '6757b16c166efa2a5cb94ce713d2ea54d9eb5fb5' )
+}
+
+# Get the digest of a grid
+def getDigest(grid):
+    return hashlib.sha1(json.dumps(grid.to_list()).encode()).hexdigest()
+
+# The bundled maps are blended to the same tiles as with the old blend code, with and without numpy
+@pytest.mark.parametrize('useNumpy', [ True, False ])
+@pytest.mark.parametrize('path', sorted(OLD_BLEND_DIGESTS))
+def test_bundled_maps_blend_like_old_code(path, useNumpy):
+    map = Map.load_from_file(os.path.join(MAPS_PATH, path))
+    map.blend_terrain(useNumpy)
+    map.blend_track(False, useNumpy)
+    assert ( getDigest(map.blendedTerrain), getDigest(map.blendedTrack) ) == OLD_BLEND_DIGESTS[path]
+
+# The numpy blends give the same tiles as blending every tile on its own
+@pytest.mark.skipif(numpy == None, reason='needs numpy')
+def test_numpy_blends_match_tile_blends():
+    generator = random.Random(1)
+    for i in range(200):
+        map = Map(i, 'Random', generator.randint(1, 16), generator.randint(1, 16))
+        map.terrain = Grid.from_list([ [ generator.randrange(3) for x in range(map.width) ] for y in range(map.height) ])
+        map.track = Grid.from_list([ [ generator.choice([ 0, 0, 0, 1, 1, 2, 3 ]) for x in range(map.width) ] for y in range(map.height) ])
+        map.blend_terrain()
+        map.blend_track(False)
+        for y in range(map.height):
+            for x in range(map.width):
+                assert map.blendedTerrain[y][x] == map.blend_terrain_tile(x, y)
+                assert map.blendedTrack[y][x] == map.blend_track_tile(x, y)
+
+# Editing track tiles one at a time updates the checkpoint grid to the same grid as indexing all checkpoints again
+def test_track_tile_edits_update_checkpoint_grid():
+    generator = random.Random(2)
+    for i in range(50):
+        map = Map(i, 'Random', generator.randint(1, 16), generator.randint(1, 16))
+        map.terrain = Grid(map.width, map.height)
+        map.track = Grid.from_list([ [ generator.choice([ 0, 0, 1, 2, 3, 3 ]) for x in range(map.width) ] for y in range(map.height) ])
+        map.blend_terrain()
+        map.blend_track(False)
+        for j in range(40):
+            map.set_track_tile(generator.randrange(map.width), generator.randrange(map.height), generator.choice([ 0, 1, 3, 3 ]))
+            checkpointGrid = map.checkpointGrid.to_list()
+            map.index_checkpoints()
+            assert checkpointGrid == map.checkpointGrid.to_list()
+
+# Editing track tiles one at a time gives the same checkpoints as finding them in the whole map
+def test_track_tile_edits_find_checkpoints_like_full_blend():
+    generator = random.Random(3)
+    for i in range(50):
+        map = Map(i, 'Random', generator.randint(1, 16), generator.randint(1, 16))
+        map.terrain = Grid(map.width, map.height)
+        map.track = Grid.from_list([ [ generator.choice([ 0, 0, 1, 2, 3, 3 ]) for x in range(map.width) ] for y in range(map.height) ])
+        map.blend_terrain()
+        map.blend_track(False)
+        for j in range(40):
+            map.set_track_tile(generator.randrange(map.width), generator.randrange(map.height), generator.choice([ 0, 1, 3, 3 ]))
+            checkpoints = map.checkpoints
+            map.blend_track(False)
+            assert checkpoints == map.checkpoints
+
+# A map saved as a binary map file loads again with the same tiles and checkpoints and can be edited
+def test_binary_map_round_trip(tmp_path):
+    map = Map.load_from_file(os.path.join(MAPS_PATH, 'baby-park.json'))
+    map.save_to_file(str(tmp_path / 'baby-park.brmap'))
+    binaryMap = Map.load_from_file(str(tmp_path / 'baby-park.brmap'))
+    assert binaryMap.track.to_list() == map.track.to_list()
+    assert binaryMap.blendedTrack.to_list() == map.blendedTrack.to_list()
+    assert binaryMap.checkpoints == map.checkpoints
+    assert binaryMap.checkpointGrid.to_list() == map.checkpointGrid.to_list()
+
+    checkpoint = binaryMap.checkpoints[0]
+    binaryMap.set_track_tile(checkpoint['x'], checkpoint['y'], 1)
+    checkpoints = binaryMap.checkpoints
+    binaryMap.blend_track(False)
+    assert checkpoints == binaryMap.checkpoints
+
+# The map cache saves the binary map of a host and loads it from the cache by its hash
+def test_map_cache_put_and_find(tmp_path, monkeypatch):
+    monkeypatch.setattr(MapCatalogue, 'INDEX_PATH', str(tmp_path / 'index.json'))
+    map = Map.load_from_file(os.path.join(MAPS_PATH, 'baby-park.json'))
+    data = map.save_to_binary()
+    mapHash = hashlib.sha1(data).digest()
+    cache = MapCache(str(tmp_path))
+    catalogue = MapCatalogue([])
+    assert cache.find_map(catalogue, 0, mapHash) == None
+
+    cachedMap = cache.put_map(mapHash, data)
+    assert cachedMap.checkpoints == map.checkpoints
+    foundMap = cache.find_map(catalogue, 0, mapHash)
+    assert foundMap.get_binary_hash() == mapHash
+    assert foundMap.checkpoints == map.checkpoints
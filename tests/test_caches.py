@@ -0,0 +1,26 @@
+# BassieRacing - Image cache tests
+
+# Import modules
+from objects import *
+import pygame
+
+# The rotated image cache removes the least recently used rotations when they use more than the max size in bytes
+def test_rotated_image_cache_byte_limit():
+    image = pygame.Surface(( 16, 8 ), pygame.SRCALPHA)
+    rotationsSize = RotatedImageCache.get_rotations_size([ pygame.transform.rotate(image, i * 360 / 8) for i in range(8) ])
+    cache = RotatedImageCache(8, rotationsSize * 2)
+
+    cache.get_rotations('a', image)
+    cache.get_rotations('b', image)
+    cache.get_rotations('a', image)
+    cache.get_rotations('c', image)
+    assert list(cache.rotations) == [ 'a', 'c' ]
+    assert cache.get_stats() == { 'size': 2, 'images': 16, 'bytes': rotationsSize * 2 }
+
+# An image whose rotations are bigger than the max size is still rendered but replaces all other rotations
+def test_rotated_image_cache_too_big():
+    cache = RotatedImageCache(8, 1)
+    cache.get_rotations('a', pygame.Surface(( 4, 4 )))
+    rotations = cache.get_rotations('b', pygame.Surface(( 4, 4 )))
+    assert len(rotations) == 8
+    assert list(cache.rotations) == [ 'b' ]
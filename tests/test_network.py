@@ -0,0 +1,181 @@
+# BassieRacing - Network tests
+
+# Import modules
+from constants import *
+from netrace import *
+from network import *
+from objects import *
+import random
+import time
+
+HOST_ADDRESS = ( '127.0.0.1', Config.MULTIPLAYER_PORT )
+CLIENT_ADDRESS = ( '127.0.0.1', Config.MULTIPLAYER_PORT + 1 )
+
+# Create a host and a client that are connected by a loopback link
+def createHostAndClient(loss = 0):
+    hostLink, clientLink = Link.create_pair(HOST_ADDRESS, CLIENT_ADDRESS, 0.05, 0.01, loss, random.Random(1))
+    host = NetworkHost('host', 1, 'Map', bytes(100), HOST_ADDRESS[1], HOST_ADDRESS[0], hostLink)
+    client = NetworkClient(HOST_ADDRESS[0], 'client', 0, VehicleColor.RED, HOST_ADDRESS[1], clientLink)
+    return host, client, hostLink, clientLink
+
+# Update the host and the client until a time
+def run(host, client, hostLink, clientLink, startTime, endTime):
+    now = startTime
+    while now < endTime:
+        now += 1 / Config.UPDATES_PER_SECOND
+        hostLink.time = now
+        clientLink.time = now
+        host.update(now)
+        client.update(now)
+    return now
+
+# The host and the client keep each other in the lobby until the race starts, far longer than the timeout
+def test_lobby_keeps_client():
+    host, client, hostLink, clientLink = createHostAndClient(0.1)
+    now = run(host, client, hostLink, clientLink, 0, Config.MULTIPLAYER_TIMEOUT * 4)
+    assert client.vehicleId == 1
+    assert not client.closed
+    assert len(host.clients) == 1
+
+    # The client says that it is ready in the lobby and the host starts the race
+    client.set_ready()
+    now = run(host, client, hostLink, clientLink, now, now + 1)
+    assert host.get_client(client.vehicleId)['ready']
+    host.start([ ( 0, VehicleColor.BLUE ), ( 0, VehicleColor.RED ) ])
+    run(host, client, hostLink, clientLink, now, now + 1)
+    assert client.vehicleData != None
+
+# The client ignores the messages that don't come from the address of the host, also when they come from the port of the host
+def test_client_ignores_other_addresses():
+    host, client, hostLink, clientLink = createHostAndClient()
+    message = Message.decode(Message.encode(Message.LEAVE))
+    client.connection.receive = lambda: [ ( *message, ( '10.0.0.2', HOST_ADDRESS[1] ) ) ]
+    client.receive(0)
+    assert not client.closed
+    client.connection.receive = lambda: [ ( *message, HOST_ADDRESS ) ]
+    client.receive(0)
+    assert client.closed
+
+# A client that joins a host by its name over UDP gets the messages of the host from its resolved address
+def test_client_joins_host_by_name():
+    host = NetworkHost('host', 1, 'Map', bytes(100), 0, '127.0.0.1', Connection())
+    client = NetworkClient('localhost', 'client', 0, VehicleColor.RED, host.connection.socket.getsockname()[1])
+    assert client.hostAddress[0] == '127.0.0.1'
+    try:
+        startTime = time.monotonic()
+        while client.vehicleId == None and time.monotonic() - startTime < 2:
+            host.update(time.monotonic())
+            client.update(time.monotonic())
+            time.sleep(0.01)
+        assert client.vehicleId == 1
+    finally:
+        client.close()
+        host.close()
+
+# Receive messages on the host from the client address
+def receiveOnHost(host, messages):
+    host.connection.receive = lambda: [ ( *Message.decode(message), CLIENT_ADDRESS ) for message in messages ]
+    host.receive(0)
+
+# A client that sends more inputs than it can make only moves the catch up inputs in one host step and one input every step
+# after that, input messages with too many inputs or a sequence far ahead are ignored
+def test_host_limits_client_inputs():
+    host, client, hostLink, clientLink = createHostAndClient()
+    receiveOnHost(host, [ Message.encode_join(0, VehicleColor.RED, 'client') ])
+    host.start([ ( 0, VehicleColor.BLUE ), ( 0, VehicleColor.RED ) ])
+
+    receiveOnHost(host, [ Message.encode_input(Config.UPDATES_PER_SECOND * Config.MULTIPLAYER_TIMEOUT + 1, 0, [ ( 1, 0 ) ]) ])
+    receiveOnHost(host, [ Message.encode_input(255, 0, [ ( 1, 0 ) ] * 255) ])
+    assert len(host.get_client(1)['inputs']) == 0
+
+    for i in range(4):
+        receiveOnHost(host, [ Message.encode_input((i + 1) * Config.MULTIPLAYER_MAX_INPUTS, 0, [ ( 1, 0 ) ] * Config.MULTIPLAYER_MAX_INPUTS) ])
+    assert len(host.get_client(1)['inputs']) == Config.MULTIPLAYER_MAX_INPUTS
+    assert len(host.take_inputs(1)) == 1
+    assert len(host.take_inputs(1)) == 1
+
+    # The steps without inputs are saved up and caught up with at most the catch up inputs at once
+    host.get_client(1)['inputs'] = []
+    for i in range(20):
+        assert host.take_inputs(1) == []
+    receiveOnHost(host, [ Message.encode_input(300, 0, [ ( 1, 0 ) ] * 20) ])
+    assert [ len(host.take_inputs(1)) for i in range(4) ] == [ Config.MULTIPLAYER_MAX_CATCH_UP_INPUTS, Config.MULTIPLAYER_MAX_CATCH_UP_INPUTS, 4, 0 ]
+
+# Create the binary map data of a map with random tiles, it needs a few map transfer chunks
+def createMapData():
+    generator = random.Random(1)
+    map = Map(1, 'Random', 64, 64)
+    map.terrain = Grid.from_list([ [ generator.randrange(3) for x in range(map.width) ] for y in range(map.height) ])
+    map.track = Grid.from_list([ [ generator.choice([ 0, 0, 1, 1, 2, 3 ]) for x in range(map.width) ] for y in range(map.height) ])
+    map.laps = 3
+    map.crashes = { 'enabled': True, 'timeout': 2 }
+    map.noise = { 'x': 0, 'y': 0 }
+    return map.save_to_binary()
+
+# Create a host with map data and a client that is welcomed by the host
+def createMapHostAndClient(mapData):
+    hostLink, clientLink = Link.create_pair(HOST_ADDRESS, CLIENT_ADDRESS, 0.05, 0.01, 0, random.Random(1))
+    host = NetworkHost('host', 1, 'Random', mapData, HOST_ADDRESS[1], HOST_ADDRESS[0], hostLink)
+    client = NetworkClient(HOST_ADDRESS[0], 'client', 0, VehicleColor.RED, HOST_ADDRESS[1], clientLink)
+    now = run(host, client, hostLink, clientLink, 0, 0.5)
+    assert client.mapHash == MapTransfer.get_hash(mapData)
+    return host, client, hostLink, clientLink, now
+
+# The client gets the map of the host, asks again for a chunk that is lost and caches the map
+def test_map_transfer_with_lost_chunk(tmp_path):
+    mapData = createMapData()
+    host, client, hostLink, clientLink, now = createMapHostAndClient(mapData)
+    assert len(host.mapChunks) > 2
+
+    # Lose the first send of the second chunk
+    send = hostLink.send
+    lostChunks = []
+    def sendAndLoseChunk(data, address):
+        messageType, body = Message.decode(data)
+        if messageType == Message.MAP_CHUNK and Message.decode_map_chunk(body)[1] == 1 and len(lostChunks) == 0:
+            lostChunks.append(data)
+            return
+        send(data, address)
+    hostLink.send = sendAndLoseChunk
+
+    client.request_map()
+    run(host, client, hostLink, clientLink, now, now + Config.MAP_TRANSFER_RETRY_TIME * 4)
+    assert len(lostChunks) == 1
+    assert client.mapTransfer.data == mapData
+    assert MapCache(str(tmp_path)).put_map(client.mapHash, client.mapTransfer.data).get_binary_hash() == client.mapHash
+
+# A client that has the map of the host in its map cache is ready without a map transfer
+def test_map_cache_hit_skips_transfer(tmp_path, monkeypatch):
+    monkeypatch.setattr(MapCatalogue, 'INDEX_PATH', str(tmp_path / 'index.json'))
+    mapData = createMapData()
+    cache = MapCache(str(tmp_path))
+    cache.put_map(MapTransfer.get_hash(mapData), mapData)
+    host, client, hostLink, clientLink, now = createMapHostAndClient(mapData)
+
+    assert cache.find_map(MapCatalogue([]), client.mapId, client.mapHash) != None
+    client.set_ready()
+    run(host, client, hostLink, clientLink, now, now + 1)
+    assert client.mapTransfer == None
+    assert host.get_client(client.vehicleId)['ready']
+    assert hostLink.bytesSent < len(mapData) // 4
+
+# The map transfer fails when the map data doesn't match the content hash, when there are too many chunks
+# and when the chunks decompress to more than the max size
+def test_map_transfer_fails_on_corrupt_map():
+    mapData = createMapData()
+    host, client, hostLink, clientLink, now = createMapHostAndClient(mapData)
+    host.mapChunks = MapTransfer.split(mapData[:-1] + bytes(1))
+    client.request_map()
+    run(host, client, hostLink, clientLink, now, now + 1)
+    assert client.mapTransfer.failed and client.mapTransfer.data == None
+
+    mapTransfer = MapTransfer(bytes(20))
+    mapTransfer.add_chunk(0, MapTransfer.get_max_chunks() + 1, bytes(10))
+    assert mapTransfer.failed and mapTransfer.chunks == None
+
+    data = bytes(Config.MAP_TRANSFER_MAX_SIZE + 1)
+    mapTransfer = MapTransfer(MapTransfer.get_hash(data))
+    chunks = MapTransfer.split(data)
+    for i, chunk in enumerate(chunks):
+        mapTransfer.add_chunk(i, len(chunks), chunk)
+    assert mapTransfer.failed and mapTransfer.data == None
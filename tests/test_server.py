@@ -0,0 +1,88 @@
+# BassieRacing - Lobby server tests
+
+# Import modules
+from constants import *
+from network import *
+from server import *
+
+# The transport class, remembers the sent messages instead of sending them
+class Transport:
+    def __init__(self):
+        self.sent = []
+
+    def sendto(self, data, address):
+        self.sent.append(( data, address ))
+
+# Join a room of the lobby server, the first join gets the cookie and the second join sends it back
+def joinRoom(server, address, roomId, name, roomName = ''):
+    server.datagram_received(Message.encode_room_join(roomId, 0, 0, name, roomName), address)
+    data, address = server.transport.sent.pop()
+    messageType, body = Message.decode(data)
+    assert messageType == Message.COOKIE
+    server.datagram_received(Message.encode_room_join(roomId, 0, 0, name, roomName, Message.decode_cookie(body)), address)
+
+# Create a lobby server with a number of rooms
+def createServer(roomCount):
+    server = LobbyServer()
+    server.connection_made(Transport())
+    for i in range(roomCount):
+        joinRoom(server, ( '10.0.0.1', 1000 + i ), 0, 'Player %d' % i, 'Room with a long name %d' % i)
+    server.transport.sent = []
+    return server
+
+# The rooms reply is never bigger than the room list request and all rooms can be listed page by page
+def test_rooms_reply_is_not_bigger_than_request():
+    server = createServer(100)
+    for size in ( 0, 64, 256, Config.SERVER_ROOMS_REQUEST_SIZE ):
+        roomIds = []
+        while True:
+            request = Message.encode_room_list(len(roomIds), size)
+            server.requestBuckets = {}
+            server.datagram_received(request, ( '10.0.0.2', 2000 ))
+            data, address = server.transport.sent.pop()
+            assert len(data) <= len(request)
+            rooms = Message.decode_rooms(Message.decode(data)[1])
+            if len(rooms) == 0:
+                break
+            roomIds.extend(room['id'] for room in rooms)
+        if size >= 64:
+            assert roomIds == list(server.rooms)
+
+# An address can only send a burst of pings and then the request rate, other addresses are still answered
+def test_requests_are_rate_limited():
+    server = createServer(0)
+    for i in range(100):
+        server.datagram_received(Message.encode(Message.PING, bytes(8)), ( '10.0.0.2', 2000 ))
+        server.datagram_received(Message.encode_room_list(0), ( '10.0.0.2', 2000 ))
+    assert len(server.transport.sent) <= Config.SERVER_REQUEST_BURST + 1
+    server.datagram_received(Message.encode(Message.PING, bytes(8)), ( '10.0.0.3', 2000 ))
+    assert server.transport.sent[-1][1] == ( '10.0.0.3', 2000 )
+
+# A room join of a new address only gets a cookie that is not bigger than the request, so a spoofed address never gets
+# the room and the players of the room get no updates, and every address can only send a few of them per second
+def test_room_joins_of_new_addresses_need_a_cookie():
+    server = createServer(1)
+    roomId = next(iter(server.rooms))
+    for i in range(1, Config.SERVER_ROOM_SIZE - 1):
+        joinRoom(server, ( '10.0.0.1', 1000 + i ), roomId, 'Player with a long name %d' % i * 8)
+    server.transport.sent = []
+
+    requestSize = 0
+    for i in range(100):
+        request = Message.encode_room_join(roomId, 0, 0, '')
+        requestSize += len(request)
+        server.datagram_received(request, ( '10.0.0.2', 2000 ))
+    server.datagram_received(Message.encode_room_join(0, 0, 0, '', '', bytes(Message.COOKIE_SIZE)), ( '10.0.0.2', 2000 ))
+    assert len(server.transport.sent) <= Config.SERVER_REQUEST_BURST + 1
+    assert all(Message.decode(data)[0] == Message.COOKIE and address == ( '10.0.0.2', 2000 ) for data, address in server.transport.sent)
+    assert sum(len(data) for data, address in server.transport.sent) < requestSize / 4
+    assert len(server.rooms) == 1 and len(server.players) == Config.SERVER_ROOM_SIZE - 1
+
+    # The cookie of another address doesn't work
+    cookie = Message.decode_cookie(Message.decode(server.transport.sent[0][0])[1])
+    server.requestBuckets = {}
+    server.transport.sent = []
+    server.datagram_received(Message.encode_room_join(roomId, 0, 0, 'Player', '', cookie), ( '10.0.0.3', 2000 ))
+    assert Message.decode(server.transport.sent[0][0])[0] == Message.COOKIE
+    server.datagram_received(Message.encode_room_join(roomId, 0, 0, 'Player', '', cookie), ( '10.0.0.2', 2000 ))
+    assert len(server.players) == Config.SERVER_ROOM_SIZE
@@ -0,0 +1,50 @@
+# BassieRacing - Snapshot tests
+
+# Import modules
+from network import *
+import pytest
+import random
+
+# Get a random vehicle of a snapshot with the checkpoints of a map with many checkpoints
+def randomVehicle(random, checkpointCount):
+    return (
+        random.randrange(0, 512 * 128 * Snapshot.POSITION_STEPS),
+        random.randrange(0, 512 * 128 * Snapshot.POSITION_STEPS),
+        random.randrange(0, Snapshot.ANGLE_STEPS),
+        random.randrange(-400 * Snapshot.VELOCITY_STEPS, 800 * Snapshot.VELOCITY_STEPS),
+        random.randrange(-400 * Snapshot.ACCELERATION_STEPS, 400 * Snapshot.ACCELERATION_STEPS),
+        random.randrange(0, 100),
+        random.getrandbits(checkpointCount),
+        random.randrange(0, 8)
+    )
+
+# Full and delta snapshots with wide checkpoint fields and big position jumps decode to the same snapshot
+@pytest.mark.parametrize('checkpointCount', [ 8, 62, 63, 64, 65, 200, 4096 ])
+def test_snapshot_round_trip(checkpointCount):
+    generator = random.Random(checkpointCount)
+    baseSnapshot = None
+    for i in range(20):
+        snapshot = [ randomVehicle(generator, checkpointCount) for j in range(8) ]
+        snapshot[0] = snapshot[0][:Snapshot.CHECKPOINTS] + ( (1 << checkpointCount) - 1, ) + snapshot[0][Snapshot.CHECKPOINTS + 1:]
+        for base in ( None, baseSnapshot ):
+            assert Snapshot.decode(Snapshot.encode(snapshot, base), base) == snapshot
+        baseSnapshot = snapshot
+
+# Every delta size decodes to the same delta
+def test_delta_round_trip():
+    deltas = [ 0, 1, -1, 7, -8, 8, 511, -512, 32767, -32768, 32768 ]
+    deltas += [ sign * ((1 << bits) + offset) for bits in range(16, 200) for offset in ( -1, 0, 1 ) for sign in ( 1, -1 ) ]
+    writer = BitWriter()
+    for delta in deltas:
+        Snapshot.write_delta(writer, delta)
+    reader = BitReader(writer.to_bytes())
+    assert [ Snapshot.read_delta(reader) for delta in deltas ] == deltas
+
+# The bit writer doesn't write values that don't fit in their bits
+def test_bit_writer_checks_value_size():
+    writer = BitWriter()
+    writer.write(63, 6)
+    with pytest.raises(AssertionError):
+        writer.write(64, 6)
+    with pytest.raises(AssertionError):
+        writer.write(-1, 6)
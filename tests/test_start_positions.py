@@ -0,0 +1,56 @@
+# BassieRacing - Start position tests
+
+# Import modules
+from constants import *
+import glob
+import itertools
+import math
+from objects import *
+import os
+import pytest
+from simulation import *
+from stats import *
+
+MAPS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'assets', 'maps')
+
+# The longest vehicle decides the crash distance
+CRASH_DISTANCE = max(max(vehicleType['width'], vehicleType['height']) for vehicleType in vehicles) / 3 * 2
+
+# Load all bundled maps
+def loadMaps():
+    return [ Map.load_from_file(path) for path in sorted(glob.glob(os.path.join(MAPS_PATH, '*.json'))) ]
+
+# Every vehicle of a race gets its own start slot that is far enough from all other slots
+@pytest.mark.parametrize('count', [ 2, 8, 32 ])
+def test_start_positions_are_distinct(count):
+    for map in loadMaps():
+        positions = [ map.get_start_position(i) for i in range(count) ]
+        for a, b in itertools.combinations(positions, 2):
+            assert math.hypot(a[0] - b[0], a[1] - b[1]) >= CRASH_DISTANCE, map.name
+
+# The first two vehicles keep the slots next to each other in the middle of the track
+def test_first_two_start_positions():
+    map = Map.load_from_file(os.path.join(MAPS_PATH, 'baby-park.json'))
+    assert map.get_start_position(VehicleId.LEFT) == ( 11 * 128 + 64, 12 * 128 + 64, math.radians(270) )
+    assert map.get_start_position(VehicleId.RIGHT) == ( 11 * 128 + 64, 13 * 128 + 64, math.radians(270) )
+
+# No vehicle crashes into another one when a race with many vehicles starts
+def test_simulation_start_without_crashes():
+    map = Map.load_from_file(os.path.join(MAPS_PATH, 'monaco.json'))
+    simulation = Simulation(map, [ { 'type': vehicles[i % len(vehicles)], 'color': VehicleColor.BLUE } for i in range(8) ], [ None ] * 8)
+    simulation.run(1)
+    assert not any(vehicle.crashed for vehicle in simulation.vehicles)
+    assert len(set(( vehicle.x, vehicle.y ) for vehicle in simulation.vehicles)) == 8
+
+# A crashed vehicle respawns in its own slot at the last checkpoint
+def test_crash_respawns_in_own_slot():
+    map = Map.load_from_file(os.path.join(MAPS_PATH, 'monaco.json'))
+    simulation = Simulation(map, [ { 'type': vehicles[0], 'color': VehicleColor.BLUE } for i in range(8) ], [ None ] * 8)
+    for vehicle in simulation.vehicles:
+        vehicle.x += 1000
+        vehicle.crashed = True
+        vehicle.crashTime = simulation.time
+    simulation.run(Config.EXPLOSION_ANIMATION_FRAME_COUNT * Config.EXPLOSION_ANIMATION_FRAME_TIME + 0.1)
+    for vehicle in simulation.vehicles:
+        assert not vehicle.crashed
+        assert ( vehicle.x, vehicle.y, vehicle.angle ) == map.get_start_position(vehicle.id)
@@ -0,0 +1,100 @@
+# BassieRacing - Widget tests
+
+# Import modules
+import json
+from objects import *
+import os
+import pygame
+from widgets import *
+
+ASSETS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'assets')
+
+# The game stand-in with what the mini map and the vehicles use, the images are converted for a hidden display
+class FakeGame:
+    def __init__(self):
+        os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+        pygame.display.init()
+        pygame.display.set_mode(( 1, 1 ))
+        pygame.font.init()
+        self.titleFont = pygame.font.Font(None, 48)
+        self.textFont = pygame.font.Font(None, 24)
+        self.smallFont = pygame.font.Font(None, 16)
+        self.time = 0
+        self.alpha = 1
+        self.settings = { 'sound-effects': { 'enabled': False }, 'custom-maps': [], 'high-scores': [] }
+        self.tilesImage = pygame.image.load(os.path.join(ASSETS_PATH, 'images', 'tiles.png')).convert_alpha()
+        self.vehiclesImage = pygame.image.load(os.path.join(ASSETS_PATH, 'images', 'vehicles.png')).convert_alpha()
+
+# Create an empty map of a size
+def createMap(id, width, height):
+    map = Map(id, 'Test', width, height)
+    map.terrain = Grid(width, height)
+    map.track = Grid(width, height)
+    map.blend_terrain()
+    map.blend_track(False)
+    return map
+
+# Saving a thumbnail removes the thumbnails of older contents of the same map and size
+def test_thumbnail_cache_removes_old_contents(tmp_path):
+    cache = ThumbnailCache(4, str(tmp_path))
+    map = createMap(1, 8, 8)
+    cache.put(map, pygame.Surface(( 16, 16 )))
+    cache.put(map, pygame.Surface(( 32, 32 )))
+    cache.put(createMap(12, 8, 8), pygame.Surface(( 16, 16 )))
+    oldFileName = os.path.basename(cache.get_file_path(( 1, map.get_content_hash(), 16, 16 )))
+
+    map.terrain[0][0] = 1
+    cache.put(map, pygame.Surface(( 16, 16 )))
+    fileNames = sorted(os.listdir(tmp_path))
+    assert len(fileNames) == 3
+    assert oldFileName not in fileNames
+    assert os.path.basename(cache.get_file_path(( 1, map.get_content_hash(), 16, 16 ))) in fileNames
+
+# The cache keeps at most the max disk size of saved thumbnails and removes the least recently saved ones
+def test_thumbnail_cache_disk_size(tmp_path):
+    cache = ThumbnailCache(4, str(tmp_path), 3)
+    for id in range(5):
+        cache.put(createMap(id, 8, 8), pygame.Surface(( 16, 16 )))
+        os.utime(cache.get_file_path(( id, createMap(id, 8, 8).get_content_hash(), 16, 16 )), ( id, id ))
+    assert sorted(int(fileName.split('-')[0]) for fileName in os.listdir(tmp_path)) == [ 2, 3, 4 ]
+
+# A map wider than the mini map has a tile size of zero and its vehicles are not drawn
+def test_mini_map_wider_than_map(monkeypatch):
+    monkeypatch.setattr(thumbnailCache, 'cachePath', None)
+    game = FakeGame()
+    map = createMap(1, 256, 256)
+    map.laps = 1
+    vehicle = Vehicle(game, 0, vehicles[0], 0, map, [], 500, 500, 0)
+    miniMap = MiniMap(game, map, [ vehicle ], 0, 0, 128, 128)
+    assert miniMap.tileSize == 0
+    miniMap.draw(pygame.Surface(( 128, 128 )))
+
+# The map selector shows no maps and selects none when no map can be loaded
+def test_map_selector_without_maps(tmp_path, monkeypatch):
+    monkeypatch.setattr(MapCatalogue, 'INDEX_PATH', str(tmp_path / 'index.json'))
+    monkeypatch.setattr(MapCatalogue, 'load_map', lambda self, metadata: None)
+    mapSelector = MapSelector(FakeGame(), 0, 0, 1280, 480, None)
+    assert mapSelector.maps == [] and mapSelector.selectedMap == None
+    mapSelector.rotate_right_button_clicked()
+    assert mapSelector.selectedMap == None
+
+# The message about a different game version of a map is only shown the first time the map is loaded
+def test_version_message_is_shown_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(MapCatalogue, 'INDEX_PATH', str(tmp_path / 'index.json'))
+    monkeypatch.setattr(MapCatalogue, 'versionMessageMapPaths', set())
+    messages = []
+    monkeypatch.setattr(dialogs, 'show_message', lambda title, message: messages.append(title))
+
+    with open(os.path.join(ASSETS_PATH, 'maps', 'baby-park.json'), 'r') as file:
+        data = json.load(file)
+    data['version'] = '99.99.99'
+    mapPath = str(tmp_path / 'new-version.json')
+    with open(mapPath, 'w') as file:
+        json.dump(data, file)
+
+    catalogue = MapCatalogue([ mapPath ])
+    for i in range(3):
+        assert catalogue.load_map(catalogue.maps[0]) != None
+        catalogue.keep_maps([])
+    assert MapCatalogue([ mapPath ]).load_map(catalogue.maps[0]) != None
+    assert messages == [ 'Map uses different game version!' ]